@@ -10,7 +10,7 @@ from sqlalchemy import create_engine
 from app.db.base import Base
 
 from app.models import user, role, schedule, grade, news, profile, audit, achievement
-from app.models import application, document_order, material, subject_type, testing
+from app.models import application, document_order, material, subject_type, testing, job, media
 from app.core.config import settings
 
 config = context.config
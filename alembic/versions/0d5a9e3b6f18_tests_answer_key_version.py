@@ -0,0 +1,26 @@
+"""tests.answer_key_version
+
+Revision ID: 0d5a9e3b6f18
+Revises: b71d04e9c2a6
+Create Date: 2026-10-17 01:02:19.640531
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d5a9e3b6f18'
+down_revision: Union[str, None] = 'b71d04e9c2a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tests', sa.Column('answer_key_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('tests', 'answer_key_version')
@@ -0,0 +1,38 @@
+"""keyset pagination indexes
+
+Revision ID: 3c8e1f52a7b4
+Revises: fa4ceb34f9dc
+Create Date: 2026-10-16 23:48:05.512774
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8e1f52a7b4'
+down_revision: Union[str, None] = 'fa4ceb34f9dc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_grades_graded_at_id', 'grades', ['graded_at', 'id']),
+    ('ix_news_published_at_id', 'news', ['published_at', 'id']),
+    ('ix_news_created_at_id', 'news', ['created_at', 'id']),
+    ('ix_achievements_created_at_id', 'achievements', ['created_at', 'id']),
+    ('ix_applications_created_at_id', 'applications', ['created_at', 'id']),
+    ('ix_document_orders_created_at_id', 'document_orders', ['created_at', 'id']),
+    ('ix_materials_created_at_id', 'materials', ['created_at', 'id']),
+    ('ix_tests_created_at_id', 'tests', ['created_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,37 @@
+"""unique attempt number per student and test
+
+Revision ID: 6e2f7a1c9d43
+Revises: 0d5a9e3b6f18
+Create Date: 2026-10-17 01:41:55.270318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e2f7a1c9d43'
+down_revision: Union[str, None] = '0d5a9e3b6f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # гонка в старом start_test могла выдать двум попыткам один номер — перенумеровываем по времени старта
+    op.execute(
+        """
+        UPDATE test_attempts AS a
+        SET attempt_number = n.rn
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY student_id, test_id ORDER BY started_at, id) AS rn
+            FROM test_attempts
+        ) AS n
+        WHERE a.id = n.id AND a.attempt_number IS DISTINCT FROM n.rn
+        """
+    )
+    op.create_unique_constraint('uq_attempt_number', 'test_attempts', ['student_id', 'test_id', 'attempt_number'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_attempt_number', 'test_attempts', type_='unique')
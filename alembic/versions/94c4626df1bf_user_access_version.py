@@ -0,0 +1,26 @@
+"""users.access_version
+
+Revision ID: 94c4626df1bf
+Revises: dd90bf10df7d
+Create Date: 2026-10-16 10:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '94c4626df1bf'
+down_revision: Union[str, None] = 'dd90bf10df7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('access_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'access_version')
@@ -0,0 +1,40 @@
+"""grades.is_final and filter indexes
+
+Revision ID: b71d04e9c2a6
+Revises: 3c8e1f52a7b4
+Create Date: 2026-10-17 00:21:37.904412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71d04e9c2a6'
+down_revision: Union[str, None] = '3c8e1f52a7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FINAL_GRADE_TYPES = ("итог", "final", "exam", "зачет")
+
+
+def upgrade() -> None:
+    op.add_column('grades', sa.Column('is_final', sa.Boolean(), server_default=sa.false(), nullable=False))
+    grades = sa.table('grades', sa.column('grade_type', sa.String), sa.column('is_final', sa.Boolean))
+    op.execute(
+        grades.update()
+        .where(sa.func.lower(sa.func.trim(grades.c.grade_type)).in_(FINAL_GRADE_TYPES))
+        .values(is_final=True)
+    )
+    op.create_index('ix_grades_student_subject_type', 'grades', ['student_id', 'subject_id', 'grade_type'], unique=False)
+    op.create_index('ix_grades_student_subject_final', 'grades', ['student_id', 'subject_id', 'is_final'], unique=False)
+    op.create_index('ix_grades_teacher_graded_at', 'grades', ['teacher_id', 'graded_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_grades_teacher_graded_at', table_name='grades')
+    op.drop_index('ix_grades_student_subject_final', table_name='grades')
+    op.drop_index('ix_grades_student_subject_type', table_name='grades')
+    op.drop_column('grades', 'is_final')
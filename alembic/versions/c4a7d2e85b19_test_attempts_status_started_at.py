@@ -0,0 +1,25 @@
+"""test_attempts (status, started_at) index
+
+Revision ID: c4a7d2e85b19
+Revises: 6e2f7a1c9d43
+Create Date: 2026-10-17 02:14:08.331962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7d2e85b19'
+down_revision: Union[str, None] = '6e2f7a1c9d43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_test_attempts_status_started_at', 'test_attempts', ['status', 'started_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_test_attempts_status_started_at', table_name='test_attempts')
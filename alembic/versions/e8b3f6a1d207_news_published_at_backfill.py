@@ -0,0 +1,39 @@
+"""news.published_at backfill for published rows
+
+Revision ID: e8b3f6a1d207
+Revises: c4a7d2e85b19
+Create Date: 2026-10-17 03:02:41.117530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f6a1d207'
+down_revision: Union[str, None] = 'c4a7d2e85b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Лента опубликованных новостей пагинируется по published_at; старые записи без даты
+    # публикации получают дату создания, иначе они выпали бы из списка
+    news = sa.table(
+        'news',
+        sa.column('is_published', sa.Boolean),
+        sa.column('published_at', sa.DateTime(timezone=True)),
+        sa.column('created_at', sa.DateTime(timezone=True)),
+    )
+    op.execute(
+        news.update()
+        .where(news.c.is_published.is_(True), news.c.published_at.is_(None))
+        .values(published_at=sa.func.coalesce(news.c.created_at, sa.func.now()))
+    )
+
+
+def downgrade() -> None:
+    # Какие даты были проставлены миграцией, не отличить — оставляем как есть
+    pass
@@ -0,0 +1,87 @@
+"""
+Нагрузочный замер горячих эндпоинтов чтения.
+
+    python -m app.bench_async_reads --base-url http://127.0.0.1:8000 --token <JWT> \
+        --concurrency 100 --requests 2000
+
+Запускать против сервера до и после перевода эндпоинтов на AsyncSession
+(uvicorn с одинаковым числом воркеров) и сравнивать rps и перцентили.
+Нужен httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+PATHS = ["/schedules/lessons", "/me", "/tests/", "/news", "/materials/my"]
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def _run_path(client, path: str, headers: dict, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path, headers=headers)
+                ok = r.status_code < 400
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "path": path,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50": _percentile(latencies, 0.50) * 1000,
+        "p95": _percentile(latencies, 0.95) * 1000,
+        "p99": _percentile(latencies, 0.99) * 1000,
+        "mean": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+async def _main(args):
+    import httpx
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        print(f"{'path':<22}{'rps':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}")
+        for path in args.paths or PATHS:
+            # прогрев соединений и кэшей
+            await _run_path(client, path, headers, args.concurrency, args.concurrency)
+            res = await _run_path(client, path, headers, args.concurrency, args.requests)
+            print(f"{res['path']:<22}{res['rps']:>9.1f}{res['mean']:>9.1f}{res['p50']:>9.1f}"
+                  f"{res['p95']:>9.1f}{res['p99']:>9.1f}{res['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", default="")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--paths", nargs="*")
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
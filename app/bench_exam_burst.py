@@ -0,0 +1,135 @@
+"""
+Нагрузочный замер старта и сдачи теста «всей параллелью» на отдельной SQLite-базе.
+
+    python -m app.bench_exam_burst --students 500 --workers 40
+
+N студентов одной группы одновременно начинают тест (max_attempts=2) и сдают его;
+печатает попыток/сек и число SQL-запросов на вызов. Затем один студент 10 раз
+параллельно жмёт «начать» — попыток должно получиться ровно max_attempts,
+остальные вызовы получают 400 (гонка проверки лимита и вставки, uq_attempt_number).
+Код выхода 1, если лимит нарушен. Для сравнения запускать на коммите до изменений.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+MAX_ATTEMPTS = 2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=40)
+    parser.add_argument("--questions", type=int, default=30)
+    parser.add_argument("--race", type=int, default=10, help="параллельных стартов одного студента")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MEDIA_ROOT", os.path.join(tempfile.gettempdir(), "bench_media"))
+    from fastapi import HTTPException
+    from sqlalchemy import create_engine, event, select, func
+    from sqlalchemy.orm import sessionmaker
+    import app.main  # noqa: F401  регистрирует все модели
+    from app.db.base import Base
+    from app.models.grade import Student
+    from app.models.schedule import Group
+    from app.models.testing import Test, Question, TestGroupAccess, TestAttempt, QuestionType
+    from app.routers import tests as routes
+    from app.schemas.testing import SubmitIn
+
+    fd, db_path = tempfile.mkstemp(suffix=".db", prefix="exam_bench_")
+    os.close(fd)
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False, "timeout": 60},
+        pool_size=args.workers, max_overflow=0,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _wal(conn, _):
+        conn.execute("PRAGMA journal_mode=WAL")
+
+    # SQLite не проверяет внешние ключи — users и прочие таблицы не нужны
+    Base.metadata.create_all(engine, tables=[
+        Base.metadata.tables[t] for t in ("groups", "students", "tests", "questions", "test_group_access", "test_attempts")
+    ])
+    Session = sessionmaker(bind=engine)
+
+    n = args.students
+    race_user = n + 1
+    with Session() as db:
+        db.add(Group(id=1, code="BENCH", title="Bench"))
+        test = Test(title="Экзамен", created_by_id=1, max_attempts=MAX_ATTEMPTS, duration_minutes=90)
+        db.add(test)
+        db.flush()
+        db.add_all([
+            Question(test_id=test.id, type=QuestionType.choice, text=f"q{i}", correct_answers=["a"], points=1)
+            for i in range(args.questions)
+        ])
+        db.add(TestGroupAccess(test_id=test.id, group_id=1))
+        db.add_all([Student(id=i, user_id=i, group_id=1) for i in range(1, race_user + 1)])
+        db.commit()
+        test_id = test.id
+        answers = {str(q.id): "a" for q in test.questions}
+
+    statements = [0]
+    lock = threading.Lock()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*_):
+        with lock:
+            statements[0] += 1
+
+    def me(user_id: int):
+        return SimpleNamespace(id=user_id, auth_context=None)
+
+    def start(user_id: int):
+        with Session() as db:
+            return routes.start_test(test_id, db, me(user_id))
+
+    def submit(user_id: int, started):
+        payload = SubmitIn(attempt_id=started.attempt_id, attempt_token=started.attempt_token, answers=answers)
+        with Session() as db:
+            return routes.submit_test(test_id, payload, db, me(user_id))
+
+    def try_start(_):
+        try:
+            return start(race_user).attempt_number
+        except HTTPException as e:
+            return e.status_code
+
+    try:
+        with ThreadPoolExecutor(args.workers) as ex:
+            t0 = time.perf_counter()
+            started = list(ex.map(start, range(1, n + 1)))
+            t1 = time.perf_counter()
+            start_stmts, statements[0] = statements[0], 0
+            done = list(ex.map(submit, range(1, n + 1), started))
+            t2 = time.perf_counter()
+            submit_stmts = statements[0]
+
+        with ThreadPoolExecutor(args.race) as ex:
+            race = list(ex.map(try_start, range(args.race)))
+        with Session() as db:
+            race_attempts = db.scalar(
+                select(func.count()).select_from(TestAttempt).where(TestAttempt.student_id == race_user)
+            )
+    finally:
+        engine.dispose()
+        os.remove(db_path)
+
+    print(f"students={n} workers={args.workers} questions={args.questions}")
+    print(f"start:  {t1 - t0:.2f}s  {n / (t1 - t0):.0f}/s  {start_stmts / n:.1f} SQL per call")
+    print(f"submit: {t2 - t1:.2f}s  {n / (t2 - t1):.0f}/s  {submit_stmts / n:.1f} SQL per call")
+    print(f"scores: {sorted({d.auto_score for d in done})}  statuses: {sorted({d.status.value for d in done})}")
+    ok = race_attempts == MAX_ATTEMPTS
+    print(f"race: {args.race} parallel starts, max_attempts={MAX_ATTEMPTS} -> {race_attempts} attempts "
+          f"(results {sorted(map(str, race))}) {'OK' if ok else 'FAIL'}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Замер скорости хеширования паролей при импорте пользователей.
+
+    python -m app.bench_password_hashing --rows 300 --rounds 12
+
+Сравнивает последовательное хеширование (как было в прежнем импорте пользователей)
+с пакетным hash_passwords на пуле процессов и печатает строк/сек.
+"""
+import argparse
+import os
+import secrets
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    from app.core.security import hash_password, verify_password
+    from app.core.hashing import hash_passwords, shutdown_hash_pool
+
+    passwords = [secrets.token_urlsafe(8) for _ in range(args.rows)]
+
+    t0 = time.perf_counter()
+    for p in passwords:
+        hash_password(p)
+    serial = time.perf_counter() - t0
+
+    hash_passwords(passwords[:os.cpu_count() or 1])  # прогрев пула
+    t0 = time.perf_counter()
+    hashes = hash_passwords(passwords)
+    pooled = time.perf_counter() - t0
+    assert verify_password(passwords[0], hashes[0])
+    shutdown_hash_pool()
+
+    print(f"rows={args.rows} rounds={args.rounds} cpus={os.cpu_count()}")
+    print(f"serial: {serial:.2f}s  {args.rows / serial:.1f} rows/s")
+    print(f"pooled: {pooled:.2f}s  {args.rows / pooled:.1f} rows/s  (x{serial / pooled:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,29 @@
 from datetime import datetime, timezone
 from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy import select
-from app.db.session import SessionLocal
-from app.models.audit import AuditLog
-from app.models.user import User
-from app.core.security import decode_token
+from app.core.auth_context import get_auth_context
+from app.core.audit_writer import audit_writer
 
 class AuditMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
-        user_id = None
-        try:
-            auth = request.headers.get("authorization")
-            if auth and auth.startswith("Bearer "):
-                token = auth.split(" ", 1)[1]
-                payload = decode_token(token)
-                email = payload.get("sub")
-                if email:
-                    with SessionLocal() as db:
-                        u = db.scalar(select(User).where(User.email == email))
-                        user_id = u.id if u else None
-        except Exception:
-            user_id = None
+        ctx = get_auth_context(request)
 
         response = await call_next(request)
 
-        try:
-            with SessionLocal() as db:
-                db.add(AuditLog(
-                    user_id=user_id,
-                    method=request.method,
-                    path=request.url.path,
-                    query=request.url.query[:1024] if request.url.query else None,
-                    status_code=response.status_code,
-                    ip=(request.client.host if request.client else None),
-                    user_agent=(request.headers.get("user-agent") or "")[:255],
-                    created_at=datetime.now(timezone.utc),
-                ))
-                db.commit()
-        except Exception:
-            pass
+        # user_id проставляет get_current_user; если эндпоинт его не вызывал,
+        # id по email дозапросит фоновый писатель одним запросом на пачку
+        user_id = ctx.user_id if ctx else None
+        email = ctx.email if ctx and user_id is None else None
+
+        audit_writer.enqueue(dict(
+            user_id=user_id,
+            email=email,
+            method=request.method,
+            path=request.url.path[:512],
+            query=request.url.query[:1024] if request.url.query else None,
+            status_code=response.status_code,
+            ip=(request.client.host if request.client else None),
+            user_agent=(request.headers.get("user-agent") or "")[:255],
+            created_at=datetime.now(timezone.utc),
+        ))
 
         return response
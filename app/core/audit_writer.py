@@ -0,0 +1,144 @@
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import insert, select
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.audit import AuditLog
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+DROP_NEW = "drop_new"
+DROP_OLDEST = "drop_oldest"
+
+
+class AuditWriter:
+    """
+    Буферизованная запись журнала аудита.
+    Middleware только кладёт запись в ограниченную очередь, фоновый поток
+    пишет накопленное одной многострочной вставкой по размеру пачки или по таймеру.
+    """
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, drop_policy: str = DROP_NEW):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.05, flush_interval)
+        self.drop_policy = drop_policy
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=max(1, max_queue))
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Останавливает поток и дописывает всё, что осталось в очереди."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        while True:
+            batch = self._collect(block=False)
+            if not batch:
+                break
+            self._write(batch)
+
+    def enqueue(self, record: dict) -> bool:
+        """Неблокирующая постановка записи в очередь. False — запись отброшена."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self.drop_policy != DROP_OLDEST:
+                self._count("dropped")
+                return False
+            try:
+                self._queue.get_nowait()
+                self._count("dropped")
+                self._queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                self._count("dropped")
+                return False
+        self._count("queued")
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+                "pending": self._queue.qsize(),
+                "running": bool(self._thread and self._thread.is_alive()),
+            }
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def _collect(self, block: bool = True) -> list[dict]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _resolve_users(self, db, batch: list[dict]):
+        """Проставляет user_id по email одним запросом на всю пачку."""
+        emails = {r["email"] for r in batch if r.get("email") and r.get("user_id") is None}
+        ids = {}
+        if emails:
+            ids = dict(db.execute(select(User.email, User.id).where(User.email.in_(emails))).all())
+        for r in batch:
+            email = r.pop("email", None)
+            if email and r.get("user_id") is None:
+                r["user_id"] = ids.get(email)
+
+    def _write(self, batch: list[dict]):
+        try:
+            with SessionLocal() as db:
+                self._resolve_users(db, batch)
+                db.execute(insert(AuditLog.__table__), batch)
+                db.commit()
+        except Exception:
+            logger.exception("Audit flush failed, %d records lost", len(batch))
+            self._count("failed", len(batch))
+            return
+        with self._lock:
+            self.flushed += len(batch)
+            self.batches += 1
+
+
+audit_writer = AuditWriter(
+    max_queue=settings.AUDIT_QUEUE_MAX,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_SEC,
+    drop_policy=settings.AUDIT_DROP_POLICY,
+)
@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+from starlette.requests import Request
+from app.core.security import decode_token
+
+
+@dataclass
+class AuthContext:
+    """Данные авторизации, разобранные один раз на запрос и общие для middleware и зависимостей."""
+    token: str
+    payload: dict | None
+    user_id: int | None = None
+    # id профилей из токена; заполняются только если метка прав в токене актуальна
+    student_id: int | None = None
+    teacher_id: int | None = None
+
+    @property
+    def email(self) -> str | None:
+        return self.payload.get("sub") if self.payload else None
+
+    @property
+    def claimed_user_id(self) -> int | None:
+        return self.payload.get("uid") if self.payload else None
+
+
+def get_auth_context(request: Request) -> AuthContext | None:
+    """Возвращает контекст из request.state, декодируя JWT только при первом обращении."""
+    if hasattr(request.state, "auth"):
+        return request.state.auth
+
+    ctx = None
+    auth = request.headers.get("authorization")
+    if auth and auth.startswith("Bearer "):
+        token = auth.split(" ", 1)[1]
+        try:
+            payload = decode_token(token)
+        except Exception:
+            payload = None
+        ctx = AuthContext(token=token, payload=payload)
+
+    request.state.auth = ctx
+    return ctx
@@ -1,12 +1,14 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import select, exists
-from app.db.session import SessionLocal
-from app.core.security import decode_token
+from sqlalchemy import select
+from app.db.session import SessionLocal, ReportSessionLocal, AsyncSessionLocal
+from app.core.auth_context import get_auth_context
 from app.models.user import User
-from app.models.role import Permission, user_roles, role_permissions
-from app.models.role import Role
+from app.models.grade import Student
+from app.models.schedule import Teacher
+from app.core.rbac import get_user_access, get_user_access_async, apply_token_claims
 
 bearer = HTTPBearer()
 
@@ -17,28 +19,65 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(bearer),
+async def get_async_db():
+    async with AsyncSessionLocal() as adb:
+        yield adb
+
+def get_current_user(request: Request,
+                     creds: HTTPAuthorizationCredentials = Depends(bearer),
                      db: Session = Depends(get_db)) -> User:
-    token = creds.credentials
-    try:
-        payload = decode_token(token)
-    except Exception:
+    # JWT уже разобран AuditMiddleware и лежит в request.state
+    ctx = get_auth_context(request)
+    if not ctx or ctx.token != creds.credentials or ctx.payload is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
-    email = payload.get("sub")
-    user = db.scalar(select(User).where(User.email == email))
+    if ctx.claimed_user_id:
+        user = db.get(User, ctx.claimed_user_id)
+        if user and user.email != ctx.email:
+            user = None
+    else:
+        user = db.scalar(select(User).where(User.email == ctx.email))
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="User not found or inactive")
+    ctx.user_id = user.id
+    if apply_token_claims(user, ctx.payload):
+        ctx.student_id = ctx.payload.get("sid")
+        ctx.teacher_id = ctx.payload.get("tid")
+    user.auth_context = ctx
     return user
 
+def get_report_db(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    """
+    Сессия из отдельного пула отчётов. Пользователь загружается до неё, после чего
+    соединение основного пула возвращается, чтобы отчёт его не держал. Проверки прав
+    эндпоинта ставить в dependencies= декоратора — они выполняются раньше параметров.
+    """
+    db.close()
+    rdb = ReportSessionLocal()
+    try:
+        yield rdb
+    finally:
+        rdb.close()
+
+def student_profile(db: Session, user: User) -> Student | None:
+    """Профиль студента; при актуальном токене с claims — по id из токена (PK + identity map)."""
+    ctx = user.auth_context
+    if ctx and ctx.student_id:
+        st = db.get(Student, ctx.student_id)
+        if st and st.user_id == user.id:
+            return st
+    return db.scalar(select(Student).where(Student.user_id == user.id))
+
+def teacher_profile(db: Session, user: User) -> Teacher | None:
+    """Профиль преподавателя, аналогично student_profile."""
+    ctx = user.auth_context
+    if ctx and ctx.teacher_id:
+        t = db.get(Teacher, ctx.teacher_id)
+        if t and t.user_id == user.id:
+            return t
+    return db.scalar(select(Teacher).where(Teacher.user_id == user.id))
+
 def is_admin(user: User, db: Session) -> bool:
-    q = select(exists().where(
-        user_roles.c.user_id == user.id
-    ).where(
-        user_roles.c.role_id == Role.id
-    ).where(
-        Role.name == "administrator"
-    ))
-    return bool(db.scalar(q))
+    return get_user_access(db, user.id).is_admin
 
 def require_admin(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not is_admin(user, db):
@@ -47,34 +86,68 @@ def require_admin(user: User = Depends(get_current_user), db: Session = Depends(
 
 def require_permission(code: str):
     def checker(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-        # Админ может всё
-        if is_admin(user, db):
-            return True
-        q = (
-            select(exists().where(
-                Permission.code == code
-            ).where(
-                role_permissions.c.permission_id == Permission.id
-            ).where(
-                user_roles.c.role_id == role_permissions.c.role_id
-            ).where(
-                user_roles.c.user_id == user.id
-            ))
-        )
-        ok = db.scalar(q)
-        if not ok:
+        if not get_user_access(db, user.id).has_permission(code):
             raise HTTPException(status_code=403, detail=f"Forbidden: {code}")
         return True
     return checker
 
 def require_role_any(allowed: list[str]):
     def checker(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-        role_names = db.scalars(
-            select(Role.name)
-            .join(user_roles, user_roles.c.role_id == Role.id)
-            .where(user_roles.c.user_id == user.id)
-        ).all()
-        if not any(r in allowed for r in role_names):
+        if not get_user_access(db, user.id).has_any_role(allowed):
+            raise HTTPException(status_code=403, detail="Forbidden (role)")
+        return True
+    return checker
+
+
+# Асинхронные варианты для эндпоинтов на AsyncSession
+
+async def get_current_user_async(request: Request,
+                                 creds: HTTPAuthorizationCredentials = Depends(bearer),
+                                 adb: AsyncSession = Depends(get_async_db)) -> User:
+    ctx = get_auth_context(request)
+    if not ctx or ctx.token != creds.credentials or ctx.payload is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    if ctx.claimed_user_id:
+        user = await adb.get(User, ctx.claimed_user_id)
+        if user and user.email != ctx.email:
+            user = None
+    else:
+        user = await adb.scalar(select(User).where(User.email == ctx.email))
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found or inactive")
+    ctx.user_id = user.id
+    if apply_token_claims(user, ctx.payload):
+        ctx.student_id = ctx.payload.get("sid")
+        ctx.teacher_id = ctx.payload.get("tid")
+    user.auth_context = ctx
+    return user
+
+async def student_profile_async(adb: AsyncSession, user: User) -> Student | None:
+    ctx = user.auth_context
+    if ctx and ctx.student_id:
+        st = await adb.get(Student, ctx.student_id)
+        if st and st.user_id == user.id:
+            return st
+    return await adb.scalar(select(Student).where(Student.user_id == user.id))
+
+async def teacher_profile_async(adb: AsyncSession, user: User) -> Teacher | None:
+    ctx = user.auth_context
+    if ctx and ctx.teacher_id:
+        t = await adb.get(Teacher, ctx.teacher_id)
+        if t and t.user_id == user.id:
+            return t
+    return await adb.scalar(select(Teacher).where(Teacher.user_id == user.id))
+
+def require_permission_async(code: str):
+    async def checker(user: User = Depends(get_current_user_async), adb: AsyncSession = Depends(get_async_db)):
+        if not (await get_user_access_async(adb, user.id)).has_permission(code):
+            raise HTTPException(status_code=403, detail=f"Forbidden: {code}")
+        return True
+    return checker
+
+def require_role_any_async(allowed: list[str]):
+    async def checker(user: User = Depends(get_current_user_async), adb: AsyncSession = Depends(get_async_db)):
+        if not (await get_user_access_async(adb, user.id)).has_any_role(allowed):
             raise HTTPException(status_code=403, detail="Forbidden (role)")
         return True
     return checker
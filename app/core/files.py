@@ -1,12 +1,80 @@
 import os
 import uuid
 import shutil
+import hashlib
+from dataclasses import dataclass
 from typing import Optional
 from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
 
 ALLOWED_IMAGE_CT = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
 MAX_BYTES = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class StoredFile:
+    path: str
+    size: int
+    sha256: str
+
+
+def store_upload(file, dest_path: str, max_bytes: int | None = None) -> StoredFile:
+    """
+    Пишет загрузку (UploadFile или файловый объект) на диск кусками, не читая
+    её в память целиком, и считает sha256 на лету. Сначала пишется временный
+    файл рядом с dest_path, затем атомарно переименовывается: недописанный
+    файл по dest_path не появится. Больше max_bytes (по умолчанию
+    UPLOAD_MAX_BYTES) — 413.
+    """
+    limit = settings.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    too_large = HTTPException(413, f"Файл слишком большой (лимит {limit // (1024 * 1024)} МБ)")
+    if (getattr(file, "size", None) or 0) > limit:
+        raise too_large
+    src = getattr(file, "file", file)
+
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    total = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > limit:
+                    raise too_large
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return StoredFile(path=dest_path, size=total, sha256=digest.hexdigest())
+
+
+async def store_upload_async(file, dest_path: str, max_bytes: int | None = None) -> StoredFile:
+    """store_upload для async-обработчиков: дисковый ввод-вывод — в пуле потоков."""
+    return await run_in_threadpool(store_upload, file, dest_path, max_bytes)
+
+def thumbnail_path(rel_path: str, size: int) -> str:
+    """'avatars/1/abc.png' -> 'avatars/1/abc_256.webp': превью лежат рядом с оригиналом."""
+    stem, _ = os.path.splitext(rel_path)
+    return f"{stem}_{size}.webp"
+
+
+def thumbnail_url(url: str | None, size: int) -> str | None:
+    """URL превью: /media отдаёт его по ?size=, а пока превью нет — оригинал."""
+    return f"{url}?size={size}" if url else None
+
 
 def ensure_media_dirs():
     os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
@@ -53,17 +121,37 @@ def save_avatar_file(user_id: int, file: UploadFile) -> str:
     return rel_path
 
 def delete_file_if_local(rel_path: Optional[str]):
-    """Удаляет предыдущий файл, если он внутри MEDIA_ROOT."""
+    """Удаляет предыдущий файл (вместе с превью), если он внутри MEDIA_ROOT."""
     if not rel_path:
         return
+    if rel_path.replace("\\", "/").lstrip("/").startswith("blobs/"):
+        return  # общие файлы удаляет только app.core.media_store.release_blob
     abs_path = os.path.join(settings.MEDIA_ROOT, rel_path.replace("/", os.sep))
     try:
         if os.path.commonpath([settings.MEDIA_ROOT, os.path.abspath(abs_path)]) != os.path.abspath(settings.MEDIA_ROOT):
             return
     except Exception:
         return
-    if os.path.exists(abs_path) and os.path.isfile(abs_path):
-        try:
-            os.remove(abs_path)
-        except Exception:
-            pass
+    thumbs = [os.path.join(settings.MEDIA_ROOT, thumbnail_path(rel_path, s).replace("/", os.sep)) for s in settings.THUMBNAIL_SIZES]
+    for path in [abs_path, *thumbs]:
+        if os.path.exists(path) and os.path.isfile(path):
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+
+def iter_file(path: str, chunk_size: int = 1024 * 1024, remove: bool = False):
+    """Отдаёт файл кусками (для StreamingResponse); remove=True — удалить после отдачи."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,53 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from app.core.config import settings
+from app.core.security import hash_password, verify_password
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS or None,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def shutdown_hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def hash_passwords(plains: list[str]) -> list[str]:
+    """Пакетное хеширование bcrypt на пуле процессов (порядок результатов сохраняется)."""
+    if not plains:
+        return []
+    if settings.PASSWORD_HASH_WORKERS < 0 or len(plains) == 1:
+        return [hash_password(p) for p in plains]
+    pool = _get_pool()
+    chunksize = max(1, len(plains) // (pool._max_workers * 4))
+    return list(pool.map(hash_password, plains, chunksize=chunksize))
+
+
+async def hash_password_async(plain: str) -> str:
+    """Хеширование без блокировки event loop."""
+    if settings.PASSWORD_HASH_WORKERS < 0:
+        return await asyncio.to_thread(hash_password, plain)
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), hash_password, plain)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    if settings.PASSWORD_HASH_WORKERS < 0:
+        return await asyncio.to_thread(verify_password, plain, hashed)
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), verify_password, plain, hashed)
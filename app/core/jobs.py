@@ -0,0 +1,299 @@
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+from sqlalchemy import select, update, func, or_, and_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.files import store_upload
+from app.db.session import SessionLocal
+from app.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class JobHandler:
+    func: Callable
+    max_attempts: int
+
+
+HANDLERS: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str, max_attempts: int | None = None):
+    """Регистрирует обработчик задач вида kind: func(ctx: JobContext) -> dict | None."""
+    def decorator(func):
+        HANDLERS[kind] = JobHandler(func, max_attempts or settings.JOB_MAX_ATTEMPTS)
+        return func
+    return decorator
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def job_dir(job_id: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, "jobs", job_id)
+
+
+def _rel(path: str) -> str:
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace("\\", "/")
+
+
+def _abs(rel_path: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, rel_path.replace("/", os.sep))
+
+
+class JobContext:
+    """То, что видит обработчик: параметры, входной файл, прогресс, отмена, артефакт."""
+
+    def __init__(self, job: Job):
+        self.job_id = job.id
+        self.params = job.params or {}
+        self.input_path = _abs(job.input_path) if job.input_path else None
+        self.workdir = job_dir(job.id)
+        self.artifact_path: str | None = None
+        self.artifact_name: str | None = None
+        self._last_report = 0.0
+        os.makedirs(self.workdir, exist_ok=True)
+
+    def artifact(self, filename: str, download_name: str | None = None) -> str:
+        """Путь для файла-результата внутри каталога задачи."""
+        self.artifact_path = os.path.join(self.workdir, filename)
+        self.artifact_name = download_name or filename
+        return self.artifact_path
+
+    def progress(self, done: int, total: int | None = None, message: str | None = None, force: bool = False):
+        """
+        Сохраняет прогресс (не чаще раза в JOB_PROGRESS_INTERVAL_SEC) и заодно
+        проверяет отмену: при запрошенной отмене бросает JobCancelled.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_report < settings.JOB_PROGRESS_INTERVAL_SEC:
+            return
+        self._last_report = now
+        values = {"progress": done, "heartbeat_at": _now()}
+        if total is not None:
+            values["total"] = total
+        if message is not None:
+            values["message"] = message[:255]
+        # Отдельная короткая сессия: транзакция обработчика остаётся нетронутой
+        with SessionLocal() as db:
+            db.execute(update(Job).where(Job.id == self.job_id).values(**values))
+            cancel = db.scalar(select(Job.cancel_requested).where(Job.id == self.job_id))
+            db.commit()
+        if cancel:
+            raise JobCancelled()
+
+    def check_cancelled(self):
+        with SessionLocal() as db:
+            if db.scalar(select(Job.cancel_requested).where(Job.id == self.job_id)):
+                raise JobCancelled()
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    params: dict | None = None,
+    created_by: int | None = None,
+    input_file=None,
+    input_suffix: str = "",
+) -> Job:
+    """
+    Ставит задачу в очередь. input_file — UploadFile или файловый объект,
+    он копируется в MEDIA_ROOT/jobs/<id>/ до коммита (с лимитом UPLOAD_MAX_BYTES).
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        status=QUEUED,
+        params=params or {},
+        max_attempts=HANDLERS[kind].max_attempts,
+        created_by=created_by,
+        run_after=_now(),
+    )
+    if input_file is not None:
+        stored = store_upload(input_file, os.path.join(job_dir(job.id), f"input{input_suffix}"))
+        job.input_path = _rel(stored.path)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def _remove_input(input_path: str | None):
+    """Входной файл больше не нужен: задача завершилась и повторов не будет."""
+    if input_path and os.path.exists(_abs(input_path)):
+        os.remove(_abs(input_path))
+
+
+def request_cancel(db: Session, job: Job):
+    """
+    Ожидающая задача отменяется сразу, выполняющаяся — при следующем progress().
+    Оба изменения — условные UPDATE, как при захвате задачи воркером: отмена
+    не перезапишет статус задачи, которую воркер успел забрать.
+    """
+    input_path = job.input_path
+    cancelled = db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == QUEUED)
+        .values(status=CANCELLED, finished_at=_now())
+    ).rowcount
+    if not cancelled:
+        db.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status.in_((QUEUED, RUNNING)))
+            .values(cancel_requested=True)
+        )
+    db.commit()
+    if cancelled:
+        _remove_input(input_path)
+
+
+def job_artifact_abspath(job: Job) -> str | None:
+    return _abs(job.artifact_path) if job.artifact_path else None
+
+
+class JobRunner:
+    """
+    Пул потоков-воркеров. Задачи лежат в таблице jobs, поэтому их видят все
+    процессы uvicorn: воркер забирает задачу через SELECT ... FOR UPDATE SKIP LOCKED,
+    а задачи упавшего процесса (нет heartbeat дольше JOB_STALE_SEC) подбираются повторно.
+    """
+
+    def __init__(self, workers: int, poll_interval: float):
+        self.workers = workers
+        self.poll_interval = max(0.1, poll_interval)
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except Exception:
+                logger.exception("Job claim failed")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._execute(job)
+
+    def _claim(self) -> Job | None:
+        now = _now()
+        stale = now - timedelta(seconds=settings.JOB_STALE_SEC)
+        with SessionLocal() as db:
+            job = db.scalar(
+                select(Job)
+                .where(or_(
+                    and_(Job.status == QUEUED, or_(Job.run_after.is_(None), Job.run_after <= now)),
+                    and_(Job.status == RUNNING, Job.heartbeat_at < stale),
+                ))
+                .order_by(Job.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            if job is None:
+                return None
+            if job.status == RUNNING and job.attempts >= job.max_attempts:
+                # Процесс умер посреди последней попытки
+                job.status = FAILED
+                job.error = "Worker lost"
+                job.finished_at = now
+                db.commit()
+                _remove_input(job.input_path)
+                return None
+            # Условный UPDATE — задачу не заберут дважды даже без SKIP LOCKED
+            claimed = db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == job.status, Job.attempts == job.attempts)
+                .values(status=RUNNING, attempts=Job.attempts + 1, started_at=now, heartbeat_at=now)
+            ).rowcount
+            db.commit()
+            if not claimed:
+                return None
+            db.refresh(job)
+            db.expunge(job)
+            return job
+
+    def _heartbeat(self, job_id: str, done: threading.Event):
+        # Задача без вызовов progress() не должна считаться брошенной
+        interval = max(1.0, settings.JOB_STALE_SEC / 3)
+        while not done.wait(interval):
+            try:
+                with SessionLocal() as db:
+                    db.execute(update(Job).where(Job.id == job_id).values(heartbeat_at=_now()))
+                    db.commit()
+            except Exception:
+                logger.exception("Job heartbeat failed")
+
+    def _execute(self, job: Job):
+        handler = HANDLERS.get(job.kind)
+        ctx = JobContext(job)
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job.id, done), daemon=True).start()
+        values: dict = {}
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind {job.kind}")
+            result = handler.func(ctx)
+            values.update(status=DONE, result=result, error=None, progress=func.coalesce(Job.total, Job.progress))
+            if ctx.artifact_path:
+                values.update(artifact_path=_rel(ctx.artifact_path), artifact_name=ctx.artifact_name)
+        except JobCancelled:
+            values.update(status=CANCELLED, message="Отменено")
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            values["error"] = "".join(traceback.format_exception_only(type(e), e)).strip()[:4000]
+            if job.attempts < job.max_attempts:
+                values.update(
+                    status=QUEUED,
+                    run_after=_now() + timedelta(seconds=settings.JOB_RETRY_DELAY_SEC * job.attempts),
+                )
+            else:
+                values["status"] = FAILED
+        finally:
+            done.set()
+        if values["status"] != QUEUED:
+            values["finished_at"] = _now()
+        with SessionLocal() as db:
+            db.execute(update(Job).where(Job.id == job.id).values(**values))
+            db.commit()
+        if values["status"] != QUEUED:
+            _remove_input(job.input_path)
+
+
+job_runner = JobRunner(workers=settings.JOB_WORKERS, poll_interval=settings.JOB_POLL_INTERVAL_SEC)
@@ -0,0 +1,132 @@
+"""
+Отдача файлов из MEDIA_ROOT: ETag/Last-Modified, условные 304, Range (206/416)
+и, при MEDIA_ACCEL=nginx|sendfile, передача самих байтов фронтовому прокси
+через X-Accel-Redirect / X-Sendfile — воркер uvicorn тогда отвечает только заголовками.
+"""
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from app.core.config import settings
+
+CHUNK_SIZE = 256 * 1024
+# Файлы в blobs/ названы по sha256 содержимого и никогда не меняются
+_BLOB_RE = re.compile(r"^blobs/[0-9a-f]{2}/([0-9a-f]{64})(\.[^/]*)?$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag(rel_path: str, st: os.stat_result) -> tuple[str, bool]:
+    """Сильный ETag и признак неизменяемого файла."""
+    m = _BLOB_RE.match(rel_path)
+    if m:
+        return f'"{m.group(1)}"', True
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"', False
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        tags = [t.strip() for t in inm.split(",")]
+        # для GET/HEAD сравнение слабое: W/"x" совпадает с "x"
+        return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(request: Request, size: int, etag: str, last_modified: str) -> tuple[int, int] | None:
+    """
+    (start, end) включительно для одиночного диапазона или None — отдать файл целиком.
+    Несколько диапазонов не поддерживаются (RFC разрешает ответить 200).
+    """
+    header = request.headers.get("range")
+    if not header or size == 0:
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range and if_range not in (etag, last_modified):
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+    else:
+        start, end = max(0, size - int(m.group(2))), size - 1
+    if start >= size or start > end:
+        raise HTTPException(416, "Range Not Satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def _iter_range(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def media_response(
+    request: Request,
+    rel_path: str,
+    download_name: str | None = None,
+    cache_control: str | None = None,
+) -> Response:
+    """
+    Ответ для файла MEDIA_ROOT/rel_path (путь уже проверен вызывающим).
+    cache_control заменяет публичный Cache-Control по умолчанию (например, для личных файлов).
+    """
+    path = os.path.join(settings.MEDIA_ROOT, rel_path.replace("/", os.sep))
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise HTTPException(404, "Not Found")
+    if not os.path.isfile(path):
+        raise HTTPException(404, "Not Found")
+
+    etag, immutable = _etag(rel_path, st)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control or (
+            "public, max-age=31536000, immutable" if immutable
+            else f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}, must-revalidate"
+        ),
+    }
+    if download_name:
+        headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(download_name)}"
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(download_name or path)[0] or "application/octet-stream"
+    if settings.MEDIA_ACCEL == "nginx":
+        # nginx сам отдаёт файл из internal-location и обрабатывает Range
+        headers["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + quote(rel_path)
+        return Response(headers=headers, media_type=media_type)
+    if settings.MEDIA_ACCEL == "sendfile":
+        headers["X-Sendfile"] = os.path.abspath(path)
+        return Response(headers=headers, media_type=media_type)
+
+    rng = _parse_range(request, st.st_size, etag, last_modified)
+    start, end = rng if rng else (0, st.st_size - 1)
+    length = end - start + 1 if st.st_size else 0
+    headers["Content-Length"] = str(length)
+    status = 200
+    if rng:
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(_iter_range(path, start, length), status_code=status, headers=headers, media_type=media_type)
@@ -0,0 +1,140 @@
+"""
+Хранилище загрузок по содержимому: файл кладётся в MEDIA_ROOT/blobs/<aa>/<sha256><ext>,
+одинаковые файлы (например, один PDF для десяти групп) хранятся один раз.
+Записи хранят обычный относительный путь, а media_blobs.ref_count считает ссылки;
+файл удаляется с диска, только когда счётчик дошёл до нуля, и только после коммита.
+Новый файл встаёт на место тоже только при коммите внешней транзакции
+(SAVEPOINT не в счёт), при откате его временная копия удаляется.
+"""
+import os
+import uuid
+from sqlalchemy import select, update, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.files import store_upload, delete_file_if_local, thumbnail_path
+from app.models.media import MediaBlob
+
+BLOB_DIR = "blobs"
+_PENDING_KEY = "media_store_delete"
+_PENDING_MOVE_KEY = "media_store_move"
+_MOVED_KEY = "media_store_moved"
+
+
+def _rel(path: str) -> str:
+    """Путь относительно MEDIA_ROOT; принимает и вид 'media/...' (новости, достижения)."""
+    rel = path.replace("\\", "/").lstrip("/")
+    prefix = settings.MEDIA_URL.strip("/") + "/"
+    return rel[len(prefix):] if rel.startswith(prefix) else rel
+
+
+def site_path(rel: str) -> str:
+    """'blobs/..' -> 'media/blobs/..': в таком виде пути хранят новости и достижения."""
+    return f"{settings.MEDIA_URL.strip('/')}/{rel}"
+
+
+def _abs(rel: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, rel.replace("/", os.sep))
+
+
+def store_blob(db: Session, file, filename: str | None = None, max_bytes: int | None = None) -> str:
+    """
+    Сохраняет загрузку и возвращает путь относительно MEDIA_ROOT. Если такой
+    файл уже есть, увеличивает его ref_count, а новая копия удаляется.
+    Изменения в media_blobs попадают в транзакцию db; новый файл появляется
+    по этому пути только после её коммита.
+    """
+    tmp_dir = os.path.join(settings.MEDIA_ROOT, "tmp")
+    stored = store_upload(file, os.path.join(tmp_dir, f"{uuid.uuid4().hex}.upload"), max_bytes)
+    name = filename if filename is not None else getattr(file, "filename", None)
+    ext = os.path.splitext(name or "")[1].lower()[:16]
+
+    try:
+        for _ in range(3):
+            existing = db.scalar(select(MediaBlob.path).where(MediaBlob.sha256 == stored.sha256))
+            if existing is None:
+                rel = f"{BLOB_DIR}/{stored.sha256[:2]}/{stored.sha256}{ext}"
+                try:
+                    with db.begin_nested():
+                        db.add(MediaBlob(sha256=stored.sha256, path=rel, size=stored.size, ref_count=1))
+                except IntegrityError:
+                    continue  # тот же файл параллельно загрузил кто-то ещё
+                db.info.setdefault(_PENDING_MOVE_KEY, []).append((stored.path, rel))
+                stored = None
+                return rel
+            bumped = db.execute(
+                update(MediaBlob).where(MediaBlob.sha256 == stored.sha256).values(ref_count=MediaBlob.ref_count + 1)
+            ).rowcount
+            if bumped:
+                return existing
+            # blob только что удалили — пробуем заново
+        raise RuntimeError(f"Не удалось сохранить файл {stored.sha256}")
+    finally:
+        if stored is not None and os.path.exists(stored.path):
+            os.remove(stored.path)
+
+
+def release_blob(db: Session, path: str | None):
+    """
+    Снимает ссылку на файл. Blob с нулевым счётчиком удаляется из БД сразу,
+    а с диска — после коммита db. Пути вне хранилища (старые загрузки) удаляются как раньше.
+    """
+    if not path:
+        return
+    rel = _rel(path)
+    blob = db.scalar(select(MediaBlob).where(MediaBlob.path == rel).with_for_update())
+    if blob is None:
+        if not rel.startswith(BLOB_DIR + "/"):
+            delete_file_if_local(rel)
+        return
+    db.execute(update(MediaBlob).where(MediaBlob.id == blob.id).values(ref_count=MediaBlob.ref_count - 1))
+    db.refresh(blob)
+    if blob.ref_count <= 0:
+        db.delete(blob)
+        # сразу, а не при коммите (autoflush выключен): иначе store_blob того же файла
+        # в этой транзакции найдёт обречённую строку и вернёт путь к удаляемому файлу
+        db.flush()
+        db.info.setdefault(_PENDING_KEY, []).append(rel)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@event.listens_for(Session, "before_commit")
+def _place_stored_files(session: Session):
+    # before/after_commit срабатывают и на RELEASE SAVEPOINT — ждём внешний коммит
+    if session.in_nested_transaction():
+        return
+    moved = session.info.setdefault(_MOVED_KEY, set())
+    for tmp, rel in session.info.pop(_PENDING_MOVE_KEY, ()):
+        os.makedirs(os.path.dirname(_abs(rel)), exist_ok=True)
+        os.replace(tmp, _abs(rel))
+        moved.add(rel)
+
+
+@event.listens_for(Session, "after_commit")
+def _remove_released_files(session: Session):
+    if session.in_nested_transaction():
+        return
+    # файл освободили и тут же загрузили заново в той же транзакции — он снова нужен
+    moved = session.info.pop(_MOVED_KEY, set())
+    for rel in session.info.pop(_PENDING_KEY, ()):
+        if rel in moved:
+            continue
+        for path in [rel, *(thumbnail_path(rel, s) for s in settings.THUMBNAIL_SIZES)]:
+            _remove_quietly(_abs(path))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_pending_files(session: Session, transaction):
+    # внешняя транзакция закончилась без коммита (rollback, close): строк media_blobs нет
+    if transaction.parent is not None:
+        return
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_MOVED_KEY, None)
+    for tmp, _ in session.info.pop(_PENDING_MOVE_KEY, ()):
+        _remove_quietly(tmp)
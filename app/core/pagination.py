@@ -0,0 +1,102 @@
+"""
+Keyset-пагинация списков: страница — это «следующие limit строк после курсора»
+по устойчивому порядку (ключ сортировки, id), поэтому время запроса не зависит
+от номера страницы (в отличие от OFFSET). Курсор непрозрачен для клиента:
+base64 от значений ключа последней строки. Тело ответа остаётся списком,
+курсор следующей страницы приходит в заголовке X-Next-Cursor (нет заголовка — страниц больше нет).
+Пагинация включается, только если клиент передал limit или cursor: без них список
+отдаётся целиком, как раньше, чтобы старые клиенты не получали молча первую страницу.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Sequence
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select, tuple_
+from app.core.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class PageParams:
+    limit: int | None
+    cursor: str | None
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit is not None
+
+
+def page_params(
+    limit: int | None = Query(
+        None, ge=1, le=settings.PAGE_SIZE_MAX,
+        description="Размер страницы (без limit и cursor — весь список)",
+    ),
+    cursor: str | None = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+) -> PageParams:
+    if cursor and limit is None:
+        limit = settings.PAGE_SIZE_DEFAULT
+    return PageParams(limit=limit, cursor=cursor)
+
+
+def _dump(v: Any):
+    if isinstance(v, datetime):
+        return {"dt": v.isoformat()}
+    if isinstance(v, date):
+        return {"d": v.isoformat()}
+    return v
+
+
+def _load(v: Any):
+    if isinstance(v, dict):
+        if "dt" in v:
+            return datetime.fromisoformat(v["dt"])
+        if "d" in v:
+            return date.fromisoformat(v["d"])
+    return v
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_dump(v) for v in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_load(v) for v in json.loads(raw)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size or any(v is None for v in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset(q: Select, keys: Sequence, page: PageParams, descending: bool = True) -> Select:
+    """
+    Добавляет к запросу порядок по keys (последним должен идти уникальный id),
+    условие «после курсора» и LIMIT page.limit + 1 — лишняя строка говорит,
+    есть ли следующая страница (см. finish_page). Ключи должны быть NOT NULL.
+    Без пагинации — только порядок.
+    """
+    order = [k.desc() for k in keys] if descending else list(keys)
+    if not page.enabled:
+        return q.order_by(*order)
+    if page.cursor:
+        values = decode_cursor(page.cursor, len(keys))
+        row, after = tuple_(*keys), tuple_(*values)
+        q = q.where(row < after if descending else row > after)
+    return q.order_by(*order).limit(page.limit + 1)
+
+
+def finish_page(items: list, page: PageParams, response: Response, key) -> list:
+    """
+    Обрезает лишнюю строку и, если она была, кладёт курсор следующей страницы
+    в заголовок ответа. key(item) -> значения ключей в том же порядке, что в keyset().
+    """
+    if page.enabled and len(items) > page.limit:
+        items = items[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key(items[-1]))
+    return items
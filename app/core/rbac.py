@@ -0,0 +1,168 @@
+import threading
+import time
+from dataclasses import dataclass
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.user import User
+from app.models.role import Role, Permission, user_roles, role_permissions
+from app.models.grade import Student
+from app.models.schedule import Teacher
+
+
+@dataclass(frozen=True)
+class UserAccess:
+    """Эффективные роли и права пользователя."""
+    roles: frozenset[str]
+    permissions: frozenset[str]
+
+    @property
+    def is_admin(self) -> bool:
+        return "administrator" in self.roles
+
+    def has_role(self, name: str) -> bool:
+        return name in self.roles
+
+    def has_any_role(self, names) -> bool:
+        return not self.roles.isdisjoint(names)
+
+    def has_permission(self, code: str) -> bool:
+        # Админ может всё
+        return self.is_admin or code in self.permissions
+
+
+def load_user_access(db: Session, user_id: int) -> UserAccess:
+    """Роли и права пользователя одним запросом."""
+    rows = db.execute(
+        select(Role.name, Permission.code)
+        .select_from(user_roles)
+        .join(Role, Role.id == user_roles.c.role_id)
+        .outerjoin(role_permissions, role_permissions.c.role_id == Role.id)
+        .outerjoin(Permission, Permission.id == role_permissions.c.permission_id)
+        .where(user_roles.c.user_id == user_id)
+    ).all()
+    return UserAccess(
+        roles=frozenset(r for r, _ in rows),
+        permissions=frozenset(p for _, p in rows if p),
+    )
+
+
+class AccessCache:
+    """
+    Кэш снимков доступа в памяти процесса с TTL.
+    Каждая запись помечается users.access_version; get_current_user сверяет
+    метку с загруженной строкой пользователя, поэтому изменения ролей,
+    сделанные в другом воркере, подхватываются уже на следующем запросе.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._items: dict[int, tuple[float, int | None, UserAccess]] = {}
+        self._versions: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def peek(self, user_id: int) -> UserAccess | None:
+        item = self._items.get(user_id)
+        if item and item[0] > time.monotonic():
+            return item[2]
+        return None
+
+    def store(self, user_id: int, access: UserAccess):
+        with self._lock:
+            self._items[user_id] = (time.monotonic() + self.ttl, self._versions.get(user_id), access)
+
+    def get(self, db: Session, user_id: int) -> UserAccess:
+        access = self.peek(user_id)
+        if access is None:
+            access = load_user_access(db, user_id)
+            self.store(user_id, access)
+        return access
+
+    def put(self, user_id: int, version: int, access: UserAccess):
+        with self._lock:
+            self._versions[user_id] = version
+            self._items[user_id] = (time.monotonic() + self.ttl, version, access)
+
+    def sync_version(self, user_id: int, version: int):
+        """Сбрасывает запись, если она снята при другой версии прав пользователя."""
+        with self._lock:
+            self._versions[user_id] = version
+            item = self._items.get(user_id)
+            if item and item[1] != version:
+                self._items.pop(user_id, None)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._items.pop(user_id, None)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._items.clear()
+
+
+access_cache = AccessCache(ttl=settings.RBAC_CACHE_TTL_SEC)
+
+
+def get_user_access(db: Session, user_id: int) -> UserAccess:
+    return access_cache.get(db, user_id)
+
+
+async def get_user_access_async(adb: AsyncSession, user_id: int) -> UserAccess:
+    access = access_cache.peek(user_id)
+    if access is None:
+        access = await adb.run_sync(load_user_access, user_id)
+        access_cache.store(user_id, access)
+    return access
+
+
+def user_has_role(db: Session, user_id: int, role_name: str) -> bool:
+    """Проверка роли пользователя."""
+    return get_user_access(db, user_id).has_role(role_name)
+
+
+def bump_user_access(db: Session, user_id: int):
+    """Отмечает изменение ролей пользователя: старые токены и кэш перестают считаться актуальными."""
+    db.execute(update(User).where(User.id == user_id).values(access_version=User.access_version + 1))
+    access_cache.invalidate_user(user_id)
+
+
+def bump_role_access(db: Session, role_id: int):
+    """То же для всех носителей роли — при изменении прав самой роли."""
+    db.execute(
+        update(User)
+        .where(User.id.in_(select(user_roles.c.user_id).where(user_roles.c.role_id == role_id)))
+        .values(access_version=User.access_version + 1)
+    )
+    access_cache.invalidate_all()
+
+
+def build_token_claims(db: Session, user: User) -> dict:
+    """Доп. поля access-токена: id, роли, права, метка версии прав и id профилей."""
+    access = load_user_access(db, user.id)
+    student_id = db.scalar(select(Student.id).where(Student.user_id == user.id))
+    teacher_id = db.scalar(select(Teacher.id).where(Teacher.user_id == user.id))
+    return {
+        "uid": user.id,
+        "roles": sorted(access.roles),
+        "perms": sorted(access.permissions),
+        "pv": user.access_version or 0,
+        "sid": student_id,
+        "tid": teacher_id,
+    }
+
+
+def apply_token_claims(user: User, payload: dict) -> bool:
+    """
+    Если метка "pv" токена совпадает с users.access_version, роли и права
+    из токена кладутся в кэш без запроса к БД. Иначе токен работает как обычный.
+    """
+    version = user.access_version or 0
+    if payload.get("uid") != user.id or payload.get("pv") != version:
+        access_cache.sync_version(user.id, version)
+        return False
+    access_cache.put(user.id, version, UserAccess(
+        roles=frozenset(payload.get("roles") or ()),
+        permissions=frozenset(payload.get("perms") or ()),
+    ))
+    return True
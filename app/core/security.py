@@ -3,7 +3,7 @@ from passlib.context import CryptContext
 import jwt
 from app.core.config import settings
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def hash_password(plain: str) -> str:
     return pwd_ctx.hash(plain)
@@ -11,9 +11,9 @@ def hash_password(plain: str) -> str:
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_ctx.verify(plain, hashed)
 
-def create_access_token(sub: str) -> str:
+def create_access_token(sub: str, claims: dict | None = None) -> str:
     exp = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRES_MIN)
-    payload = {"sub": sub, "exp": exp}
+    payload = {**(claims or {}), "sub": sub, "exp": exp}
     return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
 
 def decode_token(token: str):
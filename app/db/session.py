@@ -1,6 +1,164 @@
+import threading
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, future=True)
+
+class PoolStats:
+    """Счётчики ожидания соединения из пула."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, waited: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.wait_total * 1000, 1),
+                "wait_avg_ms": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 1),
+            }
+
+
+POOL_STATS: dict[str, PoolStats] = {}
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool, замеряющий время ожидания checkout (ключ — pool_logging_name движка)."""
+
+    def _do_get(self):
+        stats = POOL_STATS.setdefault(self._orig_logging_name or "default", PoolStats())
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            stats.timeout()
+            raise
+        stats.record(time.perf_counter() - started)
+        return conn
+
+
+def _make_engine(name: str, pool_size: int, max_overflow: int, statement_timeout_ms: int):
+    connect_args = {}
+    if settings.DATABASE_URL.startswith("postgresql"):
+        connect_args = {
+            "application_name": f"{settings.DB_APPLICATION_NAME}:{name}",
+            "options": f"-c statement_timeout={statement_timeout_ms}",
+        }
+    return create_engine(
+        settings.DATABASE_URL,
+        pool_pre_ping=True,
+        future=True,
+        poolclass=MeteredQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=settings.DB_POOL_RECYCLE_SEC,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SEC,
+        pool_logging_name=name,
+        connect_args=connect_args,
+    )
+
+
+engine = _make_engine(
+    "main", settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.DB_STATEMENT_TIMEOUT_MS
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+# Отдельный небольшой пул для тяжёлых отчётов (выгрузка оценок, сводки по успеваемости),
+# чтобы они не выбирали соединения интерактивных запросов
+report_engine = _make_engine(
+    "report", settings.DB_REPORT_POOL_SIZE, settings.DB_REPORT_MAX_OVERFLOW, settings.DB_REPORT_STATEMENT_TIMEOUT_MS
+)
+ReportSessionLocal = sessionmaker(bind=report_engine, autoflush=False, autocommit=False, future=True)
+
+
+
+def _async_database_url() -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = settings.DATABASE_URL
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+# Асинхронный движок (asyncpg) для горячих эндпоинтов чтения.
+# Создаётся при первом обращении, чтобы синхронная часть не зависела от asyncpg.
+_async_engine = None
+_async_session_factory = None
+_async_lock = threading.Lock()
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                url = _async_database_url()
+                kwargs = {}
+                if url.startswith("postgresql+asyncpg"):
+                    kwargs = dict(
+                        pool_size=settings.DB_ASYNC_POOL_SIZE,
+                        max_overflow=settings.DB_ASYNC_MAX_OVERFLOW,
+                        pool_recycle=settings.DB_POOL_RECYCLE_SEC,
+                        pool_timeout=settings.DB_POOL_TIMEOUT_SEC,
+                        connect_args={"server_settings": {
+                            "application_name": f"{settings.DB_APPLICATION_NAME}:async",
+                            "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+                        }},
+                    )
+                _async_engine = create_async_engine(url, pool_pre_ping=True, **kwargs)
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory()
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def pool_status() -> dict:
+    result = {}
+    engines = [("main", engine), ("report", report_engine)]
+    if _async_engine is not None:
+        engines.append(("async", _async_engine))
+    for name, eng in engines:
+        pool = eng.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        result[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checked_in": pool.checkedin(),
+            **POOL_STATS.get(name, PoolStats()).snapshot(),
+        }
+    return result
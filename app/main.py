@@ -1,12 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from app.core.config import settings
 from app.core.audit_middleware import AuditMiddleware
+from app.core.audit_writer import audit_writer
+from app.core.hashing import shutdown_hash_pool
+from app.core.jobs import job_runner
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.services.draft_answers import draft_buffer
+from app.services.attempt_expiry import attempt_sweeper
+from app.services import job_handlers  # noqa: F401 — регистрация обработчиков задач
+from app.db.session import dispose_async_engine
 from app.routers import ping, auth, roles, users, schedules, grades, news, admin, applications
 from app.routers import materials, me, study, director, admin_schedule, achievement, document_orders
 from app.routers import admin_user_import
-from app.routers import tests
+from app.routers import tests, jobs, media
 def custom_generate_unique_id(route):
     return f"{route.tags[0]}_{route.name}" if route.tags else route.name
 
@@ -14,18 +20,37 @@ app = FastAPI(title="ЛК ДГТУ",
     version="2.3.1",
     generate_unique_id_function=custom_generate_unique_id,)
 
-app.mount(settings.MEDIA_URL, StaticFiles(directory=settings.MEDIA_ROOT), name="media")
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # курсор следующей страницы списков — браузер отдаст его скрипту только так
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.add_middleware(AuditMiddleware)
 
+@app.on_event("startup")
+def start_background_workers():
+    audit_writer.start()
+    job_runner.start()
+    draft_buffer.start()
+    attempt_sweeper.start()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    attempt_sweeper.stop()
+    draft_buffer.stop()
+    job_runner.stop()
+    audit_writer.stop()
+    shutdown_hash_pool()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await dispose_async_engine()
+
 app.include_router(ping.router)
 app.include_router(auth.router)
 app.include_router(me.router)
@@ -42,3 +67,5 @@ app.include_router(schedules.router)
 app.include_router(grades.router)
 app.include_router(tests.router)
 app.include_router(news.router)
+app.include_router(jobs.router)
+app.include_router(media.router)
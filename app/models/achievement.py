@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Enum, Date, DateTime, func
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Enum, Date, DateTime, func, Index
 from sqlalchemy.orm import relationship
 import enum
 
@@ -21,6 +21,9 @@ class AchievementType(str, enum.Enum):
 
 class Achievement(Base):
     __tablename__ = "achievements"
+    __table_args__ = (
+        Index("ix_achievements_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy import (
-    Integer, String, Text, DateTime, Enum, ForeignKey
+    Integer, String, Text, DateTime, Enum, ForeignKey, Index
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
@@ -24,6 +24,9 @@ ApplicationStatusEnum = Enum(
 
 class Application(Base):
     __tablename__ = "applications"
+    __table_args__ = (
+        Index("ix_applications_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     student_id: Mapped[int] = mapped_column(ForeignKey("students.id"), index=True)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Integer, String, DateTime, ForeignKey, Enum, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 
@@ -14,6 +14,9 @@ OrderStatusEnum = Enum(
 
 class DocumentOrder(Base):
     __tablename__ = "document_orders"
+    __table_args__ = (
+        Index("ix_document_orders_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     student_id: Mapped[int] = mapped_column(ForeignKey("students.id"), index=True)
@@ -1,10 +1,17 @@
 from datetime import datetime
 from sqlalchemy import (
-    Integer, String, DateTime, ForeignKey, Text, UniqueConstraint
+    Integer, String, DateTime, ForeignKey, Text, UniqueConstraint, Index, Boolean, false
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 from app.db.base import Base
 
+# Типы оценок, которые считаются итоговыми по предмету
+FINAL_GRADE_TYPES = ("итог", "final", "exam", "зачет")
+
+
+def is_final_type(grade_type: str | None) -> bool:
+    return bool(grade_type) and grade_type.strip().lower() in FINAL_GRADE_TYPES
+
 
 class Student(Base):
     __tablename__ = "students"
@@ -57,6 +64,10 @@ class Grade(Base):
     __tablename__ = "grades"
     __table_args__ = (
         UniqueConstraint("student_id", "lesson_id", "grade_type", name="uq_grade_per_lesson_type"),
+        Index("ix_grades_graded_at_id", "graded_at", "id"),
+        Index("ix_grades_student_subject_type", "student_id", "subject_id", "grade_type"),
+        Index("ix_grades_student_subject_final", "student_id", "subject_id", "is_final"),
+        Index("ix_grades_teacher_graded_at", "teacher_id", "graded_at"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -83,6 +94,8 @@ class Grade(Base):
     )
 
     grade_type: Mapped[str] = mapped_column(String(30))
+    # вычисляется из grade_type (см. FINAL_GRADE_TYPES), чтобы поиск итоговой шёл по индексу
+    is_final: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
     value: Mapped[str] = mapped_column(String(10))
     graded_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
     comment: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -96,3 +109,8 @@ class Grade(Base):
     teacher = relationship("Teacher")
     lesson = relationship("Lesson")
     modified_by_admin = relationship("User", foreign_keys=[modified_by_admin_id])
+
+    @validates("grade_type")
+    def _sync_is_final(self, key, value):
+        self.is_final = is_final_type(value)
+        return value
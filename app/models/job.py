@@ -0,0 +1,39 @@
+from datetime import datetime
+from sqlalchemy import Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+
+class Job(Base):
+    """Фоновая задача (импорт/экспорт), выполняется воркерами app/core/jobs.py."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), index=True)
+    # queued | running | done | failed | cancelled
+    status: Mapped[str] = mapped_column(String(20), default="queued", server_default="queued")
+    params: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    input_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
+
+    progress: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    total: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    message: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    artifact_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    artifact_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    max_attempts: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
+
+    created_by: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    run_after: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
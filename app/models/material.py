@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy import (
-    Integer, String, DateTime, ForeignKey, Boolean, Text, Enum
+    Integer, String, DateTime, ForeignKey, Boolean, Text, Enum, Index
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
@@ -12,6 +12,9 @@ MaterialTypeEnum = Enum(
 
 class Material(Base):
     __tablename__ = "materials"
+    __table_args__ = (
+        Index("ix_materials_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy import Integer, BigInteger, String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+
+class MediaBlob(Base):
+    """
+    Файл в хранилище по содержимому (MEDIA_ROOT/blobs/...). Одинаковые загрузки
+    хранятся один раз; ref_count — число записей (материалов, новостей и т.п.),
+    которые на него ссылаются.
+    """
+    __tablename__ = "media_blobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), unique=True)
+    path: Mapped[str] = mapped_column(String(512), unique=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    ref_count: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
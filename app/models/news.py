@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy import (
-    Integer, String, Boolean, DateTime, ForeignKey, Text, func, Table, Column
+    Integer, String, Boolean, DateTime, ForeignKey, Text, func, Table, Column, Index
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
@@ -21,6 +21,10 @@ class Tag(Base):
 
 class News(Base):
     __tablename__ = "news"
+    __table_args__ = (
+        Index("ix_news_published_at_id", "published_at", "id"),
+        Index("ix_news_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(255))
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from datetime import datetime, timedelta
 from sqlalchemy import (
-    Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Enum, UniqueConstraint
+    Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Enum, UniqueConstraint, Index
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
@@ -48,6 +48,9 @@ class AttemptStatus(str, enum.Enum):
 
 class Test(Base):
     __tablename__ = "tests"
+    __table_args__ = (
+        Index("ix_tests_created_at_id", "created_at", "id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(255))
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -61,6 +64,8 @@ class Test(Base):
     teacher_id: Mapped[int | None] = mapped_column(ForeignKey("teachers.id"), nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # растёт при каждом изменении вопросов; по нему сверяется кэш ключа ответов
+    answer_key_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     questions = relationship("Question", back_populates="test", cascade="all, delete-orphan")
     groups = relationship("TestGroupAccess", back_populates="test", cascade="all, delete-orphan")
@@ -95,6 +100,10 @@ class TestGroupAccess(Base):
 
 class TestAttempt(Base):
     __tablename__ = "test_attempts"
+    __table_args__ = (
+        UniqueConstraint("student_id", "test_id", "attempt_number", name="uq_attempt_number"),
+        Index("ix_test_attempts_status_started_at", "status", "started_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     student_id: Mapped[int] = mapped_column(
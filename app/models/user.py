@@ -16,6 +16,11 @@ class User(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     last_login: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+    # Растёт при любом изменении ролей/прав пользователя; сверяется с меткой "pv" в токене
+    access_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+    # Не колонка: AuthContext текущего запроса, его проставляет get_current_user
+    auth_context = None
 
     students = relationship(
         "Student",
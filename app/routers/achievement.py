@@ -1,36 +1,27 @@
-import os
-import uuid
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Security
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Security, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.core.deps import get_db, require_permission, get_current_user
+from app.core.media_store import store_blob, release_blob, site_path
+from app.core.pagination import PageParams, page_params, keyset, finish_page
 from app.models.achievement import Achievement, AchievementStatus, AchievementType
 from app.schemas.achievement import AchievementOut
 from app.models.user import User
 from typing import Optional, List
 
-MEDIA_DIR = "media/achievements"
-os.makedirs(MEDIA_DIR, exist_ok=True)
-
 router = APIRouter(prefix="/achievements", tags=["achievements"])
 
 
-def save_file(student_id: int, file: UploadFile) -> str:
-    ext = os.path.splitext(file.filename)[1]
-    unique_name = f"{student_id}_{uuid.uuid4().hex}{ext}"
-    filepath = os.path.join(MEDIA_DIR, unique_name)
-    with open(filepath, "wb") as buffer:
-        buffer.write(file.file.read())
-    return filepath
+def save_file(db: Session, file: UploadFile) -> str:
+    return site_path(store_blob(db, file))
 
 
-def delete_file(path: str):
-    if path and os.path.exists(path):
-        os.remove(path)
+def delete_file(db: Session, path: str):
+    release_blob(db, path)
 
 @router.post("/", response_model=AchievementOut)
-async def create_achievement(
+def create_achievement(
     student_id: int = Form(...),
     name: str = Form(...),
     description: str = Form(...),
@@ -45,7 +36,7 @@ async def create_achievement(
 ):
     image_path = None
     if image:
-        image_path = save_file(student_id, image)
+        image_path = save_file(db, image)
 
     ach = Achievement(
         student_id=student_id,
@@ -66,17 +57,19 @@ async def create_achievement(
 
 @router.get("/", response_model=List[AchievementOut], dependencies=[Depends(require_permission("achievements:read"))])
 def list_achievements(
+    response: Response,
     db: Session = Depends(get_db),
     type: Optional[AchievementType] = Query(None),
     status: Optional[AchievementStatus] = Query(None),
+    page: PageParams = Depends(page_params),
 ):
     query = select(Achievement)
     if type:
         query = query.where(Achievement.type == type)
     if status:
         query = query.where(Achievement.status == status)
-    query = query.order_by(Achievement.created_at.desc())
-    return db.scalars(query).all()
+    items = db.scalars(keyset(query, (Achievement.created_at, Achievement.id), page)).all()
+    return finish_page(items, page, response, lambda a: (a.created_at, a.id))
 
 
 @router.get("/student/{student_id}", response_model=List[AchievementOut])
@@ -97,7 +90,7 @@ def get_achievement(achievement_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{achievement_id}/patch", response_model=AchievementOut, dependencies=[Depends(require_permission("achievements:update"))])
-async def update_achievement(
+def update_achievement(
     achievement_id: int,
     name: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
@@ -132,8 +125,8 @@ async def update_achievement(
         ach.approved_by = approved_by
 
     if image:
-        delete_file(ach.image_path)
-        ach.image_path = save_file(ach.student_id, image)
+        delete_file(db, ach.image_path)
+        ach.image_path = save_file(db, image)
 
     db.commit()
     db.refresh(ach)
@@ -155,7 +148,7 @@ def delete_student_achievement(
     if not ach:
         raise HTTPException(status_code=404, detail="Achievement not found")
 
-    delete_file(ach.image_path)
+    delete_file(db, ach.image_path)
     db.delete(ach)
     db.commit()
     return {"ok": True}
@@ -170,7 +163,7 @@ def admin_delete_achievement(
     if not ach:
         raise HTTPException(status_code=404, detail="Achievement not found")
 
-    delete_file(ach.image_path)
+    delete_file(db, ach.image_path)
     db.delete(ach)
     db.commit()
     return {"ok": True}
@@ -7,6 +7,8 @@ import secrets, string
 
 from app.core.deps import get_db, get_current_user, require_permission, is_admin, require_role_any, require_admin
 from app.core.security import hash_password
+from app.core.rbac import access_cache, bump_user_access, bump_role_access
+from app.core.files import thumbnail_url
 
 from app.models.user import User
 from app.models.role import Role, Permission, user_roles, role_permissions
@@ -39,6 +41,9 @@ router = APIRouter(
     dependencies=[Depends(require_admin)],
 )
 
+# Размер превью аватара в списках пользователей
+LIST_THUMB_SIZE = 64
+
 ROLE_ALIASES = {
     "admin": "administrator",
     "administrator": "administrator",
@@ -108,6 +113,7 @@ def admin_list_users(
             "fullName": u.full_name,
             "dateOfBirth": u.birth_date.isoformat() if u.birth_date else None,
             "photoUrl": u.avatar_url,
+            "photoThumbUrl": thumbnail_url(u.avatar_url, LIST_THUMB_SIZE),
             "course": None,
             "email": u.email,
             "phoneNumber": u.phone,
@@ -125,6 +131,7 @@ def admin_list_users(
             "fullName": d.full_name or u.full_name,
             "dateOfBirth": u.birth_date.isoformat() if u.birth_date else None,
             "photoUrl": u.avatar_url,
+            "photoThumbUrl": thumbnail_url(u.avatar_url, LIST_THUMB_SIZE),
             "course": None,
             "email": d.email or u.email,
             "phoneNumber": d.phone or u.phone,
@@ -142,6 +149,7 @@ def admin_list_users(
             "fullName": t.full_name or u.full_name,
             "dateOfBirth": u.birth_date.isoformat() if u.birth_date else None,
             "photoUrl": u.avatar_url,
+            "photoThumbUrl": thumbnail_url(u.avatar_url, LIST_THUMB_SIZE),
             "course": None,
             "email": t.email or u.email,
             "phoneNumber": t.phone or u.phone,
@@ -163,6 +171,7 @@ def admin_list_users(
             "fullName": u.full_name,
             "dateOfBirth": u.birth_date.isoformat() if u.birth_date else None,
             "photoUrl": u.avatar_url,
+            "photoThumbUrl": thumbnail_url(u.avatar_url, LIST_THUMB_SIZE),
             "course": s.course,
             "email": u.email,
             "phoneNumber": u.phone,
@@ -210,17 +219,20 @@ def admin_update_user_avatar(
         raise HTTPException(status_code=404, detail="User not found")
 
     from app.core.files import save_avatar_file, delete_file_if_local
+    from app.services.thumbnails import enqueue_thumbnails
     rel = save_avatar_file(user.id, file)
 
     delete_file_if_local(user.avatar_url)
     user.avatar_url = rel
     db.commit()
+    enqueue_thumbnails(db, rel)
 
     from app.core.config import settings
     return {
         "user_id": user.id,
         "avatar_path": rel,
         "avatar_url": f"{settings.MEDIA_URL}/{rel}",
+        "thumbnails": {str(s): thumbnail_url(f"{settings.MEDIA_URL}/{rel}", s) for s in settings.THUMBNAIL_SIZES},
     }
 
 @router.get("/audit", dependencies=[Depends(require_permission("audit:read"))])
@@ -249,6 +261,16 @@ def admin_audit_list(
         } for r in rows
     ]
 
+@router.get("/audit/stats", dependencies=[Depends(require_permission("audit:read"))])
+def admin_audit_stats():
+    from app.core.audit_writer import audit_writer
+    return audit_writer.stats()
+
+@router.get("/db/pool")
+def admin_db_pool_status():
+    from app.db.session import pool_status
+    return pool_status()
+
 @router.post("/users", dependencies=[Depends(require_permission("users:create"))])
 def admin_create_user(payload: AdminCreateUser, me=Depends(get_current_user), db: Session = Depends(get_db)):
     if db.scalar(select(User).where(User.email == payload.email)):
@@ -300,6 +322,7 @@ def admin_delete_user(user_id: int, db: Session = Depends(get_db)):
     if not u:
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(u); db.commit()
+    access_cache.invalidate_user(user_id)
     return {"ok": True}
 
 @router.post("/users/{user_id}/roles", dependencies=[Depends(require_permission("roles:assign_roles"))])
@@ -312,6 +335,7 @@ def admin_assign_roles(user_id: int, payload: AdminAssignRoles, me=Depends(get_c
         if not r:
             raise HTTPException(status_code=400, detail=f"Role not found: {name}")
         db.execute(user_roles.insert().values(user_id=user_id, role_id=r.id))
+    bump_user_access(db, user_id)
     db.commit()
     return {"user_id": user_id, "roles": payload.roles}
 
@@ -352,6 +376,7 @@ def admin_grant_permissions(role_id: int, payload: RolePermissionAssignIn, db: S
             p = Permission(code=code, description=code)
             db.add(p); db.flush()
         db.execute(role_permissions.insert().values(role_id=role_id, permission_id=p.id))
+    bump_role_access(db, role_id)
     db.commit()
     return {"role_id": role_id, "granted": payload.permissions}
 
@@ -366,6 +391,7 @@ def admin_revoke_permission(role_id: int, code: str, db: Session = Depends(get_d
             role_permissions.c.permission_id == p.id
         )
     )
+    bump_role_access(db, role_id)
     db.commit()
     return {"role_id": role_id, "revoked": code}
 
@@ -392,6 +418,7 @@ def admin_create_student(payload: StudentCreateIn, db: Session = Depends(get_db)
     )
     if not has_student_role:
         db.execute(user_roles.insert().values(user_id=user.id, role_id=student_role.id))
+    bump_user_access(db, user.id)
 
     student = Student(
         user_id=user.id,
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from app.core.deps import get_db, require_role_any
-from app.services.schedule_importer import parse_schedule_excel
+from app.core.deps import get_db, get_current_user, require_role_any
+from app.core.files import store_upload
+from app.core.jobs import enqueue_job
+from app.services import schedule_importer
 from app.models.schedule import LessonTime, Lesson
 from sqlalchemy import select
 from app.schemas.schedule import LessonCreate, LessonOut, LessonTimeCreate
 from fastapi.responses import FileResponse
+import logging
 import os
 from datetime import time
+from typing import Literal
 from app.services.lesson_service import create_lesson
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/admin/schedule", tags=["admin-schedule"])
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -111,17 +118,35 @@ def update_lesson_time(
     }
 
 @router.post("/import", dependencies=[Depends(require_role_any(["administrator", "director"]))])
-def import_schedule(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def import_schedule(
+    file: UploadFile = File(...),
+    background: bool = Query(False, description="Выполнить фоновой задачей (статус — /jobs/{job_id})"),
+    mode: Literal["append", "sync"] = Query(
+        "append",
+        description="append — добавить строки; sync — обновить занятия групп файла в диапазоне его дат по разнице",
+    ),
+    db: Session = Depends(get_db),
+    me=Depends(get_current_user),
+):
     if not file.filename.endswith((".xls", ".xlsx")):
         raise HTTPException(status_code=400, detail="Файл должен быть Excel (.xls или .xlsx)")
 
+    if background:
+        job = enqueue_job(db, "schedule_import", params={"mode": mode}, created_by=me.id, input_file=file,
+                          input_suffix=os.path.splitext(file.filename)[1])
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+    import tempfile, uuid
+    tmp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4().hex}.xlsx")
+    store_upload(file, tmp_path)
     try:
-        import tempfile, shutil
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
-
-        count = parse_schedule_excel(tmp_path, db)
-        return {"status": "ok", "imported_lessons": count}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при импорте: {e}")
+        result = schedule_importer.import_schedule(db, tmp_path, mode=mode)
+        return {"status": "ok", **result.as_dict()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        # текст исключения (SQL, пути) клиенту не отдаём — он в логе
+        logger.exception("Schedule import failed")
+        raise HTTPException(status_code=500, detail="Ошибка при импорте")
+    finally:
+        os.remove(tmp_path)
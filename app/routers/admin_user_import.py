@@ -1,10 +1,15 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import os
 import tempfile
-from app.core.deps import get_db, require_role_any
-from app.services.user_importer import import_users_from_excel
+import uuid
+from app.core.deps import get_db, get_current_user, require_role_any
+from app.core.files import store_upload_async
+from app.core.jobs import enqueue_job
+from app.services import user_importer
+from app.services.user_importer import EXPORT_NAME
 
 router = APIRouter(prefix="/admin/users/import", tags=["admin-users"])
 
@@ -26,28 +31,42 @@ def download_template():
 @router.post("/")
 async def import_users(
     file: UploadFile = File(...),
+    background: bool = Query(False, description="Выполнить фоновой задачей (статус — /jobs/{job_id})"),
+    dry_run: bool = Query(False, description="Только проверить файл и вернуть ошибки строк, ничего не создавая"),
     db: Session = Depends(get_db),
+    me=Depends(get_current_user),
     _=Depends(require_role_any(["administrator", "director"]))
 ):
-    """📥 Импорт пользователей из Excel и возврат Excel с логинами и паролями"""
+    """📥 Импорт пользователей из Excel и возврат Excel с логинами и паролями (и листом ошибок строк)"""
     if not file.filename.endswith((".xls", ".xlsx")):
         raise HTTPException(400, "Неверный формат файла (требуется .xls или .xlsx)")
 
+    if background:
+        job = await run_in_threadpool(
+            enqueue_job, db, "users_import", params={"dry_run": dry_run},
+            created_by=me.id, input_file=file, input_suffix=os.path.splitext(file.filename)[1],
+        )
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
     os.makedirs(EXPORT_DIR, exist_ok=True)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
+    tmp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4().hex}.xlsx")
+    await store_upload_async(file, tmp_path)
 
     try:
-        export_path = import_users_from_excel(db, tmp_path, EXPORT_DIR)
+        result = await run_in_threadpool(user_importer.import_users, db, tmp_path, EXPORT_DIR, dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     finally:
         os.remove(tmp_path)
 
-    if not os.path.exists(export_path):
+    if dry_run:
+        return result.as_dict()
+    if not result.export_path or not os.path.exists(result.export_path):
         raise HTTPException(500, "Ошибка при создании Excel")
 
     return FileResponse(
-        export_path,
-        filename="результат_импорта.xlsx",
+        result.export_path,
+        filename=EXPORT_NAME,
+        headers={"X-Created-Users": str(result.created_users), "X-Skipped-Rows": str(result.skipped)},
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
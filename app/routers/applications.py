@@ -1,11 +1,11 @@
 import os
-import uuid
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.core.deps import get_db, get_current_user, require_role_any
-from app.core.config import settings
+from app.core.media_store import store_blob
+from app.core.pagination import PageParams, page_params, keyset, finish_page
 from app.models.user import User
 from app.models.grade import Student as StudentModel
 from app.models.application import Application
@@ -13,20 +13,13 @@ from app.schemas.application import ApplicationCreate, ApplicationOut, Applicati
 
 router = APIRouter(prefix="/applications", tags=["applications"])
 
-def save_file(student_id: int, file: UploadFile) -> str:
+def save_file(db: Session, file: UploadFile) -> str:
     """Сохраняет прикреплённый файл"""
     ext = os.path.splitext(file.filename or "")[1] or ".bin"
-    fname = f"{student_id}_{uuid.uuid4().hex}{ext}"
-    rel_dir = os.path.join("applications", str(student_id))
-    abs_dir = os.path.join(settings.MEDIA_ROOT, rel_dir)
-    os.makedirs(abs_dir, exist_ok=True)
-    abs_path = os.path.join(abs_dir, fname)
-    with open(abs_path, "wb") as f:
-        f.write(file.file.read())
-    return os.path.join(rel_dir, fname).replace("\\", "/")
+    return store_blob(db, file, filename=f"file{ext}")
 
 @router.post("/", response_model=ApplicationOut, dependencies=[Depends(require_role_any(["student"]))])
-async def create_application(
+def create_application(
     title: str = Form(...),
     text: str = Form(...),
     type: str = Form("certificate"),
@@ -39,7 +32,7 @@ async def create_application(
     if not student:
         raise HTTPException(403, "Только студенты могут подавать заявления")
 
-    file_path = save_file(student.id, file) if file else None
+    file_path = save_file(db, file) if file else None
 
     app = Application(
         student_id=student.id,
@@ -55,7 +48,7 @@ async def create_application(
 
 
 @router.get("/my", response_model=list[ApplicationOut], dependencies=[Depends(require_role_any(["student"]))])
-async def my_applications(
+def my_applications(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -72,10 +65,12 @@ async def my_applications(
 
 @router.get("/all", response_model=list[ApplicationOut],
             dependencies=[Depends(require_role_any(["administrator", "director"]))])
-async def list_all_applications(
+def list_all_applications(
+    response: Response,
     db: Session = Depends(get_db),
     status: Optional[str] = Query(None),
     type: Optional[str] = Query(None),
+    page: PageParams = Depends(page_params),
 ):
     """🧾 Все заявления (для администрации)"""
     stmt = select(Application)
@@ -83,13 +78,13 @@ async def list_all_applications(
         stmt = stmt.where(Application.status == status)
     if type:
         stmt = stmt.where(Application.type == type)
-    items = db.scalars(stmt.order_by(Application.created_at.desc())).all()
-    return items
+    items = db.scalars(keyset(stmt, (Application.created_at, Application.id), page)).all()
+    return finish_page(items, page, response, lambda a: (a.created_at, a.id))
 
 
 @router.post("/{application_id}", response_model=ApplicationOut,
               dependencies=[Depends(require_role_any(["administrator", "director"]))])
-async def update_application_status(
+def update_application_status(
     application_id: int,
     data: ApplicationUpdate,
     db: Session = Depends(get_db),
@@ -1,31 +1,47 @@
 from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from datetime import datetime, timezone
 
 from app.core.deps import get_db
-from app.core.security import verify_password, create_access_token, hash_password
+from app.core.config import settings
+from app.core.rbac import build_token_claims
+from app.core.security import create_access_token
+from app.core.hashing import hash_password_async, verify_password_async
 from app.schemas.auth import LoginIn, TokenOut
 from app.models.user import User
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-@router.post("/login", response_model=TokenOut)
-def login(payload: LoginIn, db: Session = Depends(get_db)):
-    user = db.scalar(select(User).where(User.email == payload.email))
-    if not user or not verify_password(payload.password, user.password_hash):
-        raise HTTPException(status_code=400, detail="Invalid credentials")
+def issue_access_token(db: Session, user: User) -> str:
+    claims = build_token_claims(db, user) if settings.AUTH_TOKEN_CLAIMS else None
+    return create_access_token(user.email, claims)
+
+def _touch_login(db: Session, user: User) -> str:
     user.last_login = datetime.now(timezone.utc)
     db.commit()
-    token = create_access_token(user.email)
+    return issue_access_token(db, user)
+
+def _create_user(db: Session, email: str, password_hash: str) -> str:
+    user = User(email=email, password_hash=password_hash, is_active=True)
+    db.add(user); db.commit()
+    return issue_access_token(db, user)
+
+# bcrypt считается в пуле процессов, синхронная работа с сессией — в threadpool
+@router.post("/login", response_model=TokenOut)
+async def login(payload: LoginIn, db: Session = Depends(get_db)):
+    user = await run_in_threadpool(db.scalar, select(User).where(User.email == payload.email))
+    if not user or not await verify_password_async(payload.password, user.password_hash):
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    token = await run_in_threadpool(_touch_login, db, user)
     return TokenOut(access_token=token)
 
 @router.post("/register", response_model=TokenOut)
-def register(payload: LoginIn, db: Session = Depends(get_db)):
-    exists = db.scalar(select(User).where(User.email == payload.email))
+async def register(payload: LoginIn, db: Session = Depends(get_db)):
+    exists = await run_in_threadpool(db.scalar, select(User).where(User.email == payload.email))
     if exists:
         raise HTTPException(status_code=400, detail="Email in use")
-    user = User(email=payload.email, password_hash=hash_password(payload.password), is_active=True)
-    db.add(user); db.commit()
-    token = create_access_token(user.email)
+    password_hash = await hash_password_async(payload.password)
+    token = await run_in_threadpool(_create_user, db, payload.email, password_hash)
     return TokenOut(access_token=token)
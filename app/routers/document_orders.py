@@ -1,11 +1,11 @@
 import os
-import uuid
 from typing import Optional
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Body
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Body, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.core.deps import get_db, get_current_user, require_role_any
-from app.core.config import settings
+from app.core.media_store import store_blob, release_blob
+from app.core.pagination import PageParams, page_params, keyset, finish_page
 from app.models.user import User
 from app.models.grade import Student as StudentModel
 from app.models.document_order import DocumentOrder
@@ -13,21 +13,14 @@ from app.schemas.document_order import DocumentOrderCreate, DocumentOrderUpdate,
 
 router = APIRouter(prefix="/document_orders", tags=["document_orders"])
 
-def save_admin_file(order_id: int, file: UploadFile) -> str:
+def save_admin_file(db: Session, file: UploadFile) -> str:
     """Сохраняет готовый документ, прикрепляемый администратором"""
     ext = os.path.splitext(file.filename or "")[1] or ".pdf"
-    rel_dir = os.path.join("document_orders", "ready")
-    abs_dir = os.path.join(settings.MEDIA_ROOT, rel_dir)
-    os.makedirs(abs_dir, exist_ok=True)
-    fname = f"{order_id}_{uuid.uuid4().hex}{ext}"
-    abs_path = os.path.join(abs_dir, fname)
-    with open(abs_path, "wb") as f:
-        f.write(file.file.read())
-    return os.path.join(rel_dir, fname).replace("\\", "/")
+    return store_blob(db, file, filename=f"document{ext}")
 
 @router.post("/", response_model=DocumentOrderOut,
              dependencies=[Depends(require_role_any(["student"]))])
-async def create_document_order(
+def create_document_order(
     data: DocumentOrderCreate,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
@@ -53,7 +46,7 @@ async def create_document_order(
 
 @router.get("/my", response_model=list[DocumentOrderOut],
              dependencies=[Depends(require_role_any(["student"]))])
-async def my_document_orders(
+def my_document_orders(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -71,21 +64,23 @@ async def my_document_orders(
 
 @router.get("/all", response_model=list[DocumentOrderOut],
              dependencies=[Depends(require_role_any(["administrator", "director"]))])
-async def list_all_orders(
+def list_all_orders(
+    response: Response,
     db: Session = Depends(get_db),
     status: Optional[str] = None,
+    page: PageParams = Depends(page_params),
 ):
     """🧾 Все заказы студентов (для администрации)"""
     stmt = select(DocumentOrder)
     if status:
         stmt = stmt.where(DocumentOrder.status == status)
-    items = db.scalars(stmt.order_by(DocumentOrder.created_at.desc())).all()
-    return items
+    items = db.scalars(keyset(stmt, (DocumentOrder.created_at, DocumentOrder.id), page)).all()
+    return finish_page(items, page, response, lambda o: (o.created_at, o.id))
 
 
 @router.post("/{order_id}/patch", response_model=DocumentOrderOut,
               dependencies=[Depends(require_role_any(["administrator", "director"]))])
-async def update_order(
+def update_order(
     order_id: int,
     data: DocumentOrderUpdate = Body(...),
     db: Session = Depends(get_db),
@@ -108,7 +103,7 @@ async def update_order(
 
 @router.post("/{order_id}/student_approve", response_model=DocumentOrderOut,
               dependencies=[Depends(require_role_any(["student"]))])
-async def student_approve_order(
+def student_approve_order(
     order_id: int,
     db: Session = Depends(get_db),
     me: User = Depends(get_current_user),
@@ -131,7 +126,7 @@ async def student_approve_order(
 
 @router.post("/{order_id}/delete",
                dependencies=[Depends(require_role_any(["student", "administrator", "director"]))])
-async def delete_order(
+def delete_order(
     order_id: int,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
@@ -152,14 +147,7 @@ async def delete_order(
         if order.status != "new":
             raise HTTPException(403, "Order already processed")
 
-    if order.result_file:
-        abs_path = os.path.join(settings.MEDIA_ROOT, order.result_file)
-        if os.path.exists(abs_path):
-            try:
-                os.remove(abs_path)
-            except Exception:
-                pass
-
+    release_blob(db, order.result_file)
     db.delete(order)
     db.commit()
     return {"status": "deleted", "id": order_id}
@@ -1,29 +1,32 @@
+import os
+import tempfile
+from typing import Literal
 from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select, and_
 from datetime import datetime
-from openpyxl import Workbook
-from io import BytesIO
 
-from app.core.deps import get_db, require_permission, get_current_user, is_admin
-from app.schemas.grade import GradeCreate, GradeOut, GradeUpdate, FinalGradeIn, FinalGradePatch, GradeTypeFinal, GradeType
-from app.models.grade import Grade, Student
+from app.core.deps import get_db, get_report_db, require_permission, get_current_user, is_admin
+from app.core.files import iter_file
+from app.core.jobs import enqueue_job
+from app.core.pagination import PageParams, page_params, keyset, finish_page
+from app.db.session import ReportSessionLocal
+from app.services.grade_batch import upsert_lesson_grades
+from app.services.grade_export import (
+    GradeExportFilters, XLSX_MEDIA_TYPE, list_groups, write_grades_xlsx, iter_grades_csv,
+    write_grades_parquet, parquet_available,
+)
+from app.schemas.grade import (
+    GradeCreate, GradeOut, GradeUpdate, FinalGradeIn, FinalGradePatch, GradeTypeFinal, GradeType,
+    GradeBatchIn, GradeBatchOut, GradeBatchRowOut,
+)
+from app.models.grade import Grade, Student, is_final_type
 from app.models.schedule import Lesson, Teacher, Subject, teacher_subjects
-from app.models.role import Role, user_roles
-from app.models.user import User
-from app.models.schedule import Group
+from app.core.rbac import user_has_role
 
 router = APIRouter(prefix="/grades", tags=["grades"])
 
-def user_has_role(db: Session, user_id: int, role_name: str) -> bool:
-    """Проверка роли пользователя."""
-    q = (
-        select(Role)
-        .join(user_roles, Role.id == user_roles.c.role_id)
-        .where(user_roles.c.user_id == user_id, Role.name == role_name)
-    )
-    return db.scalar(q) is not None
-
 @router.post("/{grade_id}", response_model=GradeOut, dependencies=[Depends(require_permission("grades:update"))])
 def update_grade(
     grade_id: int,
@@ -131,12 +134,12 @@ def create_grade(payload: GradeCreate, db: Session = Depends(get_db), me=Depends
     final_teacher_id = None
     modified_by_admin_id = None
 
-    if payload.grade_type and payload.grade_type.lower() in ["итог", "final", "exam", "зачет"]:
+    if is_final_type(payload.grade_type):
         existing_final = db.scalar(
             select(Grade).where(
                 Grade.student_id == student.id,
                 Grade.subject_id == subj_id,
-                Grade.grade_type.in_(["итог", "final", "exam", "зачет"])
+                Grade.is_final.is_(True)
             )
         )
         if existing_final:
@@ -195,22 +198,105 @@ def create_grade(payload: GradeCreate, db: Session = Depends(get_db), me=Depends
         modified_by_admin_id=grade.modified_by_admin_id
     )
 
+@router.post(
+    "/lesson/{lesson_id}/batch",
+    response_model=GradeBatchOut,
+    dependencies=[Depends(require_permission("grades:create"))],
+)
+def grade_lesson_batch(
+    lesson_id: int,
+    payload: GradeBatchIn,
+    db: Session = Depends(get_db),
+    me=Depends(get_current_user),
+):
+    """
+    Оценки за занятие для всей группы одним запросом. Права проверяются один раз
+    (как в POST /grades), строки с ошибками пропускаются и возвращаются в results,
+    остальные вставляются или обновляются одной операцией.
+    """
+    lesson = db.get(Lesson, lesson_id)
+    if not lesson:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="No grades to save")
+
+    is_admin_user = is_admin(me, db)
+    is_director_user = user_has_role(db, me.id, "director")
+    teacher_id = payload.teacher_id
+    modified_by_admin_id = None
+
+    if not (is_admin_user or is_director_user):
+        teacher_profile = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
+        if not teacher_profile:
+            raise HTTPException(status_code=403, detail="Teacher profile not found")
+        if payload.teacher_id not in (None, teacher_profile.id):
+            raise HTTPException(status_code=403, detail="Teacher can grade only as self")
+        if teacher_profile not in lesson.teachers and lesson.teacher_id != teacher_profile.id:
+            raise HTTPException(status_code=403, detail="Teacher is not assigned to this lesson")
+        is_linked = db.scalar(
+            select(teacher_subjects).where(
+                teacher_subjects.c.teacher_id == teacher_profile.id,
+                teacher_subjects.c.subject_id == lesson.subject_id
+            )
+        )
+        if not is_linked and lesson.teacher_id != teacher_profile.id:
+            raise HTTPException(status_code=403, detail="Teacher is not assigned to this subject")
+        teacher_id = teacher_profile.id
+    elif not teacher_id:
+        modified_by_admin_id = me.id
+
+    results = upsert_lesson_grades(db, lesson, payload.items, teacher_id, modified_by_admin_id, payload.graded_at)
+    db.commit()
+    return GradeBatchOut(
+        lesson_id=lesson.id,
+        created=sum(r["status"] == "created" for r in results),
+        updated=sum(r["status"] == "updated" for r in results),
+        errors=sum(r["status"] == "error" for r in results),
+        results=[GradeBatchRowOut(**r) for r in results],
+    )
+
 @router.get("", response_model=list[GradeOut], dependencies=[Depends(require_permission("grades:read"))])
 def list_grades(
+    response: Response,
     db: Session = Depends(get_db),
     me=Depends(get_current_user),
-    grade_type: str | None = None
+    grade_type: str | None = None,
+    student_id: int | None = Query(None, description="ID студента"),
+    group_id: int | None = Query(None, description="ID группы"),
+    subject_id: int | None = Query(None, description="ID предмета"),
+    teacher_id: int | None = Query(None, description="ID преподавателя"),
+    from_date: datetime | None = Query(None, description="Начало периода (включительно)"),
+    to_date: datetime | None = Query(None, description="Конец периода (включительно, как в выгрузке)"),
+    final: bool | None = Query(None, description="Только итоговые (true) или только текущие (false)"),
+    page: PageParams = Depends(page_params),
 ):
+    # фильтры ложатся на индексы (student_id, subject_id, ...) и (teacher_id, graded_at)
     q = select(Grade)
     if grade_type:
         q = q.where(Grade.grade_type.ilike(f"%{grade_type}%"))
+    if student_id:
+        q = q.where(Grade.student_id == student_id)
+    if group_id:
+        q = q.where(Grade.student_id.in_(select(Student.id).where(Student.group_id == group_id)))
+    if subject_id:
+        q = q.where(Grade.subject_id == subject_id)
+    if teacher_id:
+        q = q.where(Grade.teacher_id == teacher_id)
+    if from_date:
+        q = q.where(Grade.graded_at >= from_date)
+    if to_date:
+        q = q.where(Grade.graded_at <= to_date)
+    if final is not None:
+        q = q.where(Grade.is_final.is_(final))
     if user_has_role(db, me.id, "teacher") and not (is_admin(me, db) or user_has_role(db, me.id, "director")):
         teacher_profile = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
         if not teacher_profile:
             raise HTTPException(status_code=403, detail="Teacher profile not found")
         q = q.where(Grade.teacher_id == teacher_profile.id)
 
-    grades = db.scalars(q).all()
+    keys = (Grade.graded_at, Grade.id)
+    grades = db.scalars(keyset(q, keys, page)).all()
+    grades = finish_page(grades, page, response, lambda g: (g.graded_at, g.id))
     return [
         GradeOut(
             id=g.id,
@@ -253,11 +339,7 @@ def create_or_update_final_grade(
 
     teacher_profile = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
     is_admin_user = is_admin(me, db)
-    is_director = db.scalar(
-        select(Role)
-        .join(user_roles, Role.id == user_roles.c.role_id)
-        .where(user_roles.c.user_id == me.id, Role.name == "director")
-    )
+    is_director = user_has_role(db, me.id, "director")
 
     if not (is_admin_user or is_director or teacher_profile):
         raise HTTPException(status_code=403, detail="Access denied")
@@ -276,7 +358,7 @@ def create_or_update_final_grade(
         select(Grade).where(
             Grade.student_id == payload.student_id,
             Grade.subject_id == payload.subject_id,
-            Grade.grade_type.in_(["итог", "final", "exam", "зачет"])
+            Grade.is_final.is_(True)
         )
     )
 
@@ -357,11 +439,7 @@ def patch_final_grade(
 
     teacher_profile = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
     is_admin_user = is_admin(me, db)
-    is_director = db.scalar(
-        select(Role)
-        .join(user_roles, Role.id == user_roles.c.role_id)
-        .where(user_roles.c.user_id == me.id, Role.name == "director")
-    )
+    is_director = user_has_role(db, me.id, "director")
 
     if not (is_admin_user or is_director or teacher_profile):
         raise HTTPException(status_code=403, detail="Access denied")
@@ -380,7 +458,7 @@ def patch_final_grade(
         select(Grade).where(
             Grade.student_id == student_id,
             Grade.subject_id == subject_id,
-            Grade.grade_type.in_(["итог", "final", "exam", "зачет"])
+            Grade.is_final.is_(True)
         )
     )
 
@@ -414,95 +492,65 @@ def patch_final_grade(
 
 @router.get("/export", dependencies=[Depends(require_permission("grades:read"))])
 def export_grades_excel(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     from_date: datetime | None = Query(None, description="Начало периода (включительно)"),
     to_date: datetime | None = Query(None, description="Конец периода (включительно)"),
     teacher_id: int | None = Query(None, description="ID преподавателя"),
     subject_id: int | None = Query(None, description="ID предмета"),
     grade_type: str | None = Query(None, description="Тип оценки (например 'итог', 'текущая')"),
+    format: Literal["xlsx", "csv", "parquet"] = Query("xlsx", description="xlsx (лист на группу), csv или parquet"),
+    background: bool = Query(False, description="Выполнить фоновой задачей (файл — /jobs/{job_id}/artifact)"),
+    me=Depends(get_current_user),
 ):
     """
     📘 Выгрузка ведомостей по всем предметам в Excel.
     Фильтры: по дате, предмету, преподавателю, типу оценки.
-    Каждый лист — отдельная группа.
+    Каждый лист — отдельная группа; для больших факультетов — csv/parquet.
     """
-    groups = db.scalars(select(Group)).all()
+    groups = list_groups(db)
     if not groups:
         raise HTTPException(status_code=404, detail="No groups found")
 
-    wb = Workbook()
-    wb.remove(wb.active)
-
-    for group in groups:
-        ws = wb.create_sheet(title=f"{group.code or group.name}")
-        ws.append([
-            "№", "ФИО студента", "Предмет", "Тип оценки",
-            "Оценка", "Комментарий", "Преподаватель", "Дата выставления"
-        ])
-
-        students = db.scalars(select(Student).where(Student.group_id == group.id)).all()
-        row_num = 1
-
-        for student in students:
-            q = select(Grade).join(Subject, Subject.id == Grade.subject_id)
-            q = q.where(Grade.student_id == student.id)
-
-            if from_date:
-                q = q.where(Grade.graded_at >= from_date)
-            if to_date:
-                q = q.where(Grade.graded_at <= to_date)
-            if teacher_id:
-                q = q.where(Grade.teacher_id == teacher_id)
-            if subject_id:
-                q = q.where(Grade.subject_id == subject_id)
-            if grade_type:
-                q = q.where(Grade.grade_type.ilike(f"%{grade_type}%"))
-
-            grades = db.scalars(q).all()
-            if not grades:
-                continue
-
-            student_user = db.get(User, student.user_id)
-            student_name = student_user.full_name or "—"
-
-            for g in grades:
-                teacher_name = ""
-                if g.teacher_id:
-                    teacher = db.get(Teacher, g.teacher_id)
-                    if teacher and teacher.full_name:
-                        teacher_name = teacher.full_name
-                    elif teacher and teacher.user_id:
-                        u = db.get(User, teacher.user_id)
-                        teacher_name = u.full_name or ""
-
-                ws.append([
-                    row_num,
-                    student_name,
-                    g.subject.title if g.subject else "",
-                    "Итоговая" if g.grade_type == "final" else"",
-                    g.value,
-                    g.comment or "",
-                    teacher_name,
-                    g.graded_at.strftime("%d.%m.%Y %H:%M") if g.graded_at else "",
-                ])
-                row_num += 1
-
-        for col in ws.columns:
-            max_len = 0
-            col_letter = col[0].column_letter
-            for cell in col:
-                if cell.value:
-                    max_len = max(max_len, len(str(cell.value)))
-            ws.column_dimensions[col_letter].width = max_len + 2
-
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-
-    filename = f"vedomost_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.xlsx"
-
-    return Response(
-        content=stream.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    filters = GradeExportFilters(
+        from_date=from_date, to_date=to_date, teacher_id=teacher_id,
+        subject_id=subject_id, grade_type=grade_type,
     )
+    filename = f"vedomost_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+
+    if background:
+        job = enqueue_job(db, "grades_export", created_by=me.id, params={
+            "from_date": from_date.isoformat() if from_date else None,
+            "to_date": to_date.isoformat() if to_date else None,
+            "teacher_id": teacher_id,
+            "subject_id": subject_id,
+            "grade_type": grade_type,
+            "format": format,
+            "filename": filename,
+        })
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+    if format == "csv":
+        # Сессия зависимости закрывается до отправки ответа — у генератора своя
+        def stream():
+            with ReportSessionLocal() as rdb:
+                for chunk in iter_grades_csv(rdb, filters, groups):
+                    yield chunk.encode("utf-8")
+        return StreamingResponse(stream(), media_type="text/csv; charset=utf-8", headers=headers)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=f".{format}")
+    os.close(fd)
+    try:
+        if format == "parquet":
+            write_grades_parquet(db, tmp_path, filters)
+            media_type = "application/vnd.apache.parquet"
+        else:
+            write_grades_xlsx(db, tmp_path, filters, groups)
+            media_type = XLSX_MEDIA_TYPE
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return StreamingResponse(iter_file(tmp_path, remove=True), media_type=media_type, headers=headers)
@@ -0,0 +1,94 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.deps import get_db, get_current_user, is_admin
+from app.core.jobs import FINISHED, DONE, request_cancel, job_artifact_abspath
+from app.core.media_delivery import media_response
+from app.models.job import Job
+from app.models.user import User
+from app.schemas.job import JobOut
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _job_out(job: Job) -> JobOut:
+    return JobOut(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        progress=job.progress or 0,
+        total=job.total,
+        message=job.message,
+        result=job.result,
+        error=job.error,
+        attempts=job.attempts or 0,
+        max_attempts=job.max_attempts or 1,
+        has_artifact=bool(job.artifact_path),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+def _get_job(db: Session, job_id: str, me: User) -> Job:
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.created_by != me.id and not is_admin(me, db):
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return job
+
+
+@router.get("", response_model=list[JobOut])
+def list_jobs(
+    db: Session = Depends(get_db),
+    me: User = Depends(get_current_user),
+    kind: str | None = Query(None),
+    status: str | None = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Свои задачи (админ видит все)."""
+    q = select(Job)
+    if not is_admin(me, db):
+        q = q.where(Job.created_by == me.id)
+    if kind:
+        q = q.where(Job.kind == kind)
+    if status:
+        q = q.where(Job.status == status)
+    jobs = db.scalars(q.order_by(Job.created_at.desc()).limit(limit)).all()
+    return [_job_out(j) for j in jobs]
+
+
+@router.get("/{job_id}", response_model=JobOut)
+def get_job(job_id: str, db: Session = Depends(get_db), me: User = Depends(get_current_user)):
+    return _job_out(_get_job(db, job_id, me))
+
+
+@router.post("/{job_id}/cancel", response_model=JobOut)
+def cancel_job(job_id: str, db: Session = Depends(get_db), me: User = Depends(get_current_user)):
+    job = _get_job(db, job_id, me)
+    if job.status in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    request_cancel(db, job)
+    db.refresh(job)
+    return _job_out(job)
+
+
+@router.api_route("/{job_id}/artifact", methods=["GET", "HEAD"])
+def download_job_artifact(
+    job_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    me: User = Depends(get_current_user),
+):
+    job = _get_job(db, job_id, me)
+    if job.status != DONE or not job.artifact_path:
+        raise HTTPException(status_code=404, detail="No result file")
+    path = job_artifact_abspath(job)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Result file is gone")
+    # результат задачи личный (в импорте пользователей — пароли): прокси и CDN его не кешируют
+    return media_response(
+        request, job.artifact_path, job.artifact_name or os.path.basename(path), cache_control="private, no-store",
+    )
@@ -1,54 +1,31 @@
-import os
-import uuid
 from typing import Optional
 
 from fastapi import (
     APIRouter, Depends, HTTPException, UploadFile,
-    File, Form, Query
+    File, Form, Query, Response
 )
 from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.deps import (
     get_db,
+    get_async_db,
     get_current_user,
-    require_role_any
+    get_current_user_async,
+    require_role_any,
+    student_profile_async,
+    teacher_profile,
 )
-from app.core.config import settings
+from app.core.media_store import store_blob, release_blob
+from app.core.pagination import PageParams, page_params, keyset, finish_page
 from app.models.user import User
-from app.models.grade import Student as StudentModel
 from app.models.schedule import Subject, Group, Teacher
 from app.models.material import Material
 from app.schemas.material import MaterialOut, MaterialUpdate
 
 router = APIRouter(prefix="/materials", tags=["materials"])
 
-def ensure_dir(path: str):
-    """Создаёт директорию, если её нет."""
-    os.makedirs(path, exist_ok=True)
-
-
-def build_rel_path(*parts: str) -> str:
-    """Формирует относительный путь для хранения в БД."""
-    return "/".join(str(p).strip("/\\") for p in parts if p)
-
-
-def save_uploaded_file(subject_id: int, group_id: int, file: UploadFile) -> str:
-    """Сохраняет файл в media/materials/{subject_id}/{group_id}/ и возвращает относительный путь."""
-    ext = os.path.splitext(file.filename or "")[1] or ".bin"
-    fname = f"{uuid.uuid4().hex}{ext}"
-
-    rel_dir = build_rel_path("materials", str(subject_id), str(group_id))
-    abs_dir = os.path.join(settings.MEDIA_ROOT, rel_dir)
-    ensure_dir(abs_dir)
-
-    abs_path = os.path.join(abs_dir, fname)
-    with open(abs_path, "wb") as f:
-        f.write(file.file.read())
-
-    return build_rel_path(rel_dir, fname)
-
-
 def assert_subject_group(db: Session, subject_id: int, group_id: int):
     """Проверка, что предмет и группа существуют."""
     if not db.get(Subject, subject_id):
@@ -59,7 +36,7 @@ def assert_subject_group(db: Session, subject_id: int, group_id: int):
 
 def get_teacher_by_user(db: Session, user: User) -> Teacher:
     """Возвращает объект Teacher по user_id."""
-    teacher = db.scalar(select(Teacher).where(Teacher.user_id == user.id))
+    teacher = teacher_profile(db, user)
     if not teacher:
         raise HTTPException(403, "Only teachers can manage materials")
     return teacher
@@ -69,7 +46,7 @@ def get_teacher_by_user(db: Session, user: User) -> Teacher:
     response_model=MaterialOut,
     dependencies=[Depends(require_role_any(["teacher", "administrator", "director"]))],
 )
-async def create_material(
+def create_material(
     subject_id: int = Form(...),
     group_id: int = Form(...),
     title: str = Form(...),
@@ -88,7 +65,7 @@ async def create_material(
     assert_subject_group(db, subject_id, group_id)
     teacher = get_teacher_by_user(db, user)
 
-    file_path = save_uploaded_file(subject_id, group_id, file) if file else None
+    file_path = store_blob(db, file) if file else None
 
     material = Material(
         title=title.strip(),
@@ -114,7 +91,7 @@ async def create_material(
     response_model=MaterialOut,
     dependencies=[Depends(require_role_any(["teacher", "administrator", "director"]))],
 )
-async def update_material(
+def update_material(
     material_id: int,
     payload: MaterialUpdate,
     db: Session = Depends(get_db),
@@ -125,7 +102,7 @@ async def update_material(
     if not mat:
         raise HTTPException(404, "Material not found")
 
-    teacher = db.scalar(select(Teacher).where(Teacher.user_id == user.id))
+    teacher = teacher_profile(db, user)
     if teacher and mat.teacher_id != teacher.id:
         raise HTTPException(403, "You cannot edit materials of other teachers")
 
@@ -142,7 +119,7 @@ async def update_material(
     response_model=MaterialOut,
     dependencies=[Depends(require_role_any(["teacher", "administrator", "director"]))],
 )
-async def upload_file(
+def upload_file(
     material_id: int,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -153,19 +130,12 @@ async def upload_file(
     if not mat:
         raise HTTPException(404, "Material not found")
 
-    teacher = db.scalar(select(Teacher).where(Teacher.user_id == user.id))
+    teacher = teacher_profile(db, user)
     if teacher and mat.teacher_id != teacher.id:
         raise HTTPException(403, "You cannot modify other teachers' materials")
 
-    if mat.file_path:
-        old_abs = os.path.join(settings.MEDIA_ROOT, mat.file_path)
-        if os.path.exists(old_abs):
-            try:
-                os.remove(old_abs)
-            except Exception:
-                pass
-
-    mat.file_path = save_uploaded_file(mat.subject_id, mat.group_id, file)
+    release_blob(db, mat.file_path)
+    mat.file_path = store_blob(db, file)
     db.commit()
     db.refresh(mat)
     return mat
@@ -175,7 +145,7 @@ async def upload_file(
     "/{material_id}/delete",
     dependencies=[Depends(require_role_any(["teacher", "administrator", "director"]))],
 )
-async def delete_material(
+def delete_material(
     material_id: int,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
@@ -185,30 +155,23 @@ async def delete_material(
     if not mat:
         raise HTTPException(404, "Material not found")
 
-    teacher = db.scalar(select(Teacher).where(Teacher.user_id == user.id))
+    teacher = teacher_profile(db, user)
     if teacher and mat.teacher_id != teacher.id:
         raise HTTPException(403, "You cannot delete others' materials")
 
-    if mat.file_path:
-        abs_path = os.path.join(settings.MEDIA_ROOT, mat.file_path)
-        if os.path.exists(abs_path):
-            try:
-                os.remove(abs_path)
-            except Exception:
-                pass
-
+    release_blob(db, mat.file_path)
     db.delete(mat)
     db.commit()
     return {"status": "deleted"}
 
 @router.get("/my", response_model=list[MaterialOut])
 async def get_my_materials(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    adb: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_current_user_async),
     subject_id: Optional[int] = Query(None),
 ):
     """📚 Список материалов для текущего студента."""
-    student = db.scalar(select(StudentModel).where(StudentModel.user_id == user.id))
+    student = await student_profile_async(adb, user)
     if not student:
         raise HTTPException(403, "Only students can access this endpoint")
 
@@ -219,13 +182,15 @@ async def get_my_materials(
     if subject_id:
         stmt = stmt.where(Material.subject_id == subject_id)
 
-    materials = db.scalars(stmt.order_by(Material.created_at.desc())).all()
+    materials = (await adb.scalars(stmt.order_by(Material.created_at.desc()))).all()
     return materials
 
 @router.get("/by_group_subject", response_model=list[MaterialOut])
-async def get_materials_by_group_subject(
+def get_materials_by_group_subject(
+    response: Response,
     group_id: int = Query(...),
     subject_id: int = Query(...),
+    page: PageParams = Depends(page_params),
     db: Session = Depends(get_db),
 ):
     """🔎 Материалы для конкретной группы и предмета."""
@@ -235,15 +200,17 @@ async def get_materials_by_group_subject(
         Material.subject_id == subject_id,
         Material.is_published.is_(True)
     )
-    items = db.scalars(stmt.order_by(Material.created_at.desc())).all()
-    return items
+    items = db.scalars(keyset(stmt, (Material.created_at, Material.id), page)).all()
+    return finish_page(items, page, response, lambda m: (m.created_at, m.id))
 
 @router.get(
     "/all",
     response_model=list[MaterialOut],
     dependencies=[Depends(require_role_any(["administrator", "director"]))],
 )
-async def get_all_materials(
+def get_all_materials(
+    response: Response,
+    page: PageParams = Depends(page_params),
     db: Session = Depends(get_db),
     subject_id: Optional[int] = Query(None),
     group_id: Optional[int] = Query(None),
@@ -258,5 +225,5 @@ async def get_all_materials(
     if teacher_id:
         stmt = stmt.where(Material.teacher_id == teacher_id)
 
-    items = db.scalars(stmt.order_by(Material.created_at.desc())).all()
-    return items
+    items = db.scalars(keyset(stmt, (Material.created_at, Material.id), page)).all()
+    return finish_page(items, page, response, lambda m: (m.created_at, m.id))
@@ -1,35 +1,34 @@
 from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import UploadFile, File
 from sqlalchemy import select
-from app.core.deps import get_db, get_current_user
+from app.core.deps import (
+    get_db, get_async_db, get_current_user, get_current_user_async,
+    student_profile_async, teacher_profile_async,
+)
 from app.schemas.user import MeOut, MeAdmin, MeDirector, MeTeacher, MeStudent
-from app.models.role import Role, user_roles
+from app.core.rbac import get_user_access_async
 from app.models.profile import AdminProfile, Director
-from app.models.schedule import Teacher, Group
-from app.models.grade import Student as StudentModel
+from app.models.schedule import Group
 
 router = APIRouter(tags=["users"])
 
 @router.get("/me", response_model=MeOut)
-def me_alias(me=Depends(get_current_user), db: Session = Depends(get_db)):
-    role_names = db.scalars(
-        select(Role.name)
-        .join(user_roles, user_roles.c.role_id == Role.id)
-        .where(user_roles.c.user_id == me.id)
-    ).all()
+async def me_alias(me=Depends(get_current_user_async), adb: AsyncSession = Depends(get_async_db)):
+    role_names = sorted((await get_user_access_async(adb, me.id)).roles)
 
     profiles = []
 
     if "administrator" in role_names:
-        adm = db.scalar(select(AdminProfile).where(AdminProfile.user_id == me.id))
+        adm = await adb.scalar(select(AdminProfile).where(AdminProfile.user_id == me.id))
         profiles.append(MeAdmin(
             fullName=me.full_name, photoUrl=me.avatar_url, email=me.email,
             subject=adm.subject if adm else None
         ))
 
     if "director" in role_names:
-        d = db.scalar(select(Director).where(Director.user_id == me.id))
+        d = await adb.scalar(select(Director).where(Director.user_id == me.id))
         profiles.append(MeDirector(
             fullName=d.full_name if d else me.full_name,
             email=d.email if d else me.email,
@@ -39,7 +38,7 @@ def me_alias(me=Depends(get_current_user), db: Session = Depends(get_db)):
 
     teacher_id = None
     if "teacher" in role_names:
-        t = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
+        t = await teacher_profile_async(adb, me)
         if t:
             teacher_id = t.id
         profiles.append(MeTeacher(
@@ -51,11 +50,11 @@ def me_alias(me=Depends(get_current_user), db: Session = Depends(get_db)):
 
     student_id = None
     if "student" in role_names:
-        s = db.scalar(select(StudentModel).where(StudentModel.user_id == me.id))
+        s = await student_profile_async(adb, me)
         group_code = None
         if s:
             student_id = s.id
-            g = db.get(Group, s.group_id)
+            g = await adb.get(Group, s.group_id)
             group_code = g.code if g else None
         profiles.append(MeStudent(
             fullName=me.full_name,
@@ -83,16 +82,19 @@ def me_update_avatar(
     me=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    from app.core.files import save_avatar_file, delete_file_if_local
+    from app.core.files import save_avatar_file, delete_file_if_local, thumbnail_url
+    from app.services.thumbnails import enqueue_thumbnails
     rel = save_avatar_file(me.id, file)
 
     delete_file_if_local(me.avatar_url)
     me.avatar_url = rel
     db.commit()
+    enqueue_thumbnails(db, rel)
 
     from app.core.config import settings
     return {
         "user_id": me.id,
         "avatar_path": rel,
         "avatar_url": f"{settings.MEDIA_URL}/{rel}",
+        "thumbnails": {str(s): thumbnail_url(f"{settings.MEDIA_URL}/{rel}", s) for s in settings.THUMBNAIL_SIZES},
     }
@@ -0,0 +1,35 @@
+import posixpath
+import os
+from fastapi import APIRouter, HTTPException, Query, Request
+from app.core.config import settings
+from app.core.files import thumbnail_path
+from app.core.media_delivery import media_response
+
+router = APIRouter(tags=["media"])
+
+# Каталоги MEDIA_ROOT, которые не отдаются публично: результаты задач — через /jobs/{id}/artifact
+PRIVATE_DIRS = {"jobs", "tmp"}
+
+
+@router.api_route(
+    settings.MEDIA_URL.rstrip("/") + "/{path:path}",
+    methods=["GET", "HEAD"],
+    include_in_schema=False,
+)
+def get_media(path: str, request: Request, size: int | None = Query(None)):
+    """
+    Файлы MEDIA_ROOT (вместо StaticFiles): ETag, 304, Range, X-Accel-Redirect.
+    ?size= — WebP-превью изображения (THUMBNAIL_SIZES); пока его нет, отдаётся оригинал
+    с no-cache, чтобы по URL превью не закешировался надолго (превью строится фоном).
+    """
+    rel = posixpath.normpath("/" + path.replace("\\", "/")).lstrip("/")
+    if not rel or rel.split("/", 1)[0] in PRIVATE_DIRS:
+        raise HTTPException(404, "Not Found")
+    cache_control = None
+    if size in settings.THUMBNAIL_SIZES:
+        thumb = thumbnail_path(rel, size)
+        if os.path.isfile(os.path.join(settings.MEDIA_ROOT, thumb.replace("/", os.sep))):
+            rel = thumb
+        else:
+            cache_control = "no-cache"
+    return media_response(request, rel, cache_control=cache_control)
@@ -1,18 +1,21 @@
-import os
-import uuid
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import select
 from datetime import datetime, timezone
 import json
 
-from app.core.deps import get_db, require_permission, get_current_user
+from app.core.deps import get_db, get_async_db, require_permission, get_current_user
+from app.core.files import thumbnail_url
+from app.core.media_store import store_blob, release_blob, site_path
+from app.core.pagination import PageParams, page_params, keyset, finish_page
 from app.models.news import News, Tag
 from app.models.user import User
+from app.services.thumbnails import enqueue_thumbnails
 from app.schemas.news import NewsOut, NewsDetailOut, TagOut, TagCreate
 
-MEDIA_DIR = "media/news"
-os.makedirs(MEDIA_DIR, exist_ok=True)
+# Превью для карточек ленты
+LIST_THUMB_SIZE = 256
 
 router = APIRouter(prefix="/news", tags=["news"])
 
@@ -59,13 +62,10 @@ def create_news(
     db: Session = Depends(get_db),
     me=Depends(get_current_user),
 ):
-    photo_path = None
+    photo_path = photo_rel = None
     if file:
-        ext = os.path.splitext(file.filename)[1]
-        unique_name = f"{uuid.uuid4().hex}{ext}"
-        photo_path = os.path.join(MEDIA_DIR, unique_name)
-        with open(photo_path, "wb") as f:
-            f.write(file.file.read())
+        photo_rel = store_blob(db, file)
+        photo_path = site_path(photo_rel)
 
     tags = []
 
@@ -97,15 +97,25 @@ def create_news(
     db.add(news)
     db.commit()
     db.refresh(news)
+    enqueue_thumbnails(db, photo_rel)
     return {"id": news.id}
 
 @router.get("", response_model=list[NewsOut])
-def list_news(only_published: bool = True, db: Session = Depends(get_db)):
-    q = select(News).options(joinedload(News.author), joinedload(News.tags))
+async def list_news(
+    response: Response,
+    only_published: bool = True,
+    page: PageParams = Depends(page_params),
+    adb: AsyncSession = Depends(get_async_db),
+):
+    q = select(News).options(joinedload(News.author), selectinload(News.tags))
     if only_published:
-        q = q.where(News.is_published == True)
-    q = q.order_by(News.published_at.desc().nullslast())
-    rows = db.execute(q).unique().scalars().all()
+        # published_at проставляется при публикации, старые записи заполнила миграция e8b3f6a1d207
+        q = q.where(News.is_published == True, News.published_at.is_not(None))
+        keys = (News.published_at, News.id)
+    else:
+        keys = (News.created_at, News.id)
+    rows = (await adb.execute(keyset(q, keys, page))).unique().scalars().all()
+    rows = finish_page(rows, page, response, lambda n: (getattr(n, keys[0].key), n.id))
     return [
     NewsOut(
         id=n.id,
@@ -114,6 +124,7 @@ def list_news(only_published: bool = True, db: Session = Depends(get_db)):
         published_at=n.published_at,
         author_name=n.author.full_name if n.author else None,
         photo_url=f"/{n.photo_path}" if n.photo_path else None,
+        photo_thumb_url=thumbnail_url(f"/{n.photo_path}" if n.photo_path else None, LIST_THUMB_SIZE),
         tags=[TagOut(id=t.id, name=t.name) for t in n.tags],
     )
     for n in rows
@@ -177,24 +188,20 @@ def patch_news(
         found_tags = db.scalars(select(Tag).where(Tag.id.in_(tag_ids))).all()
         news.tags = found_tags
 
+    photo_rel = None
     if file:
-        if news.photo_path and os.path.exists(news.photo_path):
-            os.remove(news.photo_path)
-        ext = os.path.splitext(file.filename)[1]
-        unique_name = f"{uuid.uuid4().hex}{ext}"
-        photo_path = os.path.join(MEDIA_DIR, unique_name)
-        with open(photo_path, "wb") as f:
-            f.write(file.file.read())
-        news.photo_path = photo_path
+        release_blob(db, news.photo_path)
+        photo_rel = store_blob(db, file)
+        news.photo_path = site_path(photo_rel)
     elif remove_photo:
-        if news.photo_path and os.path.exists(news.photo_path):
-            os.remove(news.photo_path)
+        release_blob(db, news.photo_path)
         news.photo_path = None
 
     news.updated_at = datetime.now(timezone.utc)
     db.add(news)
     db.commit()
     db.refresh(news)
+    enqueue_thumbnails(db, photo_rel)
     return {"id": news.id, "updated_at": news.updated_at}
 
 
@@ -204,8 +211,7 @@ def delete_news(news_id: int, db: Session = Depends(get_db)):
     if not news:
         raise HTTPException(404, "Новость не найдена")
 
-    if news.photo_path and os.path.exists(news.photo_path):
-        os.remove(news.photo_path)
+    release_blob(db, news.photo_path)
 
     db.delete(news)
     db.commit()
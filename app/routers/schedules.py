@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import select, or_, distinct
 from datetime import datetime
 
-from app.core.deps import get_db, get_current_user, require_permission, is_admin
+from app.core.deps import get_db, get_async_db, get_current_user, require_permission, require_permission_async, is_admin
+from app.core.pagination import PageParams, page_params, keyset, finish_page
 from app.models.schedule import Lesson, Group, Teacher, Subject, Room
 from app.models.grade import Student as StudentModel, Grade
 from app.models.user import User
 from app.schemas.schedule import LessonCreate, LessonOut
-from app.models.role import Role, user_roles
+from app.core.rbac import user_has_role
 from app.schemas.schedule import LessonUpdate
 
 router = APIRouter(prefix="/schedules", tags=["schedules"])
@@ -21,15 +23,6 @@ def get_or_create(db, model, where: dict, defaults: dict = {}):
     db.add(inst); db.flush()
     return inst
 
-def user_has_role(db: Session, user_id: int, role_name: str) -> bool:
-    """Проверка роли пользователя."""
-    q = (
-        select(Role)
-        .join(user_roles, Role.id == user_roles.c.role_id)
-        .where(user_roles.c.user_id == user_id, Role.name == role_name)
-    )
-    return db.scalar(q) is not None
-
 @router.post("/lessons", dependencies=[Depends(require_permission("schedules:create"))])
 def create_lesson(payload: LessonCreate, db: Session = Depends(get_db), me=Depends(get_current_user)):
     group = get_or_create(db, Group, {"code": payload.group_code}, {"title": payload.group_code})
@@ -197,7 +190,7 @@ def teacher_teaching_overview(
         .join(Group, Group.id == StudentModel.group_id)
         .where(
             Grade.teacher_id == teacher_id,
-            Grade.grade_type.in_(["итог", "final", "exam", "зачет"]),
+            Grade.is_final.is_(True),
             StudentModel.group_id.in_(group_ids)
         )
     )
@@ -261,9 +254,10 @@ def teacher_teaching_overview(
         ],
     }
 
-@router.get("/lessons", response_model=list[LessonOut], dependencies=[Depends(require_permission("schedules:read"))])
-def list_lessons(
-    db: Session = Depends(get_db),
+@router.get("/lessons", response_model=list[LessonOut], dependencies=[Depends(require_permission_async("schedules:read"))])
+async def list_lessons(
+    response: Response,
+    adb: AsyncSession = Depends(get_async_db),
     group_code: str | None = None,
     date_from: datetime | None = Query(None),
     date_to: datetime | None = Query(None),
@@ -271,9 +265,22 @@ def list_lessons(
     subject_title: str | None = Query(None, description="Название предмета (подстрочный поиск)"),
     room_code: str | None = Query(None, description="Код аудитории"),
     lesson_type: str | None = Query(None, description="лекция/практика/лабораторная и т.п."),
+    page: PageParams = Depends(page_params),
 ):
+    # Только нужные колонки одним запросом — без ленивой подгрузки связей
     q = (
-        select(Lesson)
+        select(
+            Lesson.id,
+            Group.code.label("group"),
+            Subject.title.label("subject"),
+            Teacher.full_name.label("teacher"),
+            Room.code.label("room"),
+            Lesson.starts_at,
+            Lesson.ends_at,
+            Lesson.lesson_type,
+            Lesson.notes,
+            Lesson.lesson_number,
+        )
         .join(Group, Lesson.group_id == Group.id)
         .join(Subject, Lesson.subject_id == Subject.id)
         .outerjoin(Teacher, Lesson.teacher_id == Teacher.id)
@@ -294,23 +301,10 @@ def list_lessons(
     if lesson_type:
         q = q.where(Lesson.lesson_type == lesson_type)
 
-    rows = db.scalars(q).all()
-
-    return [
-        LessonOut(
-            id=l.id,
-            group=l.group.code if l.group else None,
-            subject=l.subject.title if l.subject else None,
-            teacher=l.teacher.full_name if l.teacher else None,
-            room=l.room.code if l.room else None,
-            starts_at=l.starts_at,
-            ends_at=l.ends_at,
-            lesson_type=l.lesson_type,
-            notes=l.notes,
-            lesson_number=l.lesson_number,
-        )
-        for l in rows
-    ]
+    # расписание читается по времени, от ранних занятий к поздним
+    rows = (await adb.execute(keyset(q, (Lesson.starts_at, Lesson.id), page, descending=False))).mappings().all()
+    rows = finish_page(rows, page, response, lambda r: (r["starts_at"], r["id"]))
+    return [LessonOut(**r) for r in rows]
 
 @router.get("/lookup/groups")
 def lookup_groups(db: Session = Depends(get_db), q: str | None = Query(None)):
@@ -374,7 +368,7 @@ def get_students_for_lesson(
             .where(
                 Grade.student_id == s.id,
                 Grade.subject_id == lesson.subject_id,
-                Grade.grade_type.in_(["итог", "final", "exam", "зачет"]),
+                Grade.is_final.is_(True),
             )
             .limit(1)
         )
@@ -1,16 +1,19 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import select
 from datetime import datetime
-from app.core.deps import get_db, get_current_user, require_permission
+from app.core.deps import get_db, get_report_db, get_current_user, require_permission
+from app.db.session import ReportSessionLocal
+from app.services.study_overview import iter_study_overview
 from app.models.grade import Student as StudentModel, Grade
 from app.models.schedule import Group, Subject, Lesson, Teacher
 from app.schemas.user import MeOut
-from app.models.user import User
 
 router = APIRouter(prefix="/students", tags=["study"])
 
-from sqlalchemy.orm import selectinload
 
 @router.get("/{student_id}/study/overview")
 def student_study_overview(
@@ -96,7 +99,7 @@ def student_study_overview(
             }
             subj_data["grades"].append(grade_entry)
 
-            if g.grade_type.lower() in ["итог", "final", "exam", "зачет"]:
+            if g.is_final:
                 subj_data["final_grade"] = g.value
 
     return {
@@ -120,91 +123,31 @@ def student_study_overview(
         ],
     }
 
-@router.get("/study/overview/all")
+@router.get("/study/overview/all", dependencies=[Depends(require_permission("schedules:read"))])
 def all_students_study_overview(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     date_from: datetime | None = Query(None),
     date_to: datetime | None = Query(None),
+    group_code: str | None = Query(None, description="Только студенты группы"),
+    offset: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1, description="Сколько студентов вернуть (по умолчанию все)"),
     me=Depends(get_current_user),
-    _ = Depends(require_permission("schedules:read")),
 ):
-    students = db.query(StudentModel).join(User, User.id == StudentModel.user_id).all()
-    result = []
-
-    for st in students:
-        group = db.get(Group, st.group_id)
-        if not group:
-            continue
-
-        subj_q = select(Subject).options(selectinload(Subject.primary_teacher)) \
-            .join(Lesson, Lesson.subject_id == Subject.id) \
-            .where(Lesson.group_id == group.id)
-        if date_from:
-            subj_q = subj_q.where(Lesson.starts_at >= date_from)
-        if date_to:
-            subj_q = subj_q.where(Lesson.starts_at < date_to)
-        subjects = db.scalars(subj_q.distinct()).all()
-
-        subj_ids = [s.id for s in subjects] or [-1]
-
-        les_q = select(Lesson).where(Lesson.group_id == group.id, Lesson.subject_id.in_(subj_ids))
-        if date_from:
-            les_q = les_q.where(Lesson.starts_at >= date_from)
-        if date_to:
-            les_q = les_q.where(Lesson.starts_at < date_to)
-        lessons = db.scalars(les_q.order_by(Lesson.starts_at)).all()
-
-        gr_q = select(Grade).where(Grade.student_id == st.id)
-        if subj_ids:
-            gr_q = gr_q.where(Grade.subject_id.in_(subj_ids))
-        grades = db.scalars(gr_q.order_by(Grade.graded_at.desc())).all()
-
-        subj_dict = {}
-        for s in subjects:
-            subj_dict[s.id] = {
-                "id": s.id,
-                "title": s.title,
-                "code": s.code,
-                "primary_teacher_id": s.primary_teacher_id,
-                "primary_teacher_name": s.primary_teacher.full_name if s.primary_teacher else None,
-                "grades": [],
-                "final_grade": None, 
-            }
-
-        for g in grades:
-            if g.subject_id in subj_dict:
-                subj_data = subj_dict[g.subject_id]
-                grade_entry = {
-                    "id": g.id,
-                    "type": g.grade_type,
-                    "value": g.value,
-                    "graded_at": g.graded_at,
-                    "lesson_id": g.lesson_id,
-                    "lesson_date": (g.lesson.starts_at if g.lesson else None),
-                    "teacher_id": g.teacher_id,
-                    "comment": g.comment,
-                }
-                subj_data["grades"].append(grade_entry)
-
-                if g.grade_type.lower() in ["итог", "final", "exam", "зачет"]:
-                    subj_data["final_grade"] = g.value
-
-        result.append({
-            "student_id": st.id,
-            "student_name": st.user.full_name,
-            "group": group.code if group else None,
-            "subjects": list(subj_dict.values()),
-            "lessons": [
-                {
-                    "id": l.id,
-                    "subject_id": l.subject_id,
-                    "teacher": l.teacher.full_name if l.teacher else None,
-                    "room": l.room.code if l.room else None,
-                    "starts_at": l.starts_at,
-                    "ends_at": l.ends_at,
-                    "lesson_type": l.lesson_type,
-                } for l in lessons
-            ]
-        })
-
-    return result
+    group_id = None
+    if group_code:
+        group_id = db.scalar(select(Group.id).where(Group.code == group_code))
+        if group_id is None:
+            raise HTTPException(status_code=404, detail="Group not found")
+
+    # Сессия зависимости закрывается до отправки ответа,
+    # поэтому генератор читает через собственную сессию пула отчётов
+    def stream():
+        with ReportSessionLocal() as rdb:
+            yield "["
+            for i, item in enumerate(iter_study_overview(
+                rdb, group_id=group_id, date_from=date_from, date_to=date_to, offset=offset, limit=limit,
+            )):
+                yield ("," if i else "") + json.dumps(jsonable_encoder(item), ensure_ascii=False)
+            yield "]"
+
+    return StreamingResponse(stream(), media_type="application/json")
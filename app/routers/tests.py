@@ -1,16 +1,23 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Body, Form
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import select, delete, func
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Body, Form, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import select, delete, func, update
+from datetime import datetime
 import json
 import pandas as pd
 import io
 import random
-from app.core.deps import get_db, get_current_user, require_role_any, is_admin
+from app.core.deps import (
+    get_db, get_async_db, get_current_user, get_current_user_async,
+    require_role_any, require_role_any_async, is_admin,
+    student_profile, teacher_profile, student_profile_async, teacher_profile_async,
+)
+from app.core.pagination import PageParams, page_params, keyset, finish_page
+from app.core.rbac import get_user_access_async
 from app.models.user import User
 from app.models.grade import Student as StudentModel
-from app.models.schedule import Group, Teacher
+from app.models.schedule import Group
 from app.models.testing import (
     Test, Question, TestGroupAccess, TestAttempt,
     QuestionType, AttemptStatus
@@ -19,14 +26,17 @@ from app.schemas.testing import (
     TestCreate, TestUpdate, AssignGroupsIn,
     TestOut, TestAdminOut,
     QuestionOut, QuestionAdminOut,
-    StartOut, SubmitIn,
+    StartOut, SubmitIn, DraftIn, DraftOut,
     AttemptOut, AttemptDetailOut, ReviewIn,
     TestShortOut, QuestionUpdate, TestImportCreate
 )
+from app.services.draft_answers import draft_buffer
 from app.services.testing_service import (
-    can_start_attempt, make_attempt_token, verify_attempt_token,
-    calc_must_finish_at, evaluate_auto,get_max_score_for_test,
-    get_points_per_question, evaluate_auto_detailed
+    make_attempt_token, verify_attempt_token,
+    evaluate_auto,get_max_score_for_test,
+    get_points_per_question, evaluate_auto_detailed,
+    get_answer_key, bump_answer_key, answer_key_cache, rescore_attempts,
+    get_test_meta, test_meta_cache, check_test_open, insert_attempt, attempt_must_finish_at,
 )
 from sqlalchemy.sql.expression import func as sa_func
 
@@ -37,12 +47,12 @@ router = APIRouter(prefix="/tests", tags=["tests"])
 def _ensure_teacher_or_admin(user: User, db: Session):
     if is_admin(user, db):
         return
-    t = db.scalar(select(Teacher).where(Teacher.user_id == user.id))
+    t = teacher_profile(db, user)
     if not t:
         raise HTTPException(status_code=403, detail="Только преподаватель или админ")
 
 def _student(db: Session, user: User) -> StudentModel:
-    st = db.scalar(select(StudentModel).where(StudentModel.user_id == user.id))
+    st = student_profile(db, user)
     if not st:
         raise HTTPException(status_code=403, detail="Только для студентов")
     return st
@@ -113,26 +123,31 @@ def create_test(payload: TestCreate, db: Session = Depends(get_db), me: User = D
 @router.get(
     "/",
     response_model=list[TestOut],
-    dependencies=[Depends(require_role_any(["administrator", "teacher", "student"]))],
+    dependencies=[Depends(require_role_any_async(["administrator", "teacher", "student"]))],
 )
-def list_tests(
-    db: Session = Depends(get_db),
-    me: User = Depends(get_current_user),
-    group_code: str | None = Query(None, description="Код группы, например 'ИСб-22'")
+async def list_tests(
+    response: Response,
+    adb: AsyncSession = Depends(get_async_db),
+    me: User = Depends(get_current_user_async),
+    group_code: str | None = Query(None, description="Код группы, например 'ИСб-22'"),
+    page: PageParams = Depends(page_params),
 ):
     group_ids = []
     teacher = None
-    is_admin_user = is_admin(me, db)
+    is_admin_user = (await get_user_access_async(adb, me.id)).is_admin
 
     if not is_admin_user:
-        teacher = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
+        teacher = await teacher_profile_async(adb, me)
         if not teacher:
-            st = _student(db, me)
+            st = await student_profile_async(adb, me)
+            if not st:
+                raise HTTPException(status_code=403, detail="Только для студентов")
             group_ids = [st.group_id]
 
-    q = select(Test).options(joinedload(Test.questions), joinedload(Test.groups))
+    # коллекции грузятся отдельными IN-запросами, чтобы LIMIT считал тесты, а не строки join
+    q = select(Test).options(selectinload(Test.questions), selectinload(Test.groups))
     if group_code:
-        group = db.scalar(select(Group).where(Group.code == group_code))
+        group = await adb.scalar(select(Group).where(Group.code == group_code))
         if not group:
             raise HTTPException(status_code=404, detail=f"Группа '{group_code}' не найдена")
         q = q.where(
@@ -147,19 +162,22 @@ def list_tests(
             )
         )
 
-    tests = db.scalars(q.order_by(Test.created_at.desc())).unique().all()
+    tests = (await adb.scalars(keyset(q, (Test.created_at, Test.id), page))).all()
+    tests = finish_page(tests, page, response, lambda t: (t.created_at, t.id))
+    test_ids = [t.id for t in tests]
 
     attempt_stats: dict[int, dict] = {}
 
-    summary_rows = db.execute(
+    summary_rows = (await adb.execute(
         select(
             TestAttempt.test_id,
             func.count(TestAttempt.id).label("total_attempts"),
             func.count(func.distinct(TestAttempt.student_id)).label("unique_students"),
             func.max(TestAttempt.started_at).label("last_attempt"),
         )
+        .where(TestAttempt.test_id.in_(test_ids))
         .group_by(TestAttempt.test_id)
-    ).all()
+    )).all()
 
     for row in summary_rows:
         attempt_stats[row.test_id] = {
@@ -169,7 +187,7 @@ def list_tests(
             "students": []
         }
 
-    detail_rows = db.execute(
+    detail_rows = (await adb.execute(
         select(
             TestAttempt.test_id,
             TestAttempt.student_id,
@@ -181,8 +199,9 @@ def list_tests(
                 func.max(TestAttempt.auto_score)
             ).label("last_score"),
         )
+        .where(TestAttempt.test_id.in_(test_ids))
         .group_by(TestAttempt.test_id, TestAttempt.student_id)
-    ).all()
+    )).all()
 
     for row in detail_rows:
         if row.test_id not in attempt_stats:
@@ -237,7 +256,7 @@ def list_tests(
 @router.get("/my", response_model=list[TestOut], dependencies=[Depends(require_role_any(["teacher", "administrator"]))])
 def list_my_tests(db: Session = Depends(get_db), me: User = Depends(get_current_user)):
     _ensure_teacher_or_admin(me, db)
-    teacher = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
+    teacher = teacher_profile(db, me)
     q = select(Test).options(joinedload(Test.questions), joinedload(Test.groups))
     if teacher:
         q = q.where(Test.teacher_id == teacher.id)
@@ -280,7 +299,7 @@ def get_test(test_id: int, db: Session = Depends(get_db), me: User = Depends(get
     if not t:
         raise HTTPException(status_code=404, detail="Test not found")
 
-    teacher = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
+    teacher = teacher_profile(db, me)
     admin = is_admin(me, db)
     is_teacher_or_admin = admin or bool(teacher)
     question_schema = QuestionAdminOut if is_teacher_or_admin else QuestionOut
@@ -367,8 +386,10 @@ def update_test(test_id: int, payload: TestUpdate, db: Session = Depends(get_db)
         for qid, q in existing.items():
             if qid not in sent_ids:
                 db.delete(q)
+        bump_answer_key(test)
 
     db.commit()
+    test_meta_cache.invalidate(test_id)
     db.expire_all()
     db.refresh(test)
     return get_test(test_id, db, me)
@@ -381,6 +402,8 @@ def delete_test(test_id: int, db: Session = Depends(get_db), me: User = Depends(
         raise HTTPException(status_code=404, detail="Test not found")
     db.delete(t)
     db.commit()
+    answer_key_cache.invalidate(test_id)
+    test_meta_cache.invalidate(test_id)
     return {"ok": True, "deleted_id": test_id}
 
 
@@ -395,88 +418,141 @@ def assign_groups(test_id: int, payload: AssignGroupsIn, db: Session = Depends(g
     for gid in payload.group_ids:
         db.add(TestGroupAccess(test_id=test_id, group_id=gid))
     db.commit()
+    test_meta_cache.invalidate(test_id)
     return {"ok": True, "test_id": test_id, "group_ids": payload.group_ids}
 
 @router.post("/{test_id}/start", response_model=StartOut, dependencies=[Depends(require_role_any(["student"]))])
 def start_test(test_id: int, db: Session = Depends(get_db), me: User = Depends(get_current_user)):
     st = _student(db, me)
-    test = db.get(Test, test_id)
-    if not test:
+    meta = get_test_meta(db, test_id)
+    if not meta:
         raise HTTPException(status_code=404, detail="Test not found")
-
-    access = db.scalar(select(TestGroupAccess).where(TestGroupAccess.test_id == test_id, TestGroupAccess.group_id == st.group_id))
-    if not access:
+    if st.group_id not in meta.group_ids:
         raise HTTPException(status_code=403, detail="Нет доступа к тесту")
 
-    can_start, reason, prev_count = can_start_attempt(db, test, st.id)
-    if not can_start:
+    now = datetime.utcnow()
+    reason = check_test_open(meta, now)
+    if reason:
         raise HTTPException(status_code=400, detail=reason)
 
-    attempt = TestAttempt(student_id=st.id, test_id=test.id, attempt_number=prev_count + 1, status=AttemptStatus.started)
-    db.add(attempt)
-    db.flush()
-
-    token = make_attempt_token(attempt.id, st.id, test.id)
-    attempt.attempt_token = token
+    attempt = insert_attempt(db, meta, st.id, now)
+    if attempt is None:
+        raise HTTPException(status_code=400, detail="Превышено число попыток")
     db.commit()
-    db.refresh(attempt)
-
-    must_finish_at = calc_must_finish_at(attempt.started_at, test.duration_minutes)
-    if test.deadline and must_finish_at and must_finish_at > test.deadline:
-        must_finish_at = test.deadline
 
+    # токен — HMAC от id попытки, его не нужно хранить: submit пересчитывает и сверяет
     return StartOut(
         attempt_id=attempt.id,
         attempt_number=attempt.attempt_number,
-        attempt_token=token,
+        attempt_token=make_attempt_token(attempt.id, st.id, meta.id),
         started_at=attempt.started_at,
-        deadline_at=test.deadline,
-        must_finish_at=must_finish_at
+        deadline_at=meta.deadline,
+        must_finish_at=attempt_must_finish_at(meta, attempt.started_at),
     )
 
 @router.post("/{test_id}/submit", response_model=AttemptOut, dependencies=[Depends(require_role_any(["student"]))])
 def submit_test(test_id: int, payload: SubmitIn, db: Session = Depends(get_db), me: User = Depends(get_current_user)):
     st = _student(db, me)
-    attempt = db.get(TestAttempt, payload.attempt_id)
-    if not attempt or attempt.student_id != st.id or attempt.test_id != test_id:
+    # версия ключа — из БД тем же запросом: ключ, исправленный в другом воркере,
+    # действует сразу, а не по истечении TTL кэша метаданных
+    attempt = db.execute(
+        select(
+            TestAttempt.id, TestAttempt.status, TestAttempt.started_at, TestAttempt.answers,
+            Test.answer_key_version,
+        )
+        .join(Test, Test.id == TestAttempt.test_id)
+        .where(
+            TestAttempt.id == payload.attempt_id,
+            TestAttempt.student_id == st.id,
+            TestAttempt.test_id == test_id,
+        )
+    ).first()
+    if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
 
     if attempt.status != AttemptStatus.started:
         raise HTTPException(status_code=400, detail="Попытка уже завершена")
 
-    if not (attempt.attempt_token and verify_attempt_token(payload.attempt_token, attempt.id, st.id, test_id)):
+    if not verify_attempt_token(payload.attempt_token, attempt.id, st.id, test_id):
         raise HTTPException(status_code=400, detail="Некорректный токен")
 
-    test = db.get(Test, test_id)
+    meta = get_test_meta(db, test_id, attempt.answer_key_version or 0)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Test not found")
     now = datetime.utcnow()
+    must_finish_at = attempt_must_finish_at(meta, attempt.started_at)
+
+    # ответы из формы важнее автосохранённых: черновик лишь дополняет пропущенное
+    answers = {**(attempt.answers or {}), **draft_buffer.take(attempt.id), **payload.answers}
+    values = {"answers": answers, "finished_at": now, "attempt_token": None}
+    late = (meta.deadline and now > meta.deadline) or (must_finish_at and now > must_finish_at)
+    values["status"] = AttemptStatus.expired if late else AttemptStatus.submitted
+    # просроченная сдача оценивается так же, как попытку закрыл бы уборщик (attempt_expiry):
+    # по ответам, а без ответов — без балла
+    if answers or not late:
+        values["auto_score"] = evaluate_auto(get_answer_key(db, meta), answers)
+
+    # условие по статусу закрывает двойную сдачу из двух вкладок
+    finished = db.scalars(
+        update(TestAttempt)
+        .where(TestAttempt.id == attempt.id, TestAttempt.status == AttemptStatus.started)
+        .values(**values)
+        .returning(TestAttempt)
+    ).first()
+    if finished is None:
+        raise HTTPException(status_code=400, detail="Попытка уже завершена")
+    result = AttemptOut.model_validate(finished)
+    db.commit()
+    return result
+
 
-    if test.deadline and now > test.deadline:
-        attempt.status = AttemptStatus.expired
-    elif test.duration_minutes:
-        must_finish_at = attempt.started_at + timedelta(minutes=test.duration_minutes)
-        if test.deadline and must_finish_at > test.deadline:
-            must_finish_at = test.deadline
-        if now > must_finish_at:
-            attempt.status = AttemptStatus.expired
-
-    if attempt.status == AttemptStatus.expired:
-        attempt.finished_at = now
-        attempt.answers = payload.answers
+@router.post("/{test_id}/rescore", dependencies=[Depends(require_role_any(["teacher", "administrator"]))])
+def rescore_test(
+    test_id: int,
+    dry_run: bool = Query(False, description="Только посчитать изменения, не сохраняя"),
+    db: Session = Depends(get_db),
+    me: User = Depends(get_current_user),
+):
+    """Пересчёт auto_score всех завершённых попыток после исправления ключа ответов."""
+    _ensure_teacher_or_admin(me, db)
+    test = db.get(Test, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Тест не найден")
+    report = rescore_attempts(db, test, dry_run=dry_run)
+    if not dry_run:
         db.commit()
-        db.refresh(attempt)
-        return attempt
+    return report
 
-    questions = db.scalars(select(Question).where(Question.test_id == test_id)).all()
-    score = evaluate_auto(questions, payload.answers)
 
-    attempt.answers = payload.answers
-    attempt.auto_score = score
-    attempt.status = AttemptStatus.submitted
-    attempt.finished_at = now
-    attempt.attempt_token = None
-    db.commit()
-    db.refresh(attempt)
-    return attempt
+@router.post("/{test_id}/draft", dependencies=[Depends(require_role_any(["student"]))])
+def save_draft(test_id: int, payload: DraftIn, db: Session = Depends(get_db), me: User = Depends(get_current_user)):
+    """
+    Автосохранение: принимает только изменённые ответы. Запрос не пишет в БД —
+    изменения копятся в памяти и сохраняются фоном (AUTOSAVE_FLUSH_INTERVAL_SEC) или при сдаче.
+    """
+    st = _student(db, me)
+    if not verify_attempt_token(payload.attempt_token, payload.attempt_id, st.id, test_id):
+        raise HTTPException(status_code=400, detail="Некорректный токен")
+    pending = draft_buffer.add(payload.attempt_id, payload.answers)
+    return {"ok": True, "attempt_id": payload.attempt_id, "pending": pending}
+
+
+@router.get("/{test_id}/draft/{attempt_id}", response_model=DraftOut, dependencies=[Depends(require_role_any(["student"]))])
+def get_draft(test_id: int, attempt_id: int, db: Session = Depends(get_db), me: User = Depends(get_current_user)):
+    """Сохранённые ответы незавершённой попытки — например, после перезапуска браузера."""
+    st = _student(db, me)
+    attempt = db.execute(
+        select(TestAttempt.answers, TestAttempt.status).where(
+            TestAttempt.id == attempt_id,
+            TestAttempt.student_id == st.id,
+            TestAttempt.test_id == test_id,
+        )
+    ).first()
+    if not attempt:
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    if attempt.status != AttemptStatus.started:
+        raise HTTPException(status_code=400, detail="Попытка уже завершена")
+    return DraftOut(attempt_id=attempt_id, answers={**(attempt.answers or {}), **draft_buffer.peek(attempt_id)})
 
 
 @router.get(
@@ -550,7 +626,7 @@ def get_attempt(
         raise HTTPException(status_code=404, detail="Attempt not found")
 
     if not is_admin(me, db):
-        teacher = db.scalar(select(Teacher).where(Teacher.user_id == me.id))
+        teacher = teacher_profile(db, me)
         if not teacher:
             st = _student(db, me)
             if st.id != attempt.student_id:
@@ -563,15 +639,11 @@ def get_attempt(
     result.answers = attempt.answers or {}
     result.correct_answers = {str(q.id): q.correct_answers for q in questions}
 
-    from app.services.testing_service import (
-        evaluate_auto_detailed,
-        get_max_score_for_test,
-    )
-
-    detailed = evaluate_auto_detailed(questions, result.answers)
+    key = get_answer_key(db, attempt.test)
+    detailed = evaluate_auto_detailed(key, result.answers)
     result.detailed_scores = detailed
     result.total_score = sum(detailed.values())
-    result.max_score = get_max_score_for_test(attempt.test)
+    result.max_score = key.max_score
 
     result.student_name = (
         attempt.student.user.full_name if attempt.student and attempt.student.user else None
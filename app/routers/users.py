@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, delete
 from app.core.deps import get_db, get_current_user, require_permission, is_admin
 from app.core.security import hash_password
+from app.core.rbac import get_user_access, access_cache
 from app.models.user import User
 from app.models.role import Role, user_roles
 from app.models.grade import Student
@@ -19,8 +20,7 @@ def _get_role(db: Session, name: str) -> Role:
     return r
 
 def _target_has_admin(db: Session, user_id: int) -> bool:
-    q = select(Role.name).join(user_roles, user_roles.c.role_id == Role.id).where(user_roles.c.user_id == user_id)
-    return any(name == "administrator" for name in db.scalars(q).all())
+    return get_user_access(db, user_id).is_admin
 
 @router.post("", response_model=UserOut,
              dependencies=[Depends(require_permission("users:create"))])
@@ -61,6 +61,7 @@ def delete_user(user_id: int, me=Depends(get_current_user), db: Session = Depend
         raise HTTPException(status_code=404, detail="User not found")
     db.execute(delete(User).where(User.id == user_id))
     db.commit()
+    access_cache.invalidate_user(user_id)
     return {"deleted": user_id}
 
 @router.get("", response_model=list[UserOut], dependencies=[Depends(require_permission("users:read"))])
@@ -50,3 +50,29 @@ class GradeOut(BaseModel):
 class FinalGradePatch(BaseModel):
     value: str | None = None
     comment: str | None = None
+
+
+class GradeBatchItem(BaseModel):
+    student_id: int
+    value: str
+    grade_type: str
+    comment: str | None = None
+
+class GradeBatchIn(BaseModel):
+    teacher_id: int | None = None
+    graded_at: datetime | None = None
+    items: List[GradeBatchItem]
+
+class GradeBatchRowOut(BaseModel):
+    student_id: int
+    grade_type: str
+    status: str  # created | updated | error
+    grade_id: int | None = None
+    error: str | None = None
+
+class GradeBatchOut(BaseModel):
+    lesson_id: int
+    created: int
+    updated: int
+    errors: int
+    results: List[GradeBatchRowOut]
@@ -0,0 +1,24 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class JobOut(BaseModel):
+    id: str
+    kind: str
+    status: str
+    progress: int
+    total: int | None = None
+    message: str | None = None
+    result: dict | None = None
+    error: str | None = None
+    attempts: int
+    max_attempts: int
+    has_artifact: bool = False
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+class JobQueuedOut(BaseModel):
+    job_id: str
+    status: str
@@ -34,6 +34,7 @@ class NewsOut(BaseModel):
     published_at: datetime | None
     author_name: str | None = None
     photo_url: str | None = None
+    photo_thumb_url: str | None = None
     tags: list[TagOut] | None = None
 
     class Config:
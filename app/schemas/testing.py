@@ -150,6 +150,17 @@ class SubmitIn(BaseModel):
     answers: Dict[str, Any]
 
 
+class DraftIn(BaseModel):
+    attempt_id: int
+    attempt_token: str
+    answers: Dict[str, Any]  # только изменённые ответы
+
+
+class DraftOut(BaseModel):
+    attempt_id: int
+    answers: Dict[str, Any]
+
+
 class AttemptOut(BaseModel):
     id: int
     student_id: int
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.testing import Test, TestAttempt, AttemptStatus
+from app.services.draft_answers import draft_buffer
+from app.services.testing_service import get_test_meta, get_answer_key, attempt_must_finish_at
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+
+
+def overdue_condition(now: datetime):
+    """Попытка просрочена: истёк дедлайн теста или время на прохождение."""
+    return or_(
+        and_(Test.deadline.is_not(None), Test.deadline < now),
+        and_(
+            Test.duration_minutes > 0,
+            TestAttempt.started_at + Test.duration_minutes * timedelta(minutes=1) < now,
+        ),
+    )
+
+
+def expire_overdue_attempts(db: Session, now: datetime | None = None, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """
+    Одна пачка брошенных попыток: выбирает просроченные started-попытки
+    (индекс (status, started_at)) с SKIP LOCKED, чтобы параллельные процессы
+    не мешали друг другу и submit, считает баллы по автосохранённым ответам
+    и одним bulk UPDATE переводит их в expired. Возвращает размер пачки; коммитит сам.
+    """
+    now = now or datetime.utcnow()
+    rows = db.execute(
+        select(
+            TestAttempt.id, TestAttempt.test_id, TestAttempt.started_at, TestAttempt.answers,
+            Test.answer_key_version,
+        )
+        .join(Test, Test.id == TestAttempt.test_id)
+        .where(TestAttempt.status == AttemptStatus.started, overdue_condition(now))
+        .order_by(TestAttempt.status, TestAttempt.started_at)
+        .limit(batch_size)
+        .with_for_update(of=TestAttempt, skip_locked=True)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    by_test: dict[int, list] = {}
+    for r in rows:
+        by_test.setdefault(r.test_id, []).append(r)
+
+    values = []
+    for test_id, attempts in by_test.items():
+        # версия ключа из БД, как при submit: исправленный ключ действует сразу
+        meta = get_test_meta(db, test_id, attempts[0].answer_key_version or 0)
+        answer_sets = [{**(r.answers or {}), **draft_buffer.take(r.id)} for r in attempts]
+        scores = get_answer_key(db, meta).score_many(answer_sets)
+        for r, answers, score in zip(attempts, answer_sets, scores):
+            values.append({
+                "id": r.id,
+                "status": AttemptStatus.expired,
+                # время, когда попытка должна была закончиться, а не время уборки
+                "finished_at": min(attempt_must_finish_at(meta, r.started_at) or meta.deadline or now, now),
+                "answers": answers or None,
+                "auto_score": int(score) if answers else None,
+                "attempt_token": None,
+            })
+    db.execute(update(TestAttempt), values)
+    db.commit()
+    return len(values)
+
+
+class AttemptExpirySweeper:
+    """Фоновый поток: раз в interval секунд закрывает брошенные попытки пачками; 0 — выключен."""
+
+    def __init__(self, interval: float, batch_size: int = SWEEP_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.expired = 0
+
+    def start(self):
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="attempt-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def sweep(self) -> int:
+        total = 0
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            with SessionLocal() as db:
+                n = expire_overdue_attempts(db, batch_size=self.batch_size)
+            total += n
+            if n < self.batch_size:
+                break
+        if total:
+            self.expired += total
+            logger.info("Expired %d abandoned attempts in %.2fs", total, time.perf_counter() - started)
+        return total
+
+    def _run(self):
+        while not self._stop.wait(max(1.0, self.interval)):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Attempt expiry sweep failed")
+
+
+attempt_sweeper = AttemptExpirySweeper(interval=settings.ATTEMPT_SWEEP_INTERVAL_SEC)
@@ -0,0 +1,106 @@
+import logging
+import threading
+from sqlalchemy import select, update
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.testing import TestAttempt, AttemptStatus
+
+logger = logging.getLogger(__name__)
+
+
+class DraftAnswerBuffer:
+    """
+    Автосохранение ответов незавершённых попыток.
+    Эндпоинт черновика только сливает изменения в словарь попытки в памяти,
+    фоновый поток раз в flush_interval дописывает накопленное в test_attempts.answers
+    (слияние с тем, что уже в БД, под блокировкой строк) — сколько бы раз студент
+    ни нажал клавишу, попытка пишется не чаще раза за интервал.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = max(0.05, flush_interval)
+        self._pending: dict[int, dict] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.writes = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="draft-answers", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Останавливает поток и дописывает оставшиеся черновики."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def add(self, attempt_id: int, answers: dict) -> int:
+        """Сливает изменения в черновик попытки; возвращает число несохранённых ответов."""
+        with self._lock:
+            pending = self._pending.setdefault(attempt_id, {})
+            pending.update(answers)
+            self.updates += 1
+            return len(pending)
+
+    def peek(self, attempt_id: int) -> dict:
+        with self._lock:
+            return dict(self._pending.get(attempt_id, {}))
+
+    def take(self, attempt_id: int) -> dict:
+        """Забирает несохранённый черновик (при сдаче попытки он пишется вместе с ответами)."""
+        with self._lock:
+            return self._pending.pop(attempt_id, {})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "updates": self.updates,
+                "writes": self.writes,
+                "failed": self.failed,
+                "running": bool(self._thread and self._thread.is_alive()),
+            }
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            with SessionLocal() as db:
+                rows = db.execute(
+                    select(TestAttempt.id, TestAttempt.answers)
+                    .where(TestAttempt.id.in_(batch), TestAttempt.status == AttemptStatus.started)
+                    .with_for_update()
+                ).all()
+                # завершённые попытки просто выпадают: их ответы уже записал submit
+                if rows:
+                    db.execute(update(TestAttempt), [
+                        {"id": r.id, "answers": {**(r.answers or {}), **batch[r.id]}} for r in rows
+                    ])
+                db.commit()
+        except Exception:
+            logger.exception("Draft answers flush failed, %d attempts kept for retry", len(batch))
+            with self._lock:
+                self.failed += 1
+                for attempt_id, answers in batch.items():
+                    # более свежие изменения, пришедшие во время записи, важнее
+                    self._pending[attempt_id] = {**answers, **self._pending.get(attempt_id, {})}
+            return
+        with self._lock:
+            self.writes += len(rows)
+
+
+draft_buffer = DraftAnswerBuffer(flush_interval=settings.AUTOSAVE_FLUSH_INTERVAL_SEC)
@@ -0,0 +1,91 @@
+from datetime import datetime
+from sqlalchemy import select, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models.grade import Grade, Student, is_final_type
+from app.models.schedule import Lesson
+from app.schemas.grade import GradeBatchItem, GradeType
+
+
+def upsert_lesson_grades(
+    db: Session,
+    lesson: Lesson,
+    items: list[GradeBatchItem],
+    teacher_id: int | None,
+    modified_by_admin_id: int | None,
+    graded_at: datetime | None = None,
+) -> list[dict]:
+    """
+    Оценки за одно занятие сразу для всей группы. Права проверяет вызывающий;
+    здесь — построчные проверки (оценка, студент из группы занятия, повтор
+    в запросе, уже выставленная итоговая) тремя запросами на весь список
+    и одна вставка INSERT ... ON CONFLICT (uq_grade_per_lesson_type) DO UPDATE.
+    Возвращает результат по каждой строке в порядке запроса; коммит — за вызывающим.
+    """
+    graded_at = graded_at or datetime.utcnow()
+    student_ids = {it.student_id for it in items}
+    in_group = set(db.scalars(
+        select(Student.id).where(Student.id.in_(student_ids), Student.group_id == lesson.group_id)
+    )) if student_ids else set()
+    existing = {
+        (r.student_id, r.grade_type): r.id
+        for r in db.execute(
+            select(Grade.id, Grade.student_id, Grade.grade_type)
+            .where(Grade.lesson_id == lesson.id, Grade.student_id.in_(student_ids))
+        )
+    } if student_ids else {}
+    # итоговая по предмету одна: выставленная на другом занятии (или без занятия) блокирует новую
+    other_final = set(db.scalars(
+        select(Grade.student_id).where(
+            Grade.student_id.in_(student_ids),
+            Grade.subject_id == lesson.subject_id,
+            Grade.is_final.is_(True),
+            or_(Grade.lesson_id.is_(None), Grade.lesson_id != lesson.id),
+        )
+    )) if student_ids else set()
+
+    results, rows, seen = [], [], set()
+    for it in items:
+        key = (it.student_id, it.grade_type)
+        res = {"student_id": it.student_id, "grade_type": it.grade_type, "status": "error"}
+        results.append(res)
+        if it.value not in GradeType:
+            res["error"] = "Недопустимая оценка"
+        elif it.student_id not in in_group:
+            res["error"] = "Student is not in the lesson's group"
+        elif key in seen:
+            res["error"] = "Duplicate student and grade type in request"
+        elif is_final_type(it.grade_type) and it.student_id in other_final:
+            res["error"] = "Final grade already exists for this subject and student"
+        else:
+            seen.add(key)
+            if is_final_type(it.grade_type):
+                other_final.add(it.student_id)
+            res["status"] = "updated" if key in existing else "created"
+            rows.append({
+                "student_id": it.student_id,
+                "subject_id": lesson.subject_id,
+                "teacher_id": teacher_id,
+                "lesson_id": lesson.id,
+                "grade_type": it.grade_type,
+                "is_final": is_final_type(it.grade_type),
+                "value": it.value,
+                "graded_at": graded_at,
+                "comment": it.comment,
+                "modified_by_admin_id": modified_by_admin_id,
+            })
+
+    if rows:
+        stmt = pg_insert(Grade.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["student_id", "lesson_id", "grade_type"],
+            set_={
+                c: stmt.excluded[c]
+                for c in ("value", "comment", "graded_at", "teacher_id", "modified_by_admin_id")
+            },
+        ).returning(Grade.__table__.c.id, Grade.__table__.c.student_id, Grade.__table__.c.grade_type)
+        ids = {(r.student_id, r.grade_type): r.id for r in db.execute(stmt)}
+        for res in results:
+            if res["status"] != "error":
+                res["grade_id"] = ids.get((res["student_id"], res["grade_type"]))
+    return results
@@ -0,0 +1,183 @@
+import csv
+import io
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, aliased
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from app.models.grade import Grade, Student
+from app.models.schedule import Group, Subject, Teacher
+from app.models.user import User
+
+HEADER = [
+    "№", "ФИО студента", "Предмет", "Тип оценки",
+    "Оценка", "Комментарий", "Преподаватель", "Дата выставления",
+]
+# Ширины колонок задаются заранее: в write-only режиме листы не перечитываются
+COLUMN_WIDTHS = [7, 36, 32, 12, 9, 40, 32, 18]
+BATCH_SIZE = 2000
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+@dataclass
+class GradeExportFilters:
+    from_date: datetime | None = None
+    to_date: datetime | None = None
+    teacher_id: int | None = None
+    subject_id: int | None = None
+    grade_type: str | None = None
+
+
+def _grades_query(f: GradeExportFilters):
+    """Все оценки одним запросом, упорядоченные по группе и студенту."""
+    student_user = aliased(User)
+    teacher_user = aliased(User)
+    q = (
+        select(
+            Group.id.label("group_id"),
+            Student.id.label("student_id"),
+            student_user.full_name.label("student_name"),
+            Subject.title.label("subject"),
+            Grade.grade_type,
+            Grade.value,
+            Grade.comment,
+            func.coalesce(func.nullif(Teacher.full_name, ""), teacher_user.full_name).label("teacher_name"),
+            Grade.graded_at,
+        )
+        .select_from(Grade)
+        .join(Subject, Subject.id == Grade.subject_id)
+        .join(Student, Student.id == Grade.student_id)
+        .join(Group, Group.id == Student.group_id)
+        .join(student_user, student_user.id == Student.user_id)
+        .outerjoin(Teacher, Teacher.id == Grade.teacher_id)
+        .outerjoin(teacher_user, teacher_user.id == Teacher.user_id)
+    )
+    if f.from_date:
+        q = q.where(Grade.graded_at >= f.from_date)
+    if f.to_date:
+        q = q.where(Grade.graded_at <= f.to_date)
+    if f.teacher_id:
+        q = q.where(Grade.teacher_id == f.teacher_id)
+    if f.subject_id:
+        q = q.where(Grade.subject_id == f.subject_id)
+    if f.grade_type:
+        q = q.where(Grade.grade_type.ilike(f"%{f.grade_type}%"))
+    return q.order_by(Group.id, Student.id, Grade.id)
+
+
+def _iter_rows(db: Session, f: GradeExportFilters):
+    # yield_per — серверный курсор, строки не накапливаются в памяти
+    return db.execute(_grades_query(f).execution_options(yield_per=BATCH_SIZE))
+
+
+def _row_values(r, num: int) -> list:
+    return [
+        num,
+        r.student_name or "—",
+        r.subject or "",
+        "Итоговая" if r.grade_type == "final" else "",
+        r.value,
+        r.comment or "",
+        r.teacher_name or "",
+        r.graded_at.strftime("%d.%m.%Y %H:%M") if r.graded_at else "",
+    ]
+
+
+def list_groups(db: Session) -> list[tuple[int, str]]:
+    return [(gid, code or title) for gid, code, title in db.execute(
+        select(Group.id, Group.code, Group.title).order_by(Group.id)
+    )]
+
+
+def write_grades_xlsx(db: Session, out, f: GradeExportFilters, groups: list[tuple[int, str]] | None = None):
+    """
+    Ведомость в xlsx: лист на группу (включая группы без оценок).
+    Строки пишутся в write-only книгу по мере чтения курсора.
+    """
+    groups = groups if groups is not None else list_groups(db)
+    wb = Workbook(write_only=True)
+    sheets = {}
+    for gid, name in groups:
+        ws = wb.create_sheet(title=str(name)[:31])
+        for i, width in enumerate(COLUMN_WIDTHS):
+            ws.column_dimensions[get_column_letter(i + 1)].width = width
+        ws.append(HEADER)
+        sheets[gid] = [ws, 0]
+
+    for r in _iter_rows(db, f):
+        sheet = sheets.get(r.group_id)
+        if sheet is None:
+            continue
+        sheet[1] += 1
+        sheet[0].append(_row_values(r, sheet[1]))
+
+    wb.save(out)
+
+
+def iter_grades_csv(db: Session, f: GradeExportFilters, groups: list[tuple[int, str]] | None = None) -> Iterator[str]:
+    """CSV (с колонкой группы) кусками по BATCH_SIZE строк."""
+    names = dict(groups if groups is not None else list_groups(db))
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")  # BOM, чтобы Excel открыл UTF-8 без вопросов
+    writer.writerow(["Группа", *HEADER])
+    counters: dict[int, int] = {}
+    n = 0
+    for r in _iter_rows(db, f):
+        counters[r.group_id] = counters.get(r.group_id, 0) + 1
+        writer.writerow([names.get(r.group_id, ""), *_row_values(r, counters[r.group_id])])
+        n += 1
+        if n % BATCH_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def write_grades_parquet(db: Session, path: str, f: GradeExportFilters):
+    """Parquet (нужен pyarrow) — сырые значения без форматирования, пачками по BATCH_SIZE."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("group", pa.string()),
+        ("student_id", pa.int64()),
+        ("student_name", pa.string()),
+        ("subject", pa.string()),
+        ("grade_type", pa.string()),
+        ("value", pa.string()),
+        ("comment", pa.string()),
+        ("teacher_name", pa.string()),
+        ("graded_at", pa.timestamp("us", tz="UTC")),
+    ])
+    names = dict(list_groups(db))
+    with pq.ParquetWriter(path, schema) as writer:
+        batch: list[dict] = []
+        for r in _iter_rows(db, f):
+            batch.append({
+                "group": names.get(r.group_id),
+                "student_id": r.student_id,
+                "student_name": r.student_name,
+                "subject": r.subject,
+                "grade_type": r.grade_type,
+                "value": r.value,
+                "comment": r.comment,
+                "teacher_name": r.teacher_name,
+                "graded_at": r.graded_at,
+            })
+            if len(batch) >= BATCH_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
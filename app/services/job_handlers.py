@@ -0,0 +1,58 @@
+"""Обработчики фоновых задач (app/core/jobs.py). Модуль импортируется при старте приложения."""
+from datetime import datetime
+from app.core.jobs import JobContext, job_handler
+from app.db.session import SessionLocal, ReportSessionLocal
+from app.services.schedule_importer import import_schedule
+from app.services.user_importer import import_users, EXPORT_NAME
+from app.services.grade_export import GradeExportFilters, write_grades_xlsx, write_grades_parquet, iter_grades_csv
+from app.services.thumbnails import make_thumbnails
+
+
+@job_handler("schedule_import")
+def run_schedule_import(ctx: JobContext):
+    with SessionLocal() as db:
+        result = import_schedule(db, ctx.input_path, progress=ctx.progress, mode=ctx.params.get("mode", "append"))
+    return result.as_dict()
+
+
+@job_handler("users_import")
+def run_users_import(ctx: JobContext):
+    with SessionLocal() as db:
+        result = import_users(
+            db, ctx.input_path, ctx.workdir, progress=ctx.progress, dry_run=ctx.params.get("dry_run", False)
+        )
+    if result.export_path:
+        ctx.artifact_path = result.export_path
+        ctx.artifact_name = EXPORT_NAME
+    return result.as_dict()
+
+
+@job_handler("grades_export", max_attempts=3)
+def run_grades_export(ctx: JobContext):
+    p = ctx.params
+    filters = GradeExportFilters(
+        from_date=datetime.fromisoformat(p["from_date"]) if p.get("from_date") else None,
+        to_date=datetime.fromisoformat(p["to_date"]) if p.get("to_date") else None,
+        teacher_id=p.get("teacher_id"),
+        subject_id=p.get("subject_id"),
+        grade_type=p.get("grade_type"),
+    )
+    fmt = p.get("format", "xlsx")
+    path = ctx.artifact(f"grades.{fmt}", p.get("filename") or f"vedomost.{fmt}")
+    with ReportSessionLocal() as db:
+        if fmt == "csv":
+            with open(path, "w", encoding="utf-8", newline="") as out:
+                for chunk in iter_grades_csv(db, filters):
+                    out.write(chunk)
+                    ctx.check_cancelled()
+        elif fmt == "parquet":
+            write_grades_parquet(db, path, filters)
+        else:
+            write_grades_xlsx(db, path, filters)
+    return None
+
+
+@job_handler("thumbnails", max_attempts=2)
+def run_thumbnails(ctx: JobContext):
+    made = make_thumbnails(ctx.params["path"])
+    return {"thumbnails": {str(size): path for size, path in made.items()}}
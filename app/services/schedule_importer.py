@@ -1,27 +1,23 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 import pandas as pd
-from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, insert, update, delete, bindparam
+from app.models.grade import Grade
 from app.models.schedule import Group, Subject, Teacher, Room, Lesson, LessonTime
-from app.schemas.schedule import LessonCreate
-from app.services.lesson_service import create_lesson
 
+REQUIRED_COLUMNS = ["Дата", "№ пары", "Группа", "Предмет", "Преподаватель", "Аудитория", "Тип занятия"]
+DEFAULT_ROOM = "Не указано"
+BATCH_SIZE = 5000
+# Сколько ошибок строк возвращать в ответе (счётчик считает все)
+MAX_REPORTED_ERRORS = 500
 
-def get_lesson_time(db: Session, lesson_number: int):
-    return db.scalar(
-        select(LessonTime).where(LessonTime.lesson_number == lesson_number)
-    )
-
-
-def get_or_create(db: Session, model, defaults=None, **kwargs):
-    instance = db.query(model).filter_by(**kwargs).first()
-    if instance:
-        return instance
-    params = {**kwargs, **(defaults or {})}
-    instance = model(**params)
-    db.add(instance)
-    db.flush()
-    return instance
+# append — добавить все строки файла; sync — привести занятия групп файла
+# в диапазоне его дат к содержимому файла (ключ: группа, дата, № пары)
+APPEND = "append"
+SYNC = "sync"
+# Поля, по которым сравнивается занятие в режиме sync
+SYNC_FIELDS = ("subject_id", "teacher_id", "room_id", "starts_at", "ends_at", "lesson_type", "notes")
 
 
 def detect_lesson_type(subject_title: str) -> str | None:
@@ -35,51 +31,295 @@ def detect_lesson_type(subject_title: str) -> str | None:
     return None
 
 
-def parse_schedule_excel(file_path: str, db: Session) -> int:
-    df = pd.read_excel(file_path)
+@dataclass
+class ScheduleImportResult:
+    mode: str = APPEND
+    total_rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    kept_with_grades: int = 0
+    skipped: int = 0
+    errors: list[dict] = field(default_factory=list)
+    created: dict = field(default_factory=dict)
+
+    def error(self, row: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "total_rows": self.total_rows,
+            "imported_lessons": self.inserted,
+            "updated": self.updated,
+            "deleted": self.deleted,
+            "unchanged": self.unchanged,
+            "kept_with_grades": self.kept_with_grades,
+            "skipped": self.skipped,
+            "created": self.created,
+            "errors": self.errors,
+        }
+
+
+def _text(df: pd.DataFrame, column: str) -> pd.Series:
+    """Колонка как строки без пробелов по краям; пустые и NaN — None."""
+    if column not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    # where(..., None)/map в новых pandas возвращают NaN вместо None, поэтому собираем вручную
+    # числовая колонка с пропусками читается как float: 101 -> "101", а не "101.0"
+    values = [
+        (str(int(v) if isinstance(v, float) and v.is_integer() else v).strip() or None) if pd.notna(v) else None
+        for v in df[column]
+    ]
+    return pd.Series(values, index=df.index, dtype=object)
+
+
+def _read_excel(file_path: str) -> pd.DataFrame:
+    # python-calamine (если установлен) читает большие xlsx на порядок быстрее openpyxl
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return pd.read_excel(file_path)
+    return pd.read_excel(file_path, engine="calamine")
+
+
+def read_schedule_frame(db: Session, file_path: str, result: ScheduleImportResult) -> pd.DataFrame:
+    """
+    Разбор Excel целиком колонками (без iterrows). Возвращает только годные строки
+    с колонками group, subject, teacher, room, lesson_number, starts_at, ends_at,
+    lesson_type, notes и row (номер строки в файле); ошибки — в result.
+    """
+    df = _read_excel(file_path)
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"В файле нет колонок: {', '.join(missing)}")
+    result.total_rows = len(df)
+
+    out = pd.DataFrame({
+        "row": df.index + 2,  # строка 1 — заголовок
+        "group": _text(df, "Группа"),
+        "subject": _text(df, "Предмет"),
+        "teacher": _text(df, "Преподаватель"),
+        "room": _text(df, "Аудитория").fillna(DEFAULT_ROOM),
+        "type_raw": _text(df, "Тип занятия"),
+        "notes": _text(df, "Комментарий"),
+        "date": pd.to_datetime(df["Дата"], dayfirst=True, errors="coerce", format="mixed").dt.normalize(),
+        "lesson_number": pd.to_numeric(df["№ пары"], errors="coerce"),
+    })
+
+    times = {
+        lt.lesson_number: (lt.start_time, lt.end_time)
+        for lt in db.scalars(select(LessonTime))
+    }
+
+    bad_required = out["date"].isna() | out["lesson_number"].isna() | out["subject"].isna()
+    bad_group = ~bad_required & out["group"].isna()
+    no_time = ~bad_required & ~bad_group & ~out["lesson_number"].isin(list(times))
+    for r in out.loc[bad_required, "row"]:
+        result.error(int(r), "Не указаны дата, № пары или предмет")
+    for r in out.loc[bad_group, "row"]:
+        result.error(int(r), "Не указана группа")
+    for r, n in out.loc[no_time, ["row", "lesson_number"]].itertuples(index=False):
+        result.error(int(r), f"Нет времени для пары {int(n)}")
+
+    out = out[~(bad_required | bad_group | no_time)].copy()
+    out["lesson_number"] = out["lesson_number"].astype(int)
+
+    def offset(n: int, idx: int) -> timedelta:
+        t = times[n][idx]
+        return timedelta(hours=t.hour, minutes=t.minute, seconds=t.second)
+
+    start_off = {n: offset(n, 0) for n in times}
+    end_off = {n: offset(n, 1) for n in times}
+    out["starts_at"] = out["date"] + pd.to_timedelta(out["lesson_number"].map(start_off))
+    out["ends_at"] = out["date"] + pd.to_timedelta(out["lesson_number"].map(end_off))
+    types = {v: detect_lesson_type(v) for v in out["type_raw"].dropna().unique()}
+    out["lesson_type"] = pd.Series([types.get(v) for v in out["type_raw"]], index=out.index, dtype=object)
+    return out.drop(columns=["type_raw", "date"])
+
+
+def _ensure(db: Session, model, key_col, keys: set, defaults, result: ScheduleImportResult) -> dict:
+    """
+    Словарь ключ -> id для всех keys: существующие читаются одним запросом,
+    недостающие создаются одной многострочной вставкой.
+    """
+    ids: dict = {}
+    if not keys:
+        return ids
+    for obj_id, key in db.execute(select(model.id, key_col).where(key_col.in_(keys)).order_by(model.id)):
+        ids.setdefault(key, obj_id)  # при дублях в справочнике — как get_or_create, первая запись
+    missing = sorted(keys - ids.keys())
+    if missing:
+        rows = db.execute(
+            insert(model).returning(model.id, key_col),
+            [{key_col.key: k, **defaults(k)} for k in missing],
+        ).all()
+        ids.update({key: obj_id for obj_id, key in rows})
+        result.created[model.__tablename__] = len(missing)
+    return ids
 
-    lessons_added = 0
-    for _, row in df.iterrows():
-        date = row["Дата"]
-        lesson_number = row["№ пары"]
-        group_code = str(row["Группа"]).strip()
-        subject_title = str(row["Предмет"]).strip()
-        teacher_name = str(row["Преподаватель"]).strip() if pd.notna(row["Преподаватель"]) else None
-        room_code = str(row["Аудитория"]).strip() if pd.notna(row["Аудитория"]) else "Не указано"
-        lesson_type = detect_lesson_type(str(row["Тип занятия"])) if pd.notna(row["Тип занятия"]) else None
 
-        if pd.isna(date) or pd.isna(lesson_number) or not subject_title:
+def resolve_references(db: Session, frame: pd.DataFrame, result: ScheduleImportResult) -> pd.DataFrame:
+    """Проставляет group_id/subject_id/teacher_id/room_id, создавая недостающие записи пачкой."""
+    groups = _ensure(db, Group, Group.code, set(frame["group"]), lambda k: {"title": k}, result)
+    subjects = _ensure(db, Subject, Subject.title, set(frame["subject"]), lambda k: {}, result)
+    teachers = _ensure(db, Teacher, Teacher.full_name, set(frame["teacher"].dropna()), lambda k: {}, result)
+    rooms = _ensure(db, Room, Room.code, set(frame["room"]), lambda k: {"title": k}, result)
+
+    frame = frame.copy()
+    frame["group_id"] = frame["group"].map(groups)
+    frame["subject_id"] = frame["subject"].map(subjects)
+    frame["teacher_id"] = pd.Series([teachers.get(t) for t in frame["teacher"]], index=frame.index, dtype=object)
+    frame["room_id"] = frame["room"].map(rooms)
+    return frame
+
+
+def lesson_values(frame: pd.DataFrame) -> list[dict]:
+    """Строки для вставки занятий: python-типы вместо numpy/pandas."""
+    rows = []
+    for r in frame.itertuples(index=False):
+        rows.append({
+            "group_id": int(r.group_id),
+            "subject_id": int(r.subject_id),
+            "teacher_id": int(r.teacher_id) if r.teacher_id is not None else None,
+            "room_id": int(r.room_id),
+            "lesson_number": int(r.lesson_number),
+            "starts_at": r.starts_at.to_pydatetime(),
+            "ends_at": r.ends_at.to_pydatetime(),
+            "lesson_type": r.lesson_type,
+            "notes": r.notes,
+            "created_by": None,
+        })
+    return rows
+
+
+def _naive(dt: datetime) -> datetime:
+    # timestamptz приходит с поясом сессии; файл — в «настенном» времени
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def _insert_lessons(db: Session, rows: list[dict], progress, batch_size: int):
+    for start in range(0, len(rows), batch_size):
+        if progress:
+            progress(start, len(rows))
+        # Core-вставка по таблице: ORM bulk дробит executemany по набору не-None колонок
+        db.execute(insert(Lesson.__table__), rows[start:start + batch_size])
+
+
+def sync_lessons(db: Session, frame: pd.DataFrame, result: ScheduleImportResult, progress, batch_size: int):
+    """
+    Diff-импорт: для каждой группы файла берутся её занятия в диапазоне дат файла,
+    сопоставляются по (группа, дата, № пары) и применяется только разница.
+    Занятия с оценками не удаляются (оценки удалились бы каскадом).
+    """
+    frame = frame.copy()
+    frame["day"] = frame["starts_at"].dt.date
+    dup = frame.duplicated(["group_id", "day", "lesson_number"], keep="first")
+    for r in frame.loc[dup, "row"]:
+        result.error(int(r), "Пара для этой группы и даты уже есть выше в файле")
+    frame = frame[~dup]
+
+    days = frame.groupby("group_id")["day"].agg(["min", "max"])
+    ranges = {int(gid): (r["min"], r["max"]) for gid, r in days.iterrows()}
+    lo = min(r[0] for r in ranges.values())
+    hi = max(r[1] for r in ranges.values()) + timedelta(days=1)
+
+    wanted = {}
+    for row in lesson_values(frame):
+        wanted[(row["group_id"], row["starts_at"].date(), row["lesson_number"])] = row
+
+    existing = {}
+    to_delete = []
+    q = (
+        select(Lesson.id, Lesson.group_id, Lesson.lesson_number, *[getattr(Lesson, f) for f in SYNC_FIELDS])
+        .where(
+            Lesson.group_id.in_(list(ranges)),
+            Lesson.starts_at >= datetime.combine(lo, datetime.min.time()),
+            Lesson.starts_at < datetime.combine(hi, datetime.min.time()),
+        )
+        .order_by(Lesson.id)
+    )
+    for r in db.execute(q):
+        day = _naive(r.starts_at).date()
+        first, last = ranges[r.group_id]
+        if not first <= day <= last:
             continue
+        key = (r.group_id, day, r.lesson_number)
+        if key in existing or key not in wanted:
+            # лишнее занятие или дубль от прежних импортов
+            to_delete.append(r.id)
+        else:
+            existing[key] = r
 
-        date = pd.to_datetime(date, dayfirst=True).date()
-        lesson_number = int(lesson_number)
-        lt = get_lesson_time(db, lesson_number)
-        if not lt:
+    inserts, updates = [], []
+    for key, row in wanted.items():
+        cur = existing.get(key)
+        if cur is None:
+            inserts.append(row)
             continue
+        current = {f: getattr(cur, f) for f in SYNC_FIELDS}
+        current["starts_at"] = _naive(current["starts_at"])
+        current["ends_at"] = _naive(current["ends_at"])
+        if any(current[f] != row[f] for f in SYNC_FIELDS):
+            updates.append({"b_id": cur.id, **{f"b_{f}": row[f] for f in SYNC_FIELDS}})
+        else:
+            result.unchanged += 1
 
-        starts_at = datetime.combine(date, lt.start_time)
-        ends_at = datetime.combine(date, lt.end_time)
-
-        group = get_or_create(db, Group, code=group_code, defaults={"title": group_code})
-        subject = get_or_create(db, Subject, title=subject_title)
-        teacher = get_or_create(db, Teacher, full_name=teacher_name) if teacher_name else None
-        room = get_or_create(db, Room, code=room_code, defaults={"title": room_code})
-
-        payload = LessonCreate(
-            group_code=group_code,
-            room_code=room_code,
-            starts_at=starts_at,
-            ends_at=ends_at,
-            lesson_type=lesson_type,
-            notes=str(row.get("Комментарий")).strip() if pd.notna(row.get("Комментарий")) else None,
-            subject_id=subject.id,
-            teacher_id=teacher.id if teacher else None,
-            subject_title=subject.title,
-            teacher_full_name=teacher.full_name if teacher else None,
-            lesson_number=lesson_number,
+    if to_delete:
+        protected = set()
+        for start in range(0, len(to_delete), batch_size):
+            chunk = to_delete[start:start + batch_size]
+            protected.update(db.scalars(select(Grade.lesson_id).where(Grade.lesson_id.in_(chunk)).distinct()))
+        to_delete = [i for i in to_delete if i not in protected]
+        result.kept_with_grades = len(protected)
+        for start in range(0, len(to_delete), batch_size):
+            db.execute(delete(Lesson).where(Lesson.id.in_(to_delete[start:start + batch_size])))
+        result.deleted = len(to_delete)
+
+    if updates:
+        t = Lesson.__table__
+        stmt = (
+            update(t)
+            .where(t.c.id == bindparam("b_id"))
+            .values({f: bindparam(f"b_{f}") for f in SYNC_FIELDS})
         )
-        create_lesson(db, payload)
-        lessons_added += 1
+        for start in range(0, len(updates), batch_size):
+            db.execute(stmt, updates[start:start + batch_size])
+        result.updated = len(updates)
+
+    _insert_lessons(db, inserts, progress, batch_size)
+    result.inserted = len(inserts)
+
+
+def import_schedule(
+    db: Session,
+    file_path: str,
+    progress=None,
+    batch_size: int = BATCH_SIZE,
+    mode: str = APPEND,
+) -> ScheduleImportResult:
+    """
+    Импорт расписания одной транзакцией: разбор колонками, справочники —
+    по запросу на таблицу, занятия — многострочными вставками по batch_size.
+    mode=sync — вместо добавления применяется только разница (см. sync_lessons).
+    progress(done, total) — необязательный колбэк (фоновые задачи).
+    """
+    if mode not in (APPEND, SYNC):
+        raise ValueError(f"Неизвестный режим импорта: {mode}")
+    result = ScheduleImportResult(mode=mode)
+    frame = read_schedule_frame(db, file_path, result)
+    if frame.empty:
+        return result
+    frame = resolve_references(db, frame, result)
 
+    if mode == SYNC:
+        sync_lessons(db, frame, result, progress, batch_size)
+    else:
+        rows = lesson_values(frame)
+        _insert_lessons(db, rows, progress, batch_size)
+        result.inserted = len(rows)
     db.commit()
-    return lessons_added
+    return result
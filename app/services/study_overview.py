@@ -0,0 +1,165 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterator
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+from app.models.grade import Student as StudentModel, Grade
+from app.models.schedule import Group, Subject, Lesson, Teacher, Room
+from app.models.user import User
+
+
+def _load_lessons(db: Session, group_ids, date_from, date_to) -> dict[int, list[dict]]:
+    """Занятия сразу для всех групп страницы."""
+    q = (
+        select(
+            Lesson.id, Lesson.group_id, Lesson.subject_id,
+            Teacher.full_name.label("teacher"), Room.code.label("room"),
+            Lesson.starts_at, Lesson.ends_at, Lesson.lesson_type,
+        )
+        .outerjoin(Teacher, Teacher.id == Lesson.teacher_id)
+        .outerjoin(Room, Room.id == Lesson.room_id)
+        .where(Lesson.group_id.in_(group_ids))
+    )
+    if date_from:
+        q = q.where(Lesson.starts_at >= date_from)
+    if date_to:
+        q = q.where(Lesson.starts_at < date_to)
+
+    by_group: dict[int, list[dict]] = {gid: [] for gid in group_ids}
+    for r in db.execute(q.order_by(Lesson.starts_at, Lesson.id)):
+        by_group[r.group_id].append({
+            "id": r.id,
+            "subject_id": r.subject_id,
+            "teacher": r.teacher,
+            "room": r.room,
+            "starts_at": r.starts_at,
+            "ends_at": r.ends_at,
+            "lesson_type": r.lesson_type,
+        })
+    return by_group
+
+
+def _load_subjects(db: Session, subject_ids) -> dict[int, dict]:
+    if not subject_ids:
+        return {}
+    primary = aliased(Teacher)
+    rows = db.execute(
+        select(Subject.id, Subject.title, Subject.code, Subject.primary_teacher_id, primary.full_name)
+        .outerjoin(primary, primary.id == Subject.primary_teacher_id)
+        .where(Subject.id.in_(subject_ids))
+    ).all()
+    return {
+        r.id: {
+            "id": r.id,
+            "title": r.title,
+            "code": r.code,
+            "primary_teacher_id": r.primary_teacher_id,
+            "primary_teacher_name": r.full_name,
+        }
+        for r in rows
+    }
+
+
+def _load_grades(db: Session, student_ids, subject_ids) -> dict[int, list]:
+    """Оценки всех студентов страницы одним запросом, по убыванию даты."""
+    if not subject_ids:
+        return {}
+    rows = db.execute(
+        select(
+            Grade.id, Grade.student_id, Grade.subject_id, Grade.grade_type, Grade.is_final, Grade.value,
+            Grade.graded_at, Grade.lesson_id, Lesson.starts_at.label("lesson_date"),
+            Grade.teacher_id, Grade.comment,
+        )
+        .outerjoin(Lesson, Lesson.id == Grade.lesson_id)
+        .where(Grade.student_id.in_(student_ids), Grade.subject_id.in_(subject_ids))
+        .order_by(Grade.graded_at.desc())
+    )
+    by_student: dict[int, list] = defaultdict(list)
+    for r in rows:
+        by_student[r.student_id].append(r)
+    return by_student
+
+
+def iter_study_overview(
+    db: Session,
+    group_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    offset: int = 0,
+    limit: int | None = None,
+    chunk_size: int = 500,
+) -> Iterator[dict]:
+    """
+    Сводка по успеваемости всех студентов (или одной группы).
+    Студенты читаются пачками по chunk_size; на пачку — фиксированное число
+    запросов: занятия по группам пачки, предметы и оценки всех её студентов.
+    """
+    q = (
+        select(StudentModel.id, StudentModel.group_id, User.full_name, Group.code)
+        .join(User, User.id == StudentModel.user_id)
+        .join(Group, Group.id == StudentModel.group_id)
+        .order_by(StudentModel.group_id, StudentModel.id)
+    )
+    if group_id is not None:
+        q = q.where(StudentModel.group_id == group_id)
+
+    lessons_by_group: dict[int, list[dict]] = {}
+    subjects: dict[int, dict] = {}
+    sent = 0
+    while limit is None or sent < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - sent)
+        students = db.execute(q.offset(offset + sent).limit(size)).all()
+        if not students:
+            break
+        sent += len(students)
+
+        # Студенты упорядочены по группе, поэтому занятия группы обычно
+        # грузятся один раз; из кэша выкидываем группы прошлых пачек
+        group_ids = {st.group_id for st in students}
+        lessons_by_group = {gid: v for gid, v in lessons_by_group.items() if gid in group_ids}
+        missing = group_ids - lessons_by_group.keys()
+        if missing:
+            lessons_by_group.update(_load_lessons(db, missing, date_from, date_to))
+
+        subject_ids = {l["subject_id"] for gid in group_ids for l in lessons_by_group[gid]}
+        missing = subject_ids - subjects.keys()
+        if missing:
+            subjects.update(_load_subjects(db, missing))
+
+        grades = _load_grades(db, [st.id for st in students], subject_ids)
+
+        for st in students:
+            lessons = lessons_by_group[st.group_id]
+            subj_dict = {}
+            for l in lessons:
+                sid = l["subject_id"]
+                if sid not in subj_dict and sid in subjects:
+                    subj_dict[sid] = {**subjects[sid], "grades": [], "final_grade": None}
+
+            for g in grades.get(st.id, ()):
+                subj_data = subj_dict.get(g.subject_id)
+                if subj_data is None:
+                    continue
+                subj_data["grades"].append({
+                    "id": g.id,
+                    "type": g.grade_type,
+                    "value": g.value,
+                    "graded_at": g.graded_at,
+                    "lesson_id": g.lesson_id,
+                    "lesson_date": g.lesson_date,
+                    "teacher_id": g.teacher_id,
+                    "comment": g.comment,
+                })
+                if g.is_final:
+                    subj_data["final_grade"] = g.value
+
+            yield {
+                "student_id": st.id,
+                "student_name": st.full_name,
+                "group": st.code,
+                "subjects": list(subj_dict.values()),
+                "lessons": lessons,
+            }
+
+        if len(students) < size:
+            break
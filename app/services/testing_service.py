@@ -1,13 +1,21 @@
 from __future__ import annotations
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Iterable
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 import hmac, hashlib
+import json
+import threading
+import time
 
+import numpy as np
+
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, insert, literal, Integer, DateTime, or_, and_
+from sqlalchemy.exc import IntegrityError
 
 from app.core.config import Settings
-from app.models.testing import Test, Question, QuestionType, TestAttempt, AttemptStatus
+from app.models.testing import Test, Question, QuestionType, TestAttempt, TestGroupAccess, AttemptStatus
 
 settings = Settings()
 
@@ -22,20 +30,120 @@ def verify_attempt_token(token: str, attempt_id: int, student_id: int, test_id:
     return hmac.compare_digest(token, make_attempt_token(attempt_id, student_id, test_id))
 
 
-def can_start_attempt(db: Session, test: Test, student_id: int) -> Tuple[bool, str | None, int]:
-    now = datetime.utcnow()
-    if not test.is_active:
-        return False, "Тест отключён", 0
-    if test.deadline and now > test.deadline:
-        return False, "Дедлайн истёк", 0
+@dataclass(frozen=True, slots=True)
+class TestMeta:
+    """То, что нужно для старта и сдачи попытки, без загрузки строки теста и вопросов."""
+    id: int
+    is_active: bool
+    deadline: datetime | None
+    duration_minutes: int | None
+    max_attempts: int
+    answer_key_version: int
+    group_ids: frozenset[int]
+
+
+def load_test_meta(db: Session, test_id: int) -> TestMeta | None:
+    row = db.execute(
+        select(Test.id, Test.is_active, Test.deadline, Test.duration_minutes, Test.max_attempts, Test.answer_key_version)
+        .where(Test.id == test_id)
+    ).first()
+    if row is None:
+        return None
+    group_ids = frozenset(db.scalars(select(TestGroupAccess.group_id).where(TestGroupAccess.test_id == test_id)))
+    return TestMeta(
+        id=row.id,
+        is_active=bool(row.is_active),
+        deadline=row.deadline,
+        duration_minutes=row.duration_minutes,
+        max_attempts=row.max_attempts or 1,
+        answer_key_version=row.answer_key_version or 0,
+        group_ids=group_ids,
+    )
+
+
+class TestMetaCache:
+    """
+    Метаданные тестов в памяти процесса с TTL: в начале экзамена сотни студентов
+    стартуют один и тот же тест. Правки в этом процессе сбрасывают запись сразу,
+    в других воркерах — по истечении TTL.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._items: dict[int, tuple[float, TestMeta]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, test_id: int, answer_key_version: int | None = None) -> TestMeta | None:
+        """answer_key_version — свежая версия ключа из БД: запись со старой версией перечитывается."""
+        item = self._items.get(test_id)
+        if item and item[0] > time.monotonic() and (
+            answer_key_version is None or item[1].answer_key_version == answer_key_version
+        ):
+            return item[1]
+        meta = load_test_meta(db, test_id)
+        if meta is not None:
+            with self._lock:
+                self._items[test_id] = (time.monotonic() + self.ttl, meta)
+        return meta
+
+    def invalidate(self, test_id: int):
+        with self._lock:
+            self._items.pop(test_id, None)
+
+
+test_meta_cache = TestMetaCache(ttl=settings.TEST_META_CACHE_TTL_SEC)
+
+
+def get_test_meta(db: Session, test_id: int, answer_key_version: int | None = None) -> TestMeta | None:
+    return test_meta_cache.get(db, test_id, answer_key_version)
+
+
+def check_test_open(meta: TestMeta, now: datetime) -> str | None:
+    if not meta.is_active:
+        return "Тест отключён"
+    if meta.deadline and now > meta.deadline:
+        return "Дедлайн истёк"
+    return None
+
+
+def insert_attempt(db: Session, meta: TestMeta, student_id: int, now: datetime):
+    """
+    Создаёт попытку одним INSERT ... SELECT ... RETURNING: номер попытки и проверка
+    max_attempts считаются в том же запросе. Одновременные старты одного студента
+    разводит уникальный (student_id, test_id, attempt_number) — проигравший пересчитывает.
+    Возвращает (id, attempt_number, started_at) или None, если попытки кончились.
+    """
+    last = func.coalesce(func.max(TestAttempt.attempt_number), 0)
+    source = (
+        select(
+            literal(student_id, Integer),
+            literal(meta.id, Integer),
+            last + 1,
+            literal(AttemptStatus.started, TestAttempt.__table__.c.status.type),
+            literal(now, DateTime),
+        )
+        .where(TestAttempt.test_id == meta.id, TestAttempt.student_id == student_id)
+        .having(last < meta.max_attempts)
+    )
+    stmt = (
+        insert(TestAttempt.__table__)
+        .from_select(["student_id", "test_id", "attempt_number", "status", "started_at"], source)
+        .returning(TestAttempt.__table__.c.id, TestAttempt.__table__.c.attempt_number, TestAttempt.__table__.c.started_at)
+    )
+    for _ in range(3):
+        try:
+            with db.begin_nested():
+                return db.execute(stmt).first()
+        except IntegrityError:
+            continue
+    raise HTTPException(status_code=409, detail="Попытка уже создаётся, повторите запрос")
+
 
-    cnt = db.scalar(
-        select(func.count()).select_from(TestAttempt)
-        .where(TestAttempt.test_id == test.id, TestAttempt.student_id == student_id)
-    ) or 0
-    if cnt >= (test.max_attempts or 1):
-        return False, "Превышено число попыток", cnt
-    return True, None, cnt
+def attempt_must_finish_at(meta: TestMeta, started_at: datetime) -> datetime | None:
+    must_finish_at = calc_must_finish_at(started_at, meta.duration_minutes)
+    if meta.deadline and must_finish_at and must_finish_at > meta.deadline:
+        must_finish_at = meta.deadline
+    return must_finish_at
 
 
 def calc_must_finish_at(started_at: datetime, duration_minutes: int | None) -> datetime | None:
@@ -48,94 +156,204 @@ def normalize_str(val):
         return ""
     return str(val).strip().lower()
 
-def evaluate_auto_detailed(questions: list[Question], answers: Dict[str, Any]) -> dict[str, int]:
-    per_question = {}
-    for q in questions:
-        ans = answers.get(str(q.id))
-        if ans is None:
-            per_question[str(q.id)] = 0
-            continue
-
-        q_score = 0
-
-        if q.type in (QuestionType.choice, QuestionType.multi_choice):
-            correct = set(map(normalize_str, q.correct_answers or []))
-            if not correct:
-                per_question[str(q.id)] = 0
-                continue
-            if isinstance(ans, str):
-                if normalize_str(ans) in correct:
-                    q_score = q.points
-            elif isinstance(ans, list):
-                if set(map(normalize_str, ans)) == correct:
-                    q_score = q.points
-
-        elif q.type == QuestionType.input:
-            if normalize_str(ans) in set(map(normalize_str, q.correct_answers or [])):
-                q_score = q.points
+@dataclass(frozen=True, slots=True)
+class CompiledQuestion:
+    """Вопрос с заранее нормализованными правильными ответами."""
+    id: str
+    type: QuestionType
+    points: int
+    correct: frozenset[str] = frozenset()   # choice / multi_choice / input
+    match: tuple[tuple[str, str], ...] = ()  # match: (левый ключ как есть, нормализованный ответ)
 
-        elif q.type == QuestionType.match:
-            if isinstance(ans, dict) and isinstance(q.correct_answers, dict):
-                matched = sum(
-                    1
-                    for k, v in q.correct_answers.items()
-                    if normalize_str(ans.get(k)) == normalize_str(v)
-                )
-                total = len(q.correct_answers)
-                if total > 0:
-                    q_score = round(q.points * (matched / total))
-
-        per_question[str(q.id)] = q_score
-
-    return per_question
-
-
-def evaluate_auto(questions: list[Question], answers: Dict[str, Any]) -> int:
-    score = 0
-
-    for q in questions:
-        ans = answers.get(str(q.id))
+    def score(self, ans) -> int:
         if ans is None:
-            continue
-
-        if q.type in (QuestionType.choice, QuestionType.multi_choice):
-            correct = set(normalize_str(x) for x in (q.correct_answers or []))
-            if not correct:
-                continue
-
+            return 0
+        if self.type in (QuestionType.choice, QuestionType.multi_choice):
+            if not self.correct:
+                return 0
             if isinstance(ans, str):
-                if normalize_str(ans) in correct:
-                    score += q.points
-            elif isinstance(ans, list):
-                norm_ans = set(normalize_str(a) for a in ans)
-                if norm_ans == correct:
-                    score += q.points
-
-        elif q.type == QuestionType.input:
-            correct_variants = set(normalize_str(v) for v in (q.correct_answers or []))
-            if normalize_str(ans) in correct_variants:
-                score += q.points
-
-        elif q.type == QuestionType.match:
-            if not isinstance(ans, dict):
-                continue
-            correct_map = q.correct_answers or {}
-            if not isinstance(correct_map, dict):
-                continue
-
-            matched = sum(
-                1
-                for left, right in correct_map.items()
-                if normalize_str(ans.get(left)) == normalize_str(right)
+                return self.points if normalize_str(ans) in self.correct else 0
+            if isinstance(ans, list):
+                return self.points if set(map(normalize_str, ans)) == self.correct else 0
+            return 0
+        if self.type == QuestionType.input:
+            return self.points if normalize_str(ans) in self.correct else 0
+        if self.type == QuestionType.match:
+            if not isinstance(ans, dict) or not self.match:
+                return 0
+            matched = sum(1 for left, right in self.match if normalize_str(ans.get(left)) == right)
+            return round(self.points * (matched / len(self.match)))
+        return 0  # long_input проверяет преподаватель
+
+
+@dataclass(frozen=True, slots=True)
+class AnswerKey:
+    """Ключ ответов теста, собранный один раз; версия — tests.answer_key_version."""
+    test_id: int | None
+    version: int
+    questions: tuple[CompiledQuestion, ...]
+
+    @property
+    def max_score(self) -> int:
+        return sum(q.points for q in self.questions)
+
+    def score(self, answers: Dict[str, Any]) -> int:
+        return sum(q.score(answers.get(q.id)) for q in self.questions)
+
+    def score_detailed(self, answers: Dict[str, Any]) -> dict[str, int]:
+        return {q.id: q.score(answers.get(q.id)) for q in self.questions}
+
+    def score_many(self, answer_sets: list[Dict[str, Any] | None]) -> np.ndarray:
+        """
+        Баллы сразу для многих попыток: ответы раскладываются по столбцам-вопросам,
+        каждый различный ответ на вопрос оценивается один раз (на экзамене большинство
+        ответов совпадает), столбцы баллов складываются в numpy.
+        """
+        total = np.zeros(len(answer_sets), dtype=np.int64)
+        for q in self.questions:
+            memo: dict = {}
+            column = np.empty(len(answer_sets), dtype=np.int64)
+            for i, answers in enumerate(answer_sets):
+                ans = answers.get(q.id) if answers else None
+                key = _answer_memo_key(ans)
+                if key not in memo:
+                    memo[key] = q.score(ans)
+                column[i] = memo[key]
+            total += column
+        return total
+
+
+def _answer_memo_key(ans):
+    if ans is None or isinstance(ans, (str, int, float, bool)):
+        return type(ans), ans  # 1, True и "1" оцениваются по-разному
+    return json.dumps(ans, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def compile_question(q: Question) -> CompiledQuestion:
+    correct, match = frozenset(), ()
+    if q.type in (QuestionType.choice, QuestionType.multi_choice, QuestionType.input):
+        correct = frozenset(map(normalize_str, q.correct_answers or []))
+    elif q.type == QuestionType.match and isinstance(q.correct_answers, dict):
+        match = tuple((left, normalize_str(right)) for left, right in q.correct_answers.items())
+    return CompiledQuestion(id=str(q.id), type=q.type, points=q.points, correct=correct, match=match)
+
+
+def compile_answer_key(questions: Iterable[Question], test_id: int | None = None, version: int = 0) -> AnswerKey:
+    return AnswerKey(test_id=test_id, version=version, questions=tuple(compile_question(q) for q in questions))
+
+
+class AnswerKeyCache:
+    """
+    Скомпилированные ключи ответов в памяти процесса. Запись действительна, пока
+    совпадает tests.answer_key_version, поэтому правка теста в другом воркере
+    подхватывается при следующей загрузке строки теста.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: dict[int, AnswerKey] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, test: Test | TestMeta) -> AnswerKey:
+        version = test.answer_key_version or 0
+        key = self._items.get(test.id)
+        if key is not None and key.version == version:
+            return key
+        questions = db.scalars(select(Question).where(Question.test_id == test.id)).all()
+        key = compile_answer_key(questions, test.id, version)
+        with self._lock:
+            if len(self._items) >= self.max_size:
+                self._items.pop(next(iter(self._items)), None)
+            self._items[test.id] = key
+        return key
+
+    def invalidate(self, test_id: int):
+        with self._lock:
+            self._items.pop(test_id, None)
+
+
+answer_key_cache = AnswerKeyCache(max_size=settings.ANSWER_KEY_CACHE_SIZE)
+
+
+def get_answer_key(db: Session, test: Test | TestMeta) -> AnswerKey:
+    return answer_key_cache.get(db, test)
+
+
+def bump_answer_key(test: Test):
+    """Вызывается при изменении вопросов теста (до коммита)."""
+    test.answer_key_version = (test.answer_key_version or 0) + 1
+    answer_key_cache.invalidate(test.id)
+
+
+def _as_key(questions: AnswerKey | Iterable[Question]) -> AnswerKey:
+    return questions if isinstance(questions, AnswerKey) else compile_answer_key(questions)
+
+
+def evaluate_auto_detailed(questions: AnswerKey | list[Question], answers: Dict[str, Any]) -> dict[str, int]:
+    return _as_key(questions).score_detailed(answers)
+
+
+def evaluate_auto(questions: AnswerKey | list[Question], answers: Dict[str, Any]) -> int:
+    return _as_key(questions).score(answers)
+
+RESCORE_BATCH_SIZE = 1000
+RESCORE_STATUSES = (AttemptStatus.submitted, AttemptStatus.reviewed)
+MAX_REPORTED_CHANGES = 500
+
+
+def rescore_attempts(db: Session, test: Test, batch_size: int = RESCORE_BATCH_SIZE, dry_run: bool = False) -> dict:
+    """
+    Пересчитывает auto_score всех завершённых попыток теста по текущему ключу,
+    включая просроченные с баллом (их оценивает уборщик по автосохранённым ответам).
+    Попытки читаются пачками по id (только id, answers, auto_score), изменившиеся
+    баллы пишутся одним bulk UPDATE на пачку. Коммит — за вызывающим.
+    """
+    started = time.perf_counter()
+    key = get_answer_key(db, test)
+    report = {"test_id": test.id, "answer_key_version": key.version, "dry_run": dry_run,
+              "attempts": 0, "changed": 0, "changes": []}
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(TestAttempt.id, TestAttempt.answers, TestAttempt.auto_score)
+            .where(
+                TestAttempt.test_id == test.id,
+                or_(
+                    TestAttempt.status.in_(RESCORE_STATUSES),
+                    and_(TestAttempt.status == AttemptStatus.expired, TestAttempt.auto_score.is_not(None)),
+                ),
+                TestAttempt.id > last_id,
             )
-            total = len(correct_map)
-            if total > 0:
-                score += round(q.points * (matched / total))
+            .order_by(TestAttempt.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        report["attempts"] += len(rows)
+
+        scores = key.score_many([r.answers for r in rows])
+        changed = [
+            {"id": r.id, "auto_score": int(new)}
+            for r, new in zip(rows, scores)
+            if r.auto_score != new
+        ]
+        report["changed"] += len(changed)
+        room = MAX_REPORTED_CHANGES - len(report["changes"])
+        if room > 0:
+            old = {r.id: r.auto_score for r in rows}
+            report["changes"].extend(
+                {"attempt_id": c["id"], "old_score": old[c["id"]], "new_score": c["auto_score"]}
+                for c in changed[:room]
+            )
+        if changed and not dry_run:
+            db.execute(update(TestAttempt), changed)
 
-        elif q.type == QuestionType.long_input:
-            continue
+    elapsed = time.perf_counter() - started
+    report["elapsed_sec"] = round(elapsed, 3)
+    report["attempts_per_sec"] = round(report["attempts"] / elapsed) if elapsed > 0 else None
+    return report
 
-    return score
 
 def get_max_score_for_test(test: Test) -> int:
     if not test.questions:
@@ -0,0 +1,53 @@
+"""Превью изображений: WebP размеров THUMBNAIL_SIZES рядом с оригиналом, строятся фоновой задачей."""
+import os
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.files import thumbnail_path
+from app.core.jobs import enqueue_job
+
+
+def thumbnails_available() -> bool:
+    try:
+        import PIL.Image  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _abs(rel_path: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, rel_path.replace("/", os.sep))
+
+
+def make_thumbnails(rel_path: str) -> dict[int, str]:
+    """
+    Строит недостающие превью для MEDIA_ROOT/rel_path и возвращает {размер: путь}.
+    Каждое следующее (меньшее) превью масштабируется из предыдущего, а не из оригинала.
+    """
+    from PIL import Image, ImageOps
+
+    sizes = sorted(settings.THUMBNAIL_SIZES, reverse=True)
+    result = {s: thumbnail_path(rel_path, s) for s in sizes}
+    todo = [s for s in sizes if not os.path.exists(_abs(result[s]))]
+    if not todo:
+        return result
+
+    with Image.open(_abs(rel_path)) as im:
+        # JPEG декодируется сразу в уменьшенном виде — заметно быстрее для больших фото
+        im.draft("RGB", (todo[0], todo[0]))
+        img = ImageOps.exif_transpose(im)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        for size in sizes:
+            img.thumbnail((size, size), Image.LANCZOS)
+            if size not in todo:
+                continue
+            dest = _abs(result[size])
+            tmp = f"{dest}.part"
+            img.save(tmp, "WEBP", quality=settings.THUMBNAIL_QUALITY, method=4)
+            os.replace(tmp, dest)
+    return result
+
+
+def enqueue_thumbnails(db: Session, rel_path: str | None):
+    """Ставит построение превью в очередь задач (без Pillow — ничего не делает)."""
+    if rel_path and settings.THUMBNAIL_SIZES and thumbnails_available():
+        enqueue_job(db, "thumbnails", params={"path": rel_path})
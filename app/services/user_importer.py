@@ -1,139 +1,207 @@
-import pandas as pd
-import secrets
-import csv
 import os
+import secrets
+from dataclasses import dataclass, field
+import pandas as pd
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, insert
 from app.models.user import User
 from app.models.grade import Student
 from app.models.profile import Director, AdminProfile
-from app.models.schedule import Teacher
+from app.models.schedule import Teacher, Group
 from app.models.role import Role, user_roles
-from app.models.schedule import Group
-from app.core.security import hash_password
+from app.core.hashing import hash_passwords
+from app.services.schedule_importer import _ensure, _read_excel, _text
+
+REQUIRED_COLUMNS = ["ФИО", "Электронная почта", "Роль"]
+ROLE_MAP = {
+    "студент": "student",
+    "преподаватель": "teacher",
+    "директор": "director",
+    "администратор": "administrator",
+}
+BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 500
+EXPORT_NAME = "результат_импорта.xlsx"
+
+
+@dataclass
+class UserImportResult:
+    dry_run: bool = False
+    total_rows: int = 0
+    created_users: int = 0
+    skipped: int = 0
+    errors: list[dict] = field(default_factory=list)
+    created: dict = field(default_factory=dict)
+    export_path: str | None = None
+
+    def error(self, row: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "dry_run": self.dry_run,
+            "total_rows": self.total_rows,
+            "created_users": self.created_users,
+            "skipped": self.skipped,
+            "created": self.created,
+            "errors": self.errors,
+        }
 
 
-def get_or_create(db, model, where: dict, defaults: dict = {}):
-    inst = db.scalar(select(model).filter_by(**where))
-    if inst:
-        return inst
-    inst = model(**where, **defaults)
-    db.add(inst)
-    db.flush()
-    return inst
+def _split_group(raw: str | None) -> tuple[str | None, str | None]:
+    """"ИВТ-21, Информатика" -> (код, название); без запятой название = код."""
+    if not raw:
+        return None, None
+    parts = [p.strip() for p in raw.split(",", 1) if p.strip()]
+    return parts[0], parts[1] if len(parts) == 2 else parts[0]
+
+
+def read_users_frame(db: Session, file_path: str, result: UserImportResult) -> pd.DataFrame:
+    """
+    Разбор и проверка файла целиком до записи в БД: все ошибки строк попадают
+    в result, возвращаются только годные строки. Существующие почты
+    проверяются одним IN-запросом.
+    """
+    df = _read_excel(file_path)
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"В файле нет колонок: {', '.join(missing)}")
+    result.total_rows = len(df)
+
+    role_raw = _text(df, "Роль").map(lambda v: v.lower() if v else None)
+    email = _text(df, "Электронная почта").map(lambda v: v.lower() if v else None)
+    group = _text(df, "Группа").map(_split_group)
+    birth_raw = _text(df, "Дата рождения")
+    birth = pd.to_datetime(
+        df["Дата рождения"] if "Дата рождения" in df.columns else birth_raw,
+        dayfirst=True, errors="coerce", format="mixed",
+    )
+    out = pd.DataFrame({
+        "row": df.index + 2,  # строка 1 — заголовок
+        "full_name": _text(df, "ФИО"),
+        "email": email,
+        "role_raw": role_raw,
+        # неизвестная роль, как и раньше, считается студентом
+        "role": role_raw.map(lambda v: ROLE_MAP.get(v, v if v in ROLE_MAP.values() else "student")),
+        "phone": _text(df, "Телефон"),
+        "birth_date": pd.Series([d.date() if pd.notna(d) else None for d in birth], index=df.index, dtype=object),
+        "group_code": group.map(lambda g: g[0]),
+        "group_title": group.map(lambda g: g[1]),
+        "subject": _text(df, "Предмет"),
+    })
+
+    bad_required = out["full_name"].isna() | out["email"].isna() | out["role_raw"].isna()
+    bad_birth = ~bad_required & birth.isna() & birth_raw.notna()
+    no_group = ~bad_required & ~bad_birth & (out["role"] == "student") & out["group_code"].isna()
+    dup = ~bad_required & out["email"].duplicated(keep="first")
+
+    emails = list(out.loc[~bad_required, "email"].unique())
+    existing = set()
+    for start in range(0, len(emails), BATCH_SIZE):
+        existing.update(db.scalars(select(User.email).where(User.email.in_(emails[start:start + BATCH_SIZE]))))
+    exists = ~bad_required & out["email"].isin(existing)
+
+    checks = [
+        (bad_required, "Не указаны ФИО, почта или роль"),
+        (bad_birth, "Не удалось разобрать дату рождения"),
+        (no_group, "Укажите группу для студента"),
+        (dup & ~exists, "Почта повторяется выше в файле"),
+        (exists, "Пользователь с такой почтой уже есть"),
+    ]
+    bad = pd.Series(False, index=out.index)
+    for mask, message in checks:
+        mask = mask & ~bad  # одна ошибка на строку
+        for r in out.loc[mask, "row"]:
+            result.error(int(r), message)
+        bad |= mask
+    return out[~bad]
+
+
+def _write_export(path: str, rows: list[dict], errors: list[dict]):
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(rows, columns=["ФИО", "Email", "Роль", "Пароль"]).to_excel(writer, index=False, sheet_name="Пользователи")
+        if errors:
+            pd.DataFrame(errors).rename(columns={"row": "Строка", "error": "Ошибка"}).to_excel(
+                writer, index=False, sheet_name="Ошибки"
+            )
 
 
-def import_users_from_excel(db: Session, file_path: str, export_dir: str = "exports"):
-    """Импорт пользователей из Excel + экспорт CSV с логинами и паролями"""
-    df = pd.read_excel(file_path).fillna("")
-    os.makedirs(export_dir, exist_ok=True)
-    csv_path = os.path.join(export_dir, "imported_users.csv")
-
-    created, skipped = 0, 0
+def import_users(
+    db: Session,
+    file_path: str,
+    export_dir: str = "exports",
+    progress=None,
+    dry_run: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> UserImportResult:
+    """
+    Импорт пользователей из Excel одной транзакцией + Excel с логинами и паролями.
+    Роли и группы резолвятся по запросу на таблицу, пользователи, роли и профили
+    пишутся многострочными вставками. dry_run — только проверка файла, без записи.
+    progress(done, total) — необязательный колбэк (фоновые задачи).
+    """
+    result = UserImportResult(dry_run=dry_run)
+    frame = read_users_frame(db, file_path, result)
+    if dry_run:
+        result.created_users = len(frame)
+        return result
+
+    groups_needed = frame.dropna(subset=["group_code"]).drop_duplicates("group_code")
+    titles = dict(zip(groups_needed["group_code"], groups_needed["group_title"]))
+    groups = _ensure(db, Group, Group.code, set(titles), lambda k: {"title": titles[k]}, result)
+    roles = _ensure(
+        db, Role, Role.name, set(frame["role"]), lambda k: {"description": "Auto-created from import"}, result
+    )
+
+    rows = list(frame.itertuples(index=False))
+    # bcrypt — самая дорогая часть импорта, считаем все хеши разом на пуле процессов
+    passwords = [secrets.token_urlsafe(8) for _ in rows]
+    hashes = hash_passwords(passwords)
+
+    # профиль по роли: модель и её колонки из строки файла
+    profiles = {
+        "student": (Student, lambda r: {"group_id": groups[r.group_code]}),
+        "teacher": (Teacher, lambda r: {"full_name": r.full_name, "email": r.email, "phone": r.phone, "subject": r.subject}),
+        "director": (Director, lambda r: {"full_name": r.full_name, "email": r.email, "phone": r.phone}),
+        "administrator": (AdminProfile, lambda r: {}),
+    }
     export_data = []
-
-    for _, row in df.iterrows():
-        full_name = str(row["ФИО"]).strip()
-        email = str(row["Электронная почта"]).strip().lower()
-        role_name = str(row["Роль"]).strip().lower()
-
-        if not full_name or not email or not role_name:
-            skipped += 1
-            continue
-
-        if db.scalar(select(User).where(User.email == email)):
-            skipped += 1
-            continue
-
-        raw_password = secrets.token_urlsafe(8)
-        password_hash = hash_password(raw_password)
-
-        user = User(
-            email=email,
-            full_name=full_name,
-            phone=row["Телефон"] or None,
-            birth_date=row["Дата рождения"] or None,
-            password_hash=password_hash,
-            is_active=True,
+    for start in range(0, len(rows), batch_size):
+        if progress:
+            progress(start, len(rows))
+        chunk = rows[start:start + batch_size]
+        user_ids = dict(db.execute(
+            insert(User.__table__).returning(User.__table__.c.email, User.__table__.c.id),
+            [
+                {
+                    "email": r.email,
+                    "full_name": r.full_name,
+                    "phone": r.phone,
+                    "birth_date": r.birth_date,
+                    "password_hash": h,
+                    "is_active": True,
+                }
+                for r, h in zip(chunk, hashes[start:start + batch_size])
+            ],
+        ).all())
+
+        db.execute(user_roles.insert(), [{"user_id": user_ids[r.email], "role_id": roles[r.role]} for r in chunk])
+        for role, (model, values) in profiles.items():
+            batch = [{"user_id": user_ids[r.email], **values(r)} for r in chunk if r.role == role]
+            if batch:
+                db.execute(insert(model.__table__), batch)
+
+        export_data.extend(
+            {"ФИО": r.full_name, "Email": r.email, "Роль": r.role_raw, "Пароль": p}
+            for r, p in zip(chunk, passwords[start:start + batch_size])
         )
-        db.add(user)
-        db.flush()
-
-        mapping = {
-            "студент": "student",
-            "преподаватель": "teacher",
-            "директор": "director",
-            "администратор": "administrator"
-        }
-        role_name_eng = mapping.get(role_name, "student")
-
-        role = db.scalar(select(Role).where(Role.name == role_name_eng))
-        if not role:
-            role = Role(name=role_name_eng, description=f"Auto-created from import")
-            db.add(role)
-            db.flush()
-
-        db.execute(user_roles.insert().values(user_id=user.id, role_id=role.id))
-
-        if role_name_eng == "student":
-            group_raw = str(row["Группа"]).strip()
-            if not group_raw:
-                raise ValueError(f"Укажите группу для студента: {full_name}")
-
-            parts = [p.strip() for p in group_raw.split(",", 1) if p.strip()]
-            if len(parts) == 2:
-                group_code, group_title = parts
-            else:
-                group_code = parts[0]
-                group_title = parts[0]
-
-            group = get_or_create(
-                db,
-                Group,
-                {"code": group_code},
-                {"title": group_title}
-            )
-            db.add(Student(user_id=user.id, group_id=group.id))
-
-        elif role_name_eng == "teacher":
-            subject = str(row["Предмет"]).strip() or None
-            db.add(Teacher(
-                user_id=user.id,
-                full_name=full_name,
-                email=email,
-                phone=row["Телефон"] or None,
-                subject=subject
-            ))
-
-
-        elif role_name_eng == "director":
-            db.add(Director(
-                user_id=user.id,
-                full_name=full_name,
-                email=email,
-                phone=row["Телефон"] or None,
-            ))
-
-        elif role_name_eng == "administrator":
-            db.add(AdminProfile(user_id=user.id))
-
-        export_data.append({
-            "ФИО": full_name,
-            "Email": email,
-            "Роль": role_name,
-            "Пароль": raw_password
-        })
-
-        created += 1
 
     db.commit()
+    result.created_users = len(rows)
 
     os.makedirs(export_dir, exist_ok=True)
-    export_path = os.path.join(export_dir, "результат_импорта.xlsx")
-
-    df_export = pd.DataFrame(export_data)
-    df_export.to_excel(export_path, index=False)
-
-    print(f"✅ Импорт завершён: {created} создано, {skipped} пропущено")
-    print(f"📁 Excel сохранён: {export_path}")
-    return export_path
+    result.export_path = os.path.join(export_dir, EXPORT_NAME)
+    _write_export(result.export_path, export_data, result.errors)
+    return result
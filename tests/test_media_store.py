@@ -0,0 +1,82 @@
+import io
+import os
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core import media_store
+from app.core.config import settings
+from app.db.base import Base
+from app.models.media import MediaBlob
+
+
+class Upload:
+    def __init__(self, data: bytes, filename: str):
+        self.file = io.BytesIO(data)
+        self.filename = filename
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEDIA_ROOT", str(tmp_path))
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    # pysqlite сам управляет транзакциями и ломает SAVEPOINT — BEGIN отдаём SQLAlchemy
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_conn, _):
+        dbapi_conn.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine, tables=[MediaBlob.__table__])
+    # как SessionLocal: autoflush выключен
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _on_disk(rel: str) -> bool:
+    return os.path.exists(media_store._abs(rel))
+
+
+def test_release_and_restore_same_content_keeps_file(db):
+    rel = media_store.store_blob(db, Upload(b"photo", "a.jpg"))
+    db.commit()
+    assert _on_disk(rel)
+
+    media_store.release_blob(db, rel)
+    assert media_store.store_blob(db, Upload(b"photo", "a.jpg")) == rel
+    db.commit()
+
+    assert db.scalar(select(MediaBlob.ref_count).where(MediaBlob.path == rel)) == 1
+    assert _on_disk(rel)
+
+
+def test_release_and_store_other_then_rollback_keeps_old_file(db):
+    old = media_store.store_blob(db, Upload(b"old", "a.pdf"))
+    db.commit()
+
+    media_store.release_blob(db, old)
+    new = media_store.store_blob(db, Upload(b"new", "b.pdf"))
+    # SAVEPOINT внутри store_blob — ещё не коммит: старый файл на месте, нового нет
+    assert _on_disk(old) and not _on_disk(new)
+    db.rollback()
+
+    assert db.scalar(select(MediaBlob.ref_count).where(MediaBlob.path == old)) == 1
+    assert _on_disk(old) and not _on_disk(new)
+    assert not os.listdir(os.path.join(settings.MEDIA_ROOT, "tmp"))
+
+
+def test_release_and_store_other_then_commit_swaps_files(db):
+    old = media_store.store_blob(db, Upload(b"old", "a.pdf"))
+    db.commit()
+
+    media_store.release_blob(db, old)
+    new = media_store.store_blob(db, Upload(b"new", "b.pdf"))
+    db.commit()
+
+    assert db.scalars(select(MediaBlob.path)).all() == [new]
+    assert not _on_disk(old) and _on_disk(new)